@@ -5,3 +5,5 @@ class CandidateConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "candidate"
 
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,163 @@
+import threading
+import time
+from typing import Any, Dict, Set
+import numpy as np
+from .models import Candidate
+
+# Candidate fields that searches can filter on, with the lookups each one accepts.
+# Filters use Django-style keys, e.g. {"experience__gte": 3, "status__in": ["new"]}.
+FILTER_LOOKUPS = {
+    "experience": ("exact", "in", "gt", "gte", "lt", "lte"),
+    "is_actively_looking": ("exact",),
+    "willingness_to_relocate": ("exact",),
+    "status": ("exact", "in"),
+    "employment_type_preferences": ("exact", "in"),
+    "preferred_locations": ("exact", "in"),
+}
+
+# Categorical fields stored as small integer codes
+_CHOICES = {
+    "status": [value for value, _ in Candidate.CANDIDATE_STATUS_CHOICES],
+    "employment_type_preferences": [value for value, _ in Candidate.EMPLOYMENT_CHOICES],
+}
+
+_FIELDS = ["id", "experience", "is_actively_looking", "willingness_to_relocate",
+           "status", "employment_type_preferences", "preferred_locations"]
+
+def split_locations(value: str) -> Set[str]:
+    """Normalized locations of a comma-separated preferred_locations value."""
+    return {location.strip().lower() for location in (value or "").split(",") if location.strip()}
+
+class AttributeStore:
+    """
+    Columnar copy of the Candidate fields used to filter searches.
+
+    Every column is a NumPy array aligned with the sorted candidate ids, so a
+    filter compiles to a few vectorized comparisons. Choice fields are kept as
+    integer codes (-1 for values outside the choices) and preferred locations
+    as an inverted list of candidate ids per normalized location.
+    """
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.columns = {
+            "experience": np.empty(0, dtype=np.float32),  # NaN when not set
+            "is_actively_looking": np.empty(0, dtype=bool),
+            "willingness_to_relocate": np.empty(0, dtype=bool),
+            "status": np.empty(0, dtype=np.int16),
+            "employment_type_preferences": np.empty(0, dtype=np.int16),
+        }
+        self.locations = {}  # Normalized location -> ids of candidates open to it
+        self._candidate_locations = {}  # Candidate id -> its normalized locations
+        self.loaded_at = 0.0
+        self.version = 0  # Bumped on every change, so cached filtered results can tell they are stale
+        self._lock = threading.Lock()
+
+    def _code(self, field: str, value: Any) -> int:
+        choices = _CHOICES[field]
+        return choices.index(value) if value in choices else -1
+
+    def _row(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Column values of one candidate."""
+        return {
+            "experience": np.nan if values["experience"] is None else values["experience"],
+            "is_actively_looking": bool(values["is_actively_looking"]),
+            "willingness_to_relocate": bool(values["willingness_to_relocate"]),
+            "status": self._code("status", values["status"]),
+            "employment_type_preferences": self._code("employment_type_preferences",
+                                                      values["employment_type_preferences"]),
+        }
+
+    def load(self) -> "AttributeStore":
+        """Load the columns of every candidate with a single query."""
+        rows = list(Candidate.objects.order_by("id").values(*_FIELDS))
+        with self._lock:
+            self.ids = np.array([row["id"] for row in rows], dtype=np.int64)
+            values = [self._row(row) for row in rows]
+            for field, column in self.columns.items():
+                self.columns[field] = np.array([value[field] for value in values], dtype=column.dtype)
+            self.locations = {}
+            self._candidate_locations = {}
+            for row in rows:
+                self._set_locations(row["id"], split_locations(row["preferred_locations"]))
+            self.loaded_at = time.monotonic()
+        return self
+
+    def _set_locations(self, candidate_id: int, locations: Set[str]) -> None:
+        """Replace a candidate's entries in the location lists (lock held)."""
+        for location in self._candidate_locations.pop(candidate_id, set()):
+            self.locations[location].discard(candidate_id)
+        for location in locations:
+            self.locations.setdefault(location, set()).add(candidate_id)
+        if locations:
+            self._candidate_locations[candidate_id] = locations
+
+    def upsert(self, candidate: Candidate) -> None:
+        """Insert or refresh one candidate's columns."""
+        values = self._row({field: getattr(candidate, field) for field in _FIELDS})
+        with self._lock:
+            position = int(np.searchsorted(self.ids, candidate.id))
+            if position < len(self.ids) and self.ids[position] == candidate.id:
+                for field, column in self.columns.items():
+                    column[position] = values[field]
+            else:
+                self.ids = np.insert(self.ids, position, candidate.id)
+                for field, column in self.columns.items():
+                    self.columns[field] = np.insert(column, position, values[field])
+            self._set_locations(candidate.id, split_locations(candidate.preferred_locations))
+            self.version += 1
+
+    def remove(self, candidate_id: int) -> None:
+        """Drop one candidate's columns."""
+        with self._lock:
+            position = int(np.searchsorted(self.ids, candidate_id))
+            if position < len(self.ids) and self.ids[position] == candidate_id:
+                self.ids = np.delete(self.ids, position)
+                for field, column in self.columns.items():
+                    self.columns[field] = np.delete(column, position)
+            self._set_locations(candidate_id, set())
+            self.version += 1
+
+    def _match(self, field: str, lookup: str, value: Any) -> np.ndarray:
+        """Row mask of one filter term (lock held)."""
+        values = value if lookup == "in" else [value]
+        if lookup == "in" and not isinstance(value, (list, tuple)):
+            raise ValueError(f"Filter {field}__in expects a list")
+        if field == "preferred_locations":
+            matching = set()
+            for location in values:
+                matching.update(self.locations.get(str(location).strip().lower(), ()))
+            return np.isin(self.ids, np.fromiter(matching, dtype=np.int64, count=len(matching)))
+        column = self.columns[field]
+        if field in _CHOICES:
+            unknown = [choice for choice in values if choice not in _CHOICES[field]]
+            if unknown:
+                raise ValueError(f"Unknown {field} value: {unknown[0]}")
+            return np.isin(column, [self._code(field, choice) for choice in values])
+        if column.dtype == bool:
+            if not isinstance(value, bool):
+                raise ValueError(f"Filter {field} expects true or false")
+            return column == value
+        try:
+            numbers = [float(number) for number in values]
+        except (TypeError, ValueError):
+            raise ValueError(f"Filter {field}__{lookup} expects a number")
+        if lookup in ("exact", "in"):
+            return np.isin(column, numbers)
+        comparisons = {"gt": np.greater, "gte": np.greater_equal, "lt": np.less, "lte": np.less_equal}
+        return comparisons[lookup](column, numbers[0])
+
+    def filter_ids(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Sorted ids of the candidates matching every filter term."""
+        terms = []
+        for key, value in filters.items():
+            field, _, lookup = key.partition("__")
+            lookup = lookup or "exact"
+            if lookup not in FILTER_LOOKUPS.get(field, ()):
+                raise ValueError(f"Unsupported filter: {key}")
+            terms.append((field, lookup, value))
+        with self._lock:
+            mask = np.ones(len(self.ids), dtype=bool)
+            for field, lookup, value in terms:
+                mask &= self._match(field, lookup, value)
+            return self.ids[mask]
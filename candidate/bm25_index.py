@@ -0,0 +1,221 @@
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+# Tokens keep the punctuation of technology names: c++, c#, node.js, asp.net
+_TOKEN = re.compile(r"[a-z0-9+#]+(?:\.[a-z0-9+#]+)*")
+
+# Common English words plus the labels and placeholders of the profile section texts
+STOP_WORDS = frozenset("""
+a an and are as at be by for from has have in is it of on or the to with we you our your will
+role project description tech stack present no not specified none years year
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased keyword tokens of a text, without stop words."""
+    return [token for token in _TOKEN.findall((text or "").lower()) if token not in STOP_WORDS]
+
+class BM25Index:
+    """
+    In-process inverted index over candidate keyword text, scored with Okapi BM25.
+
+    The base segment stores postings in CSR form: the rows of the documents
+    containing term t are postings[offsets[t]:offsets[t + 1]], with their term
+    frequencies in frequencies. Rows index ids, the sorted candidate ids.
+    Upserts go to a small delta of per-document term counts, and the base rows
+    they replace or delete are masked out of live. Once the delta outgrows
+    merge_threshold documents (or a tenth of the base), both are merged into
+    a new base. Document frequencies and the average length always count the
+    live documents of both segments.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, merge_threshold: int = 1000):
+        self.k1 = k1
+        self.b = b
+        self.merge_threshold = merge_threshold
+        self.terms = {}  # Term -> term number in the base postings
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.empty(0, dtype=np.int32)
+        self.frequencies = np.empty(0, dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.lengths = np.empty(0, dtype=np.float32)
+        self.live = np.empty(0, dtype=bool)
+        self.delta = {}  # Candidate id -> Counter of its terms
+        self.delta_postings = {}  # Term -> {candidate id: frequency} of delta documents
+        self.documents = 0
+        self.total_length = 0.0
+        self.loaded_at = 0.0
+        self.version = 0  # Bumped on every change, so cached results can tell they are stale
+        self._lock = threading.Lock()
+
+    def build(self, documents: Iterable[Tuple[int, str]]) -> "BM25Index":
+        """Index (candidate id, text) pairs as a new base segment, replacing everything."""
+        counts = {}
+        for candidate_id, text in documents:
+            counts[int(candidate_id)] = Counter(tokenize(text))
+        with self._lock:
+            self._set_base(counts)
+            self.delta = {}
+            self.delta_postings = {}
+            self.loaded_at = time.monotonic()
+            self.version += 1
+        return self
+
+    def _set_base(self, counts: Dict[int, Counter]) -> None:
+        """Replace the base segment with the postings of counts (lock held)."""
+        ids = np.array(sorted(counts), dtype=np.int64)
+        terms = {}
+        term_numbers, rows, frequencies = [], [], []
+        lengths = np.zeros(len(ids), dtype=np.float32)
+        for row, candidate_id in enumerate(ids.tolist()):
+            document = counts[candidate_id]
+            for term, frequency in document.items():
+                term_numbers.append(terms.setdefault(term, len(terms)))
+                rows.append(row)
+                frequencies.append(frequency)
+            lengths[row] = sum(document.values())
+        term_numbers = np.array(term_numbers, dtype=np.int64)
+        order = np.argsort(term_numbers, kind="stable")
+        self.terms = terms
+        self.offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(np.bincount(term_numbers, minlength=len(terms)))
+        self.postings = np.array(rows, dtype=np.int32)[order]
+        self.frequencies = np.array(frequencies, dtype=np.float32)[order]
+        self.ids = ids
+        self.lengths = lengths
+        self.live = np.ones(len(ids), dtype=bool)
+        self.documents = len(ids)
+        self.total_length = float(lengths.sum())
+
+    def _base_counts(self) -> Dict[int, Counter]:
+        """Term counts of the live base documents, read back from the postings (lock held)."""
+        counts = {int(candidate_id): Counter() for candidate_id in self.ids[self.live]}
+        term_numbers = np.repeat(np.arange(len(self.terms)), np.diff(self.offsets))
+        terms = np.array(list(self.terms), dtype=object)
+        keep = self.live[self.postings]
+        for term, row, frequency in zip(terms[term_numbers[keep]], self.postings[keep], self.frequencies[keep]):
+            counts[int(self.ids[row])][term] = int(frequency)
+        return counts
+
+    def _base_row(self, candidate_id: int) -> int:
+        """Live base row of a candidate, or -1 (lock held)."""
+        row = int(np.searchsorted(self.ids, candidate_id))
+        if row < len(self.ids) and self.ids[row] == candidate_id and self.live[row]:
+            return row
+        return -1
+
+    def _drop(self, candidate_id: int) -> None:
+        """Take a candidate's current document out of the statistics and postings (lock held)."""
+        row = self._base_row(candidate_id)
+        if row >= 0:
+            self.live[row] = False
+            self.documents -= 1
+            self.total_length -= float(self.lengths[row])
+        document = self.delta.pop(candidate_id, None)
+        if document is not None:
+            for term in document:
+                postings = self.delta_postings[term]
+                del postings[candidate_id]
+                if not postings:
+                    del self.delta_postings[term]
+            self.documents -= 1
+            self.total_length -= sum(document.values())
+
+    def upsert(self, candidate_id: int, text: str) -> None:
+        """Insert or replace one candidate's document."""
+        document = Counter(tokenize(text))
+        with self._lock:
+            self._drop(candidate_id)
+            self.delta[candidate_id] = document
+            for term, frequency in document.items():
+                self.delta_postings.setdefault(term, {})[candidate_id] = frequency
+            self.documents += 1
+            self.total_length += sum(document.values())
+            self.version += 1
+            if len(self.delta) > max(self.merge_threshold, len(self.ids) // 10):
+                self._merge()
+
+    def remove(self, candidate_id: int) -> None:
+        """Drop one candidate's document."""
+        with self._lock:
+            self._drop(candidate_id)
+            self.version += 1
+
+    def _merge(self) -> None:
+        """Fold the delta into a new base segment without masked rows (lock held)."""
+        counts = self._base_counts()
+        counts.update(self.delta)
+        self._set_base(counts)
+        self.delta = {}
+        self.delta_postings = {}
+
+    def search(self, query_text: str, k: int, allowed_ids: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k best matching candidate ids for the keywords of a query, with their BM25
+        scores, best first. allowed_ids (sorted) restricts the candidates scored.
+        """
+        terms = set(tokenize(query_text))
+        with self._lock:
+            if not terms or self.documents <= 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            average_length = self.total_length / self.documents
+            base_rows, base_scores = [], []
+            delta_scores = {}
+            for term in terms:
+                number = self.terms.get(term)
+                if number is not None:
+                    rows = self.postings[self.offsets[number]:self.offsets[number + 1]]
+                    frequencies = self.frequencies[self.offsets[number]:self.offsets[number + 1]]
+                    live = self.live[rows]
+                    rows, frequencies = rows[live], frequencies[live]
+                else:
+                    rows, frequencies = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+                delta = self.delta_postings.get(term, {})
+                document_frequency = len(rows) + len(delta)
+                if not document_frequency:
+                    continue
+                idf = np.log(1 + (self.documents - document_frequency + 0.5) / (document_frequency + 0.5))
+                if len(rows):
+                    norms = self.k1 * (1 - self.b + self.b * self.lengths[rows] / average_length)
+                    base_rows.append(rows)
+                    base_scores.append(idf * frequencies * (self.k1 + 1) / (frequencies + norms))
+                for candidate_id, frequency in delta.items():
+                    length = sum(self.delta[candidate_id].values())
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    delta_scores[candidate_id] = (
+                        delta_scores.get(candidate_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+                    )
+            ids = [np.fromiter(delta_scores, dtype=np.int64, count=len(delta_scores))]
+            scores = [np.fromiter(delta_scores.values(), dtype=np.float32, count=len(delta_scores))]
+            if base_rows:
+                row_scores = np.bincount(np.concatenate(base_rows), weights=np.concatenate(base_scores),
+                                         minlength=len(self.ids))
+                rows = np.flatnonzero(row_scores)
+                ids.append(self.ids[rows])
+                scores.append(row_scores[rows].astype(np.float32))
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        if allowed_ids is not None:
+            if not len(allowed_ids):
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            positions = np.minimum(np.searchsorted(allowed_ids, ids), len(allowed_ids) - 1)
+            allowed = allowed_ids[positions] == ids
+            ids, scores = ids[allowed], scores[allowed]
+        top = min(k, len(ids))
+        if not top:
+            return ids, scores
+        best = np.argpartition(-scores, top - 1)[:top]
+        # Ties broken by candidate id, so equal scores rank the same way on every call
+        best = best[np.lexsort((ids[best], -scores[best]))]
+        return ids[best], scores[best]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "documents": self.documents,
+                "terms": len(self.terms),
+                "postings": len(self.postings),
+                "delta_documents": len(self.delta),
+            }
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core import checks
+
+# Cache backends whose entries are only visible to the process that wrote them
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+@checks.register()
+def check_ranking_cache(app_configs, **kwargs):
+    """Search cursors are read back by whichever worker gets the next page, so rankings need a shared cache."""
+    from .vector_index import get_index_config
+    alias = get_index_config()["RANKING_CACHE"]
+    if alias not in settings.CACHES:
+        return [checks.Error(
+            f"EMBEDDING_INDEX RANKING_CACHE names the cache alias '{alias}', which is not in CACHES.",
+            id="candidate.E001",
+        )]
+    if settings.CACHES[alias]["BACKEND"] in PROCESS_LOCAL_CACHE_BACKENDS:
+        return [checks.Error(
+            f"EMBEDDING_INDEX RANKING_CACHE uses the process-local cache alias '{alias}'.",
+            hint="Search cursors issued by one worker would be invalid on the others. "
+                 "Point RANKING_CACHE at a file, database, Redis or Memcached cache.",
+            id="candidate.E002",
+        )]
+    return []
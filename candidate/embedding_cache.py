@@ -0,0 +1,159 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+# Cached vectors are keyed by content, not by candidate: identical section texts
+# ("No skills specified", the same location block, an unchanged profile) are
+# embedded once and reused by every candidate and every rebuild.
+
+def embedding_key(model: str, dimension: int, text: str) -> bytes:
+    """Content address of an embedding request."""
+    return hashlib.sha256(f"{model}\n{dimension}\n{text}".encode()).digest()
+
+class EmbeddingCache:
+    """
+    Persistent embedding store in a SQLite file, one float32 BLOB row per text.
+
+    The file is shared by every process on the host (WAL mode, one connection
+    per thread). Rows record when they were last used; once the stored vectors
+    exceed max_bytes, the least recently used rows are evicted down to 90% of
+    the limit. hits, misses, writes and evictions count this process's traffic.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._size = None  # Bytes of stored vectors, read from the file on first write
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key BLOB PRIMARY KEY, dimension INTEGER NOT NULL,"
+                " vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._local.connection = connection
+        return connection
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Cached vectors of the keys found, marking them as recently used."""
+        if not keys:
+            return {}
+        connection = self._connection()
+        found = {}
+        # Stay under SQLite's bound parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for key, vector in rows:
+                found[bytes(key)] = np.frombuffer(vector, dtype=np.float32)
+        if found:
+            now = time.time()
+            with connection:
+                connection.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Cached vector of one key, or None."""
+        return self.get_many([key]).get(key)
+
+    def set_many(self, vectors: Dict[bytes, np.ndarray]) -> None:
+        """Store vectors as float32 and evict old rows if the cache grew past its limit."""
+        if not vectors:
+            return
+        connection = self._connection()
+        now = time.time()
+        rows = [
+            (key, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in vectors.items()
+        ]
+        with connection:
+            # Rows replaced by this write no longer count towards the size
+            replaced = 0
+            for start in range(0, len(rows), 500):
+                chunk = [row[0] for row in rows[start:start + 500]]
+                replaced += connection.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchone()[0]
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dimension, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+        with self._lock:
+            self.writes += len(rows)
+            if self._size is None:
+                self._size = self.size_bytes()
+            else:
+                self._size += sum(len(row[2]) for row in rows) - replaced
+            over_limit = self._size > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def set(self, key: bytes, vector: np.ndarray) -> None:
+        self.set_many({key: vector})
+
+    def size_bytes(self) -> int:
+        """Bytes of vectors stored in the file, across all processes."""
+        return int(self._connection().execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0])
+
+    def evict(self) -> int:
+        """Drop least recently used rows until the vectors fit in 90% of max_bytes."""
+        connection = self._connection()
+        with connection:
+            size = self.size_bytes()
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            while size > target:
+                rows = connection.execute(
+                    "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+                ).fetchall()
+                if not rows:
+                    break
+                for key, length in rows:
+                    if size <= target:
+                        break
+                    connection.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                    size -= length
+                    removed += 1
+        with self._lock:
+            self._size = size
+            self.evictions += removed
+        if removed:
+            print(f"Evicted {removed} embeddings from the cache, {size} bytes left")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": int(self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]),
+            "bytes": self.size_bytes(),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
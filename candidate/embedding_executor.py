@@ -0,0 +1,92 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+class EmbeddingError(Exception):
+    """Embeddings could not be generated, even after retrying."""
+
+# HTTP codes of throttling and transient provider failures worth retrying
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed provider call is throttling or a transient failure."""
+    code = getattr(error, "code", None)
+    if code in RETRYABLE_CODES:
+        return True
+    status = str(getattr(error, "status", "") or "")
+    if status in ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED"):
+        return True
+    # Network errors surface as connection or timeout exceptions
+    return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in (
+        "ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError"
+    )
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: rate tokens per second, bursts of up to capacity.
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take one token, sleeping until one is available."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class EmbeddingExecutor:
+    """
+    Runs embedding requests on a bounded thread pool.
+
+    Every attempt first takes a token from the shared rate limiter, so total
+    throughput follows the permitted requests per second, not the latency of
+    one request. Throttling and transient errors are retried with exponential
+    backoff and jitter; other errors, or running out of retries, fail the
+    request with EmbeddingError.
+    """
+
+    def __init__(self, max_workers: int = 4, rate_limiter: TokenBucket = None, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = rate_limiter or TokenBucket(0)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="embedding")
+
+    def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run one request in the calling thread, rate limited and retried."""
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return fn(*args)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise EmbeddingError(f"Embedding request failed after {attempt + 1} attempts: {str(e)}") from e
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                delay *= 0.5 + random.random() / 2
+                print(f"Embedding request throttled or failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Run one request on the pool; the future raises EmbeddingError if it fails."""
+        return self._pool.submit(self.call, fn, *args)
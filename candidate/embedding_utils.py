@@ -1,28 +1,18 @@
-from typing import List, Dict
-from google import genai
+import hashlib
+from concurrent.futures import Future
+from typing import List, Dict, Optional
 from django.conf import settings
-from dotenv import load_dotenv
-import os
+from django.utils import timezone
+from .models import ParsedJobDescription
+from .search_cache import SearchResultCache
+from .embedding_cache import EmbeddingCache, embedding_key
+from .embedding_executor import EmbeddingError, EmbeddingExecutor, TokenBucket
+from .llm_providers import get_embedding_provider, get_provider
 
-# Initialize Gemini client
-load_dotenv()
-
-api_key = os.getenv("GEMINI_API")
-client = genai.Client(api_key=api_key)
-
-def parse_job_description(jd_text: str) -> Dict[str, str]:
-    """
-    Parse a job description into different aspects using Gemini.
-    
-    Args:
-        jd_text (str): The full job description text
-    
-    Returns:
-        Dict[str, str]: Dictionary containing different aspects of the job description
-    """
-    try:
-        print(f"Parsing job description of length: {len(jd_text)}")
-        prompt = f"""
+# Model and prompt used to parse job descriptions. Changing either (or the
+# provider) changes jd_parser_version(), so sections cached by another parser are not reused.
+JD_PARSE_MODEL = "gemini-2.0-flash"
+JD_PARSE_PROMPT = """
         Parse the following job description into different aspects. Extract and organize the information into these categories:
         1. Required Skills and Technologies
         2. Experience Requirements
@@ -36,12 +26,70 @@ def parse_job_description(jd_text: str) -> Dict[str, str]:
         Provide the output in a structured format with clear sections.
         """
 
-        print("Sending request to Gemini API for parsing")
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
+def jd_parser_version() -> str:
+    """Hash of the provider model and prompt that parse job descriptions."""
+    model = get_provider().model_id(JD_PARSE_MODEL)
+    return hashlib.sha256(f"{model}\n{JD_PARSE_PROMPT}".encode()).hexdigest()[:16]
+
+# Recently parsed job descriptions, in front of the ParsedJobDescription table
+_parsed_jd_cache = SearchResultCache(getattr(settings, "JD_PARSE_CACHE_SIZE", 512), ttl=24 * 3600)
+
+def jd_content_hash(jd_text: str) -> str:
+    """Cache key of a job description under the current parser version."""
+    return hashlib.sha256(f"{jd_parser_version()}\n{jd_text.strip()}".encode()).hexdigest()
+
+def _cached_sections(content_hash: str) -> Optional[Dict[str, str]]:
+    """Sections parsed earlier for a JD, from memory or the database."""
+    sections = _parsed_jd_cache.get(content_hash)
+    if sections is not None:
+        return sections
+    try:
+        parsed = ParsedJobDescription.objects.filter(content_hash=content_hash).first()
+        if parsed is None:
+            return None
+        # Touch the row so pruning by last_used_at keeps job descriptions still in use
+        ParsedJobDescription.objects.filter(pk=parsed.pk).update(last_used_at=timezone.now())
+    except Exception as e:
+        print(f"Error reading parsed job description cache: {str(e)}")
+        return None
+    _parsed_jd_cache.set(content_hash, parsed.sections)
+    return parsed.sections
+
+def _store_sections(content_hash: str, sections: Dict[str, str]) -> None:
+    """Remember a successful parse in memory and in the database."""
+    _parsed_jd_cache.set(content_hash, sections)
+    try:
+        ParsedJobDescription.objects.update_or_create(
+            content_hash=content_hash,
+            defaults={"parser_version": jd_parser_version(), "sections": sections}
         )
-        print("Received response from Gemini API")
+    except Exception as e:
+        print(f"Error writing parsed job description cache: {str(e)}")
+
+def parse_job_description(jd_text: str) -> Dict[str, str]:
+    """
+    Parse a job description into different aspects with the configured LLM provider (Gemini by default).
+    Successful parses are cached by content hash and parser version, so a JD
+    seen before is answered from memory or the database without a provider call.
+    
+    Args:
+        jd_text (str): The full job description text
+    
+    Returns:
+        Dict[str, str]: Dictionary containing different aspects of the job description
+    """
+    content_hash = jd_content_hash(jd_text)
+    cached = _cached_sections(content_hash)
+    if cached is not None:
+        print("Using cached job description sections")
+        return dict(cached)
+    try:
+        print(f"Parsing job description of length: {len(jd_text)}")
+        prompt = JD_PARSE_PROMPT.format(jd_text=jd_text)
+
+        print("Sending parse request to the LLM provider")
+        response_text = get_provider().generate(prompt, JD_PARSE_MODEL)
+        print("Received response from the LLM provider")
         
         # Parse the response into sections
         sections = {
@@ -52,11 +100,12 @@ def parse_job_description(jd_text: str) -> Dict[str, str]:
             "profile": ""
         }
         
+        parsed = False
         try:
             print("Attempting to parse response text")
             # Parse the text response into sections
             current_section = None
-            for line in response.text.split('\n'):
+            for line in response_text.split('\n'):
                 line = line.strip()
                 if not line:
                     continue
@@ -74,7 +123,9 @@ def parse_job_description(jd_text: str) -> Dict[str, str]:
                 elif current_section:
                     sections[current_section] += line + " "
             
-            print("Successfully parsed response text")
+            # A response without any recognised section (an error message, say) is not a parse
+            parsed = any(text.strip() for text in sections.values())
+            print("Successfully parsed response text" if parsed else "No sections found in response text")
         except Exception as e:
             print(f"Text parsing failed: {str(e)}")
             print("Using default sections")
@@ -86,7 +137,10 @@ def parse_job_description(jd_text: str) -> Dict[str, str]:
                 sections[key] = "No specific requirements mentioned"
         
         print(f"Final parsed sections: {list(sections.keys())}")
-        return sections
+        # Only a clean parse is worth reusing; fallbacks are retried next time
+        if parsed:
+            _store_sections(content_hash, sections)
+        return dict(sections)
     except Exception as e:
         print(f"Error parsing job description: {str(e)}")
         print(f"Full error details: {type(e).__name__}: {str(e)}")
@@ -99,9 +153,119 @@ def parse_job_description(jd_text: str) -> Dict[str, str]:
             "profile": jd_text
         }
 
+EMBEDDING_MODEL = "gemini-embedding-exp-03-07"
+
+_embedding_cache = None
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """This process's handle on the persistent embedding cache, None when it is disabled."""
+    global _embedding_cache
+    config = getattr(settings, "EMBEDDING_CACHE", {})
+    if not config.get("PATH"):
+        return None
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(str(config["PATH"]), int(config.get("MAX_BYTES", 512 * 1024 * 1024)))
+    return _embedding_cache
+
+_embedding_executor = None
+
+def get_embedding_executor() -> EmbeddingExecutor:
+    """This process's embedding executor, sized and rate limited from settings.EMBEDDING_REQUESTS."""
+    global _embedding_executor
+    if _embedding_executor is None:
+        config = getattr(settings, "EMBEDDING_REQUESTS", {})
+        _embedding_executor = EmbeddingExecutor(
+            max_workers=int(config.get("MAX_WORKERS", 4)),
+            rate_limiter=TokenBucket(float(config.get("REQUESTS_PER_SECOND", 0)), float(config.get("BURST", 1))),
+            max_retries=int(config.get("MAX_RETRIES", 5)),
+            backoff_base=float(config.get("BACKOFF_BASE", 1.0)),
+            backoff_max=float(config.get("BACKOFF_MAX", 30.0))
+        )
+    return _embedding_executor
+
+def _completed(fn, *args) -> Future:
+    """Run fn now and wrap its outcome in a finished future."""
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def _embed_batch(texts: List[str], dimension: int) -> List[List[float]]:
+    """One embedding request for a batch of texts."""
+    print(f"Getting embeddings for {len(texts)} texts")
+    vectors = get_embedding_provider().embed(texts, dimension, EMBEDDING_MODEL)
+    print("Received embedding response")
+    if any(not any(vector) for vector in vectors):
+        raise ValueError("Embedding response contains an all-zero vector")
+    return vectors
+
+def get_embeddings(texts: List[str], dimension: int = 1536) -> List[List[float]]:
+    """
+    Get embeddings for many texts with as few provider requests as possible.
+    Duplicate texts are embedded once, texts found in the embedding cache are not sent,
+    and the rest go out EMBEDDING_BATCH_SIZE texts per request, concurrently through
+    the rate-limited embedding executor. A local embedding provider (see
+    LLM_PROVIDER['EMBEDDING_NAME']) is called directly, as computing its vectors
+    is cheaper than reading them from the cache.
+    
+    Args:
+        texts (List[str]): The texts to generate embeddings for
+        dimension (int): Dimension of the embedding vectors (default: 1536)
+    
+    Returns:
+        List[List[float]]: One embedding vector per text, in the order of texts
+    
+    Raises:
+        EmbeddingError: If any text could not be embedded after retries
+    """
+    provider = get_embedding_provider()
+    if not provider.remote:
+        return provider.embed(texts, dimension, EMBEDDING_MODEL)
+    model = provider.model_id(EMBEDDING_MODEL)
+    keys = [embedding_key(model, dimension, text) for text in texts]
+    unique = dict(zip(keys, texts))
+    vectors = {}
+    cache = get_embedding_cache()
+    if cache is not None:
+        try:
+            vectors = {key: vector.tolist() for key, vector in cache.get_many(list(unique)).items()}
+        except Exception as e:
+            print(f"Error reading embedding cache: {str(e)}")
+    missing = [key for key in unique if key not in vectors]
+    batch_size = max(1, int(getattr(settings, "EMBEDDING_BATCH_SIZE", 100)))
+    batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+    executor = get_embedding_executor()
+    if len(batches) == 1:
+        # A single request runs in the caller's thread, skipping the pool hand-off
+        results = [_completed(executor.call, _embed_batch, [unique[key] for key in batches[0]], dimension)]
+    else:
+        results = [executor.submit(_embed_batch, [unique[key] for key in batch], dimension) for batch in batches]
+    failed = 0
+    for batch, result in zip(batches, results):
+        try:
+            fetched = dict(zip(batch, result.result()))
+        except EmbeddingError as e:
+            print(f"Error getting embeddings: {str(e)}")
+            failed += len(batch)
+            continue
+        vectors.update(fetched)
+        if cache is not None:
+            try:
+                cache.set_many(fetched)
+            except Exception as e:
+                print(f"Error writing embedding cache: {str(e)}")
+    if failed:
+        # Never hand out placeholder vectors: they would be indexed as real profiles
+        raise EmbeddingError(f"Could not embed {failed} of {len(missing)} texts")
+    return [vectors[key] for key in keys]
+
 def get_embedding(text: str, dimension: int = 1536) -> List[float]:
     """
-    Get embedding for a text using Gemini API.
+    Get embedding for a text from the configured embedding provider (Gemini by default).
+    Vectors are cached by sha256(model, dimension, text), so a text embedded before
+    is read from the embedding cache instead of calling the API again.
     
     Args:
         text (str): The text to generate embedding for
@@ -109,41 +273,8 @@ def get_embedding(text: str, dimension: int = 1536) -> List[float]:
     
     Returns:
         List[float]: The embedding vector for the text
+    
+    Raises:
+        EmbeddingError: If the text could not be embedded after retries
     """
-    try:
-        print(f"Getting embedding for text of length: {len(text)}")
-        result = client.models.embed_content(
-            model="gemini-embedding-exp-03-07",
-            contents=text
-        )
-        print("Received embedding response")
-        
-        # Convert ContentEmbedding to list of floats
-        embedding = result.embeddings[0]
-        print(f"Embedding type: {type(embedding)}")
-        
-        # Extract the embedding values
-        if hasattr(embedding, 'values'):
-            print("Using embedding.values")
-            values = embedding.values
-        elif isinstance(embedding, list):
-            print("Using embedding as list")
-            values = embedding
-        else:
-            print("Converting embedding to list")
-            values = [float(x) for x in embedding]
-        
-        # Ensure the embedding has the correct dimension
-        if len(values) != dimension:
-            print(f"Warning: Embedding dimension mismatch. Expected {dimension}, got {len(values)}")
-            # Pad or truncate to match the expected dimension
-            if len(values) < dimension:
-                values.extend([0.0] * (dimension - len(values)))
-            else:
-                values = values[:dimension]
-        
-        return values
-    except Exception as e:
-        print(f"Error getting embedding: {str(e)}")
-        print(f"Full error details: {type(e).__name__}: {str(e)}")
-        return [0.0] * dimension
+    return get_embeddings([text], dimension)[0]
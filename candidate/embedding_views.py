@@ -3,7 +3,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authtoken.models import Token
-from .profile_embeddings import ProfileEmbeddingManager, search_candidates
+from .profile_embeddings import get_embedding_manager, search_candidates_page
 from .models import Candidate
 
 @api_view(['POST'])
@@ -26,9 +26,7 @@ def update_embeddings(request):
             "skills": [...],
             "experience": [...],
             "projects": [...],
-            "education": [...],
-            "location": [...],
-            "additional": [...]
+            "location": [...]
         }
     }
     """
@@ -43,12 +41,8 @@ def update_embeddings(request):
         # Get candidate profile
         candidate = Candidate.objects.select_related('user').get(user=user)
         
-        # Generate new embeddings
-        embedding_manager = ProfileEmbeddingManager()
-        embeddings = embedding_manager.generate_embeddings(candidate)
-        
-        # Add to index
-        embedding_manager.add_to_index(candidate)
+        # Generate new embeddings and upsert them into this process's live index
+        embeddings = get_embedding_manager().add_to_index(candidate)
         
         return Response({
             'message': 'Profile embeddings updated successfully',
@@ -57,9 +51,7 @@ def update_embeddings(request):
                 'skills': embeddings['skills_embedding'],
                 'experience': embeddings['experience_embedding'],
                 'projects': embeddings['projects_embedding'],
-                'education': embeddings['education_embedding'],
-                'location': embeddings['location_embedding'],
-                'additional': embeddings['additional_embedding']
+                'location': embeddings['location_embedding']
             }
         })
     except Token.DoesNotExist:
@@ -78,35 +70,75 @@ def update_embeddings(request):
 @api_view(['POST'])
 def search_similar_profiles(request):
     """
-    Search for similar profiles based on a query.
+    Search for similar profiles based on a query, one page at a time.
     Request Body:
     {
-        "q": "search text or job description",
-        "k": 10  # optional, default 10
+        "q": "search text or job description",  # required unless "cursor" is given
+        "cursor": "...",  # optional, "next_cursor" of the previous page
+        "k": 10,  # optional, page size, default 10
+        "nprobe": 16,  # optional, IVF lists to probe
+        "ef_search": 64,  # optional, HNSW search depth
+        "mode": "hybrid",  # optional, "dense", "lexical" (BM25 keywords only) or "hybrid";
+                           # default hybrid, or dense when HYBRID_SEARCH is off
+        "filters": {  # optional, only candidates matching every filter are ranked
+            "is_actively_looking": true,
+            "experience__gte": 3,
+            "experience__lte": 8,
+            "preferred_locations__in": ["Bangalore", "Remote"],
+            "skills": "python AND (django OR flask) AND NOT php"  # boolean skill query
+        }
     }
-    Returns results with weighted scores for different aspects of the profile.
+    Returns results with weighted scores for different aspects of the profile, plus
+    "next_cursor" to fetch the following page from the cached ranking (null on the last page).
+    "total_similarity_score" is the weighted embedding similarity (null in lexical mode) and
+    "keyword_score" the unbounded BM25 score (null in dense mode); "mode" says which were used.
     """
     query = request.data.get('q')
     try:
         k = int(request.data.get('k', 10))
-    except ValueError:
+    except (TypeError, ValueError):
         return Response({
             'error': 'Invalid value for parameter "k". Must be a number.'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    if not query:
+    try:
+        nprobe = int(request.data['nprobe']) if request.data.get('nprobe') not in (None, '') else None
+        ef_search = int(request.data['ef_search']) if request.data.get('ef_search') not in (None, '') else None
+        if (nprobe is not None and nprobe < 1) or (ef_search is not None and ef_search < 1):
+            raise ValueError
+    except (TypeError, ValueError):
+        # Lists and objects from JSON bodies raise TypeError
+        return Response({
+            'error': 'Invalid value for parameter "nprobe" or "ef_search". Must be a number of at least 1.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    filters = request.data.get('filters')
+    if filters is not None and not isinstance(filters, dict):
+        return Response({
+            'error': 'Invalid value for parameter "filters". Must be an object.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    mode = request.data.get('mode') or None
+    cursor = request.data.get('cursor')
+    if not query and not cursor:
         return Response({
             'error': 'Field "q" is required in the request body.'
         }, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        results = search_candidates(query, k)
+        page = search_candidates_page(query, k, nprobe=nprobe, ef_search=ef_search,
+                                      filters=filters, cursor=cursor, mode=mode)
+        query, results = page['query'], page['results']
         if not results:
             return Response({
                 'message': 'No similar profiles found',
                 'query': query,
                 'count': 0,
-                'results': []
+                'results': [],
+                'offset': page['offset'],
+                'total': page['total'],
+                'mode': page['mode'],
+                'next_cursor': page['next_cursor']
             })
         
         # Format the response to include aspect scores and queries
@@ -118,6 +150,8 @@ def search_similar_profiles(request):
                 'current_role': result['current_role'],
                 'company': result['company'],
                 'total_similarity_score': result['total_similarity_score'],
+                'keyword_score': result.get('keyword_score'),
+                'mode': result.get('mode'),
                 'aspect_scores': {
                     'profile': result['aspect_scores'].get('profile', 0),
                     'skills': result['aspect_scores'].get('skills', 0),
@@ -143,7 +177,11 @@ def search_similar_profiles(request):
         return Response({
             'results': formatted_results,
             'query': query,
+            'mode': page['mode'],
             'count': len(formatted_results),
+            'offset': page['offset'],
+            'total': page['total'],
+            'next_cursor': page['next_cursor'],
             'weights': {
                 'profile': 0.2,
                 'skills': 0.25,
@@ -0,0 +1,47 @@
+import threading
+import time
+from typing import Any, Callable
+
+class IndexRegistry:
+    """
+    Holds the live index object of this process.
+
+    The object is created on first use and replaced with a fresh one when it
+    reports itself stale (another process published a newer generation).
+    Staleness is checked at most once per check_interval seconds, so searches
+    see writes from other processes within that delay without touching disk
+    on every request.
+    """
+
+    def __init__(self, factory: Callable[[], Any], check_interval: float = 2.0):
+        self._factory = factory
+        self._check_interval = check_interval
+        self._instance = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """Return the live index object, reloading it if a newer generation was published."""
+        instance = self._instance
+        if instance is not None and time.monotonic() - self._last_check < self._check_interval:
+            return instance
+        with self._lock:
+            now = time.monotonic()
+            if self._instance is None:
+                self._instance = self._factory()
+            elif now - self._last_check >= self._check_interval and self._instance.is_stale():
+                print("Index generation changed on disk, reloading")
+                # Swap in a new object; requests still holding the old one finish on it
+                self._instance = self._factory()
+            self._last_check = now
+            return self._instance
+
+    def peek(self) -> Any:
+        """Return the live index object if one was created, without creating or reloading it."""
+        return self._instance
+
+    def reset(self) -> None:
+        """Forget the live object so the next get() loads from disk again."""
+        with self._lock:
+            self._instance = None
+            self._last_check = 0.0
@@ -0,0 +1,169 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+
+# Snapshot layout: every publish writes a new set of files tagged with its
+# generation number ({path}.g{N}_*), then atomically replaces the manifest
+# ({path}.manifest.json) that names them. The manifest rename is the commit
+# point, so readers always see an index and id mapping from the same generation.
+
+def manifest_path(path: str) -> str:
+    return f"{path}.manifest.json"
+
+def generation_file(path: str, generation: int, name: str) -> str:
+    """File name of one part of a snapshot generation."""
+    return f"{path}.g{generation}_{name}"
+
+def read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """The published manifest for the index at path, or None if nothing was published."""
+    try:
+        with open(manifest_path(path)) as manifest_file:
+            return json.load(manifest_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def read_generation(path: str) -> int:
+    """Generation last published for the index at path, 0 if none was."""
+    manifest = read_manifest(path)
+    return int(manifest["generation"]) if manifest else 0
+
+def fsync_path(path: str) -> None:
+    """Flush a file (or directory entry table) to stable storage."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def atomic_write(path: str):
+    """
+    Binary file to write in place of path: a temp file that is fsynced and renamed over
+    path when the block succeeds, and removed when it fails, leaving path untouched.
+    """
+    temp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(temp_path, "wb") as temp_file:
+            yield temp_file
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    fsync_path(os.path.dirname(os.path.abspath(path)))
+
+def write_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    """Atomically publish a manifest: write a temp file, fsync it, rename it into place."""
+    target = manifest_path(path)
+    temp_path = f"{target}.tmp{os.getpid()}"
+    with open(temp_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+        manifest_file.flush()
+        os.fsync(manifest_file.fileno())
+    os.replace(temp_path, target)
+    fsync_path(os.path.dirname(os.path.abspath(target)))
+
+def remove_old_generations(path: str, keep: int) -> None:
+    """
+    Delete snapshot files older than the last `keep` generations.
+    Processes that still map an unlinked file keep reading it until they reload.
+    """
+    current = read_generation(path)
+    pattern = re.compile(re.escape(os.path.basename(path)) + r"\.g(\d+)_")
+    for name in glob.glob(f"{glob.escape(path)}.g*_*"):
+        match = pattern.match(os.path.basename(name))
+        if match and int(match.group(1)) <= current - keep:
+            try:
+                os.remove(name)
+            except OSError as e:
+                print(f"Could not remove old snapshot file {name}: {str(e)}")
+
+def write_array(array: np.ndarray, path: str) -> None:
+    """Write a .npy file and flush it to stable storage."""
+    with open(path, "wb") as array_file:
+        np.save(array_file, array)
+        array_file.flush()
+        os.fsync(array_file.fileno())
+
+@contextmanager
+def index_lock(path: str):
+    """Exclusive lock across processes for publishing the index at path."""
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+class SnapshotWriter:
+    """
+    Debounces snapshot flushes.
+
+    Callers report each change with mark_dirty(). The flush callback runs once
+    max_pending changes have accumulated, or flush_interval seconds after the
+    first unflushed change, on a background timer thread. Anything still
+    pending is flushed at interpreter exit.
+    """
+
+    def __init__(self, flush: Callable[[], None], flush_interval: float = 5.0, max_pending: int = 100):
+        self._flush = flush
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._pending = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        # Weak reference so replaced writers can still be garbage collected
+        writer = weakref.ref(self)
+        atexit.register(lambda: writer() and writer().flush())
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _start_timer(self) -> None:
+        """Schedule a flush after the interval unless one is already scheduled (lock held)."""
+        if self._timer is None:
+            self._timer = threading.Timer(self._flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def mark_dirty(self, count: int = 1) -> None:
+        """Record unflushed changes and flush now or later depending on the thresholds."""
+        with self._lock:
+            self._pending += count
+            flush_now = self._pending >= self._max_pending
+            if not flush_now:
+                self._start_timer()
+        if flush_now:
+            # Flush off the caller's thread so edits never wait on snapshot I/O
+            threading.Thread(target=self.flush, daemon=True).start()
+
+    def flush(self) -> None:
+        """Flush pending changes now, if there are any."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, 0
+        started = time.perf_counter()
+        try:
+            self._flush()
+            print(f"Index snapshot with {pending} changes flushed in {time.perf_counter() - started:.3f}s")
+        except Exception as e:
+            print(f"Error flushing index snapshot, retrying later: {str(e)}")
+            with self._lock:
+                self._pending += pending
+                self._start_timer()
@@ -0,0 +1,152 @@
+import os
+import re
+from typing import Iterable, List, Optional
+import numpy as np
+from .index_snapshots import atomic_write
+
+# Hashing constants. Arithmetic wraps modulo 2**64 on purpose.
+_BASE = np.uint64(0x100000001B3)  # Odd, so it is invertible modulo 2**64
+_BASE_INVERSE = np.uint64(pow(0x100000001B3, -1, 2 ** 64))
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_MIX2 = np.uint64(0xBF58476D1CE4E5B9)
+
+_NON_WORD = re.compile(r"[^a-z0-9+#]+")
+
+def _mix(values: np.ndarray, salt: int) -> np.ndarray:
+    """Scramble 64-bit hashes (splitmix64 finalizer), salted per feature kind or projection."""
+    with np.errstate(over="ignore"):
+        values = (values ^ np.uint64(salt)) * _MIX
+        values ^= values >> np.uint64(31)
+        values *= _MIX2
+        values ^= values >> np.uint64(29)
+    return values
+
+class LexicalEmbedder:
+    """
+    Dense embeddings from text alone, with no model download or network.
+
+    Each text is lowercased and split into words. The features are word
+    unigrams and bigrams plus character n-grams (CHAR_NGRAMS) of the padded
+    words. Features are hashed into 2**hash_bits buckets and weighted by
+    sublinear TF times IDF; IDF is 1 until fit() has seen a corpus. The sparse
+    TF-IDF vector is then reduced to `dimension` by a fixed sparse random
+    projection: every bucket adds to `projections` output coordinates with a
+    random sign, all derived from the bucket hash, so the matrix is never
+    stored. Outputs are L2-normalized.
+
+    All steps run as NumPy operations over a whole batch of texts. Substring
+    hashes come from one prefix sum over the concatenated bytes.
+    """
+
+    CHAR_NGRAMS = (3, 4, 5)
+    version = "lexical-v1"
+
+    def __init__(self, dimension: int = 1536, hash_bits: int = 20, projections: int = 4,
+                 idf: Optional[np.ndarray] = None):
+        self.dimension = dimension
+        self.hash_bits = hash_bits
+        self.projections = projections
+        self.idf = idf
+
+    @property
+    def n_features(self) -> int:
+        return 1 << self.hash_bits
+
+    def _features(self, texts: List[str]):
+        """Document number and bucket of every feature occurrence in a batch of texts."""
+        # Words separated by single spaces, one space on each side and a NUL between documents
+        docs = [" " + " ".join(_NON_WORD.split(text.lower())).strip() + " " for text in texts]
+        data = np.frombuffer("\0".join(docs).encode("utf-8"), dtype=np.uint8)
+        lengths = np.array([len(doc.encode("utf-8")) + 1 for doc in docs], dtype=np.int64)
+        doc_of = np.repeat(np.arange(len(docs)), lengths)[:len(data)]
+
+        # Position-weighted prefix sums: hash(l, r) = (S[r] - S[l]) * BASE**-l is the same
+        # polynomial hash for equal substrings wherever they occur
+        with np.errstate(over="ignore"):
+            powers = np.cumprod(np.full(len(data) + 1, _BASE, dtype=np.uint64)) * _BASE_INVERSE
+            inverse_powers = np.cumprod(np.full(len(data) + 1, _BASE_INVERSE, dtype=np.uint64)) * _BASE
+            prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+            prefix[1:] = np.cumsum((data.astype(np.uint64) + np.uint64(1)) * powers[:-1])
+
+        def substrings(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+            with np.errstate(over="ignore"):
+                return (prefix[ends] - prefix[starts]) * inverse_powers[starts]
+
+        doc_ids, hashes = [], []
+        spaces = np.flatnonzero(data == ord(" "))
+        # Words: between consecutive spaces of the same document
+        starts, ends = spaces[:-1] + 1, spaces[1:]
+        words = (ends > starts) & (doc_of[starts] == doc_of[ends])
+        word_starts, word_ends = starts[words], ends[words]
+        doc_ids.append(doc_of[word_starts])
+        hashes.append(_mix(substrings(word_starts, word_ends), 1))
+        # Word bigrams: a word and the next one in the same document
+        same_doc = doc_of[word_starts[1:]] == doc_of[word_starts[:-1]]
+        doc_ids.append(doc_of[word_starts[:-1]][same_doc])
+        hashes.append(_mix(substrings(word_starts[:-1][same_doc], word_ends[1:][same_doc]), 2))
+        # Character n-grams, including the spaces around words, never crossing documents
+        for n in self.CHAR_NGRAMS:
+            if len(data) < n:
+                continue
+            starts = np.arange(len(data) - n + 1)
+            window = data[starts + n - 1]
+            valid = (doc_of[starts] == doc_of[starts + n - 1]) & (window != 0) & (data[starts] != 0)
+            starts = starts[valid]
+            doc_ids.append(doc_of[starts])
+            hashes.append(_mix(substrings(starts, starts + n), 2 + n))
+
+        doc_ids = np.concatenate(doc_ids).astype(np.int64)
+        buckets = (np.concatenate(hashes) >> np.uint64(64 - self.hash_bits)).astype(np.int64)
+        return doc_ids, buckets
+
+    def _term_frequencies(self, texts: List[str]):
+        """Distinct (document, bucket) pairs with their counts."""
+        doc_ids, buckets = self._features(texts)
+        keys, counts = np.unique(doc_ids * self.n_features + buckets, return_counts=True)
+        return keys // self.n_features, keys % self.n_features, counts
+
+    def fit(self, batches: Iterable[List[str]]) -> "LexicalEmbedder":
+        """Learn smoothed IDF weights from a corpus given as batches of texts."""
+        document_frequency = np.zeros(self.n_features, dtype=np.int64)
+        documents = 0
+        for texts in batches:
+            _, buckets, _ = self._term_frequencies(texts)
+            document_frequency += np.bincount(buckets, minlength=self.n_features)
+            documents += len(texts)
+        self.idf = (np.log((1 + documents) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self
+
+    def save_idf(self, path: str) -> None:
+        """Write the IDF weights next to the index, replacing the file atomically."""
+        with atomic_write(path) as idf_file:
+            np.save(idf_file, self.idf)
+
+    def load_idf(self, path: str) -> bool:
+        """Load IDF weights saved by save_idf; False if there are none or they do not fit."""
+        if not os.path.exists(path):
+            return False
+        idf = np.load(path)
+        if len(idf) != self.n_features:
+            return False
+        self.idf = idf
+        return True
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Normalized float32 embeddings of a batch of texts, one row per text."""
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if not texts:
+            return vectors
+        doc_ids, buckets, counts = self._term_frequencies(texts)
+        weights = (1 + np.log(counts)).astype(np.float32)
+        if self.idf is not None:
+            weights *= self.idf[buckets]
+        flat = vectors.reshape(-1)
+        for projection in range(self.projections):
+            mixed = _mix(buckets.astype(np.uint64), 100 + projection)
+            columns = (mixed % np.uint64(self.dimension)).astype(np.int64)
+            signs = np.where(mixed >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+            flat += np.bincount(doc_ids * self.dimension + columns, weights=weights * signs,
+                                minlength=flat.size).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        return vectors
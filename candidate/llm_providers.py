@@ -0,0 +1,307 @@
+import hashlib
+import os
+import threading
+import time
+import types
+import typing
+from typing import Any, Dict, Iterable, List, Type
+import numpy as np
+from django.conf import settings
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from .lexical_embedder import LexicalEmbedder
+
+load_dotenv()
+
+class LLMProvider:
+    """
+    Interface of the model provider behind embeddings, job description
+    parsing and resume extraction.
+
+    embed() returns one vector of exactly `dimension` floats per text, in
+    order. generate() returns the text of a completion. generate_structured()
+    returns an instance of a pydantic model parsed from a JSON completion.
+
+    Remote providers sit behind the embedding cache and the rate-limited
+    executor; local ones are called directly. Providers that learn from the
+    corpus implement fit(), which index rebuilds call with every profile text
+    before embedding, and save_fit(), called once the rebuilt index is published.
+    """
+
+    name = None
+    remote = True
+
+    def model_id(self, model: str) -> str:
+        """Identity of a model's outputs, used to key caches so providers never share entries."""
+        return f"{self.name}/{model}"
+
+    def embed(self, texts: List[str], dimension: int, model: str) -> List[List[float]]:
+        raise NotImplementedError
+
+    def generate(self, prompt: str, model: str) -> str:
+        raise NotImplementedError
+
+    def generate_structured(self, prompt: str, schema: Type[BaseModel], model: str) -> BaseModel:
+        raise NotImplementedError
+
+    @property
+    def fittable(self) -> bool:
+        return False
+
+    def fit(self, batches: Iterable[List[str]]) -> None:
+        pass
+
+    def save_fit(self) -> None:
+        pass
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through google-genai. The client is created on first use, not at import."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str = None):
+        self._api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def model_id(self, model: str) -> str:
+        # Bare model names, so keys cached before providers existed stay valid
+        return model
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(api_key=self._api_key or os.getenv("GEMINI_API"))
+        return self._client
+
+    def _values(self, embedding: Any, dimension: int) -> List[float]:
+        """Float values of one embedding from the API, padded or truncated to dimension."""
+        if hasattr(embedding, 'values'):
+            values = list(embedding.values)
+        elif isinstance(embedding, list):
+            values = embedding
+        else:
+            values = [float(x) for x in embedding]
+        if len(values) != dimension:
+            print(f"Warning: Embedding dimension mismatch. Expected {dimension}, got {len(values)}")
+            if len(values) < dimension:
+                values.extend([0.0] * (dimension - len(values)))
+            else:
+                values = values[:dimension]
+        return values
+
+    def embed(self, texts: List[str], dimension: int, model: str) -> List[List[float]]:
+        result = self.client.models.embed_content(model=model, contents=texts)
+        if len(result.embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(result.embeddings)}")
+        return [self._values(embedding, dimension) for embedding in result.embeddings]
+
+    def generate(self, prompt: str, model: str) -> str:
+        return self.client.models.generate_content(model=model, contents=prompt).text
+
+    def generate_structured(self, prompt: str, schema: Type[BaseModel], model: str) -> BaseModel:
+        response = self.client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": schema,
+            },
+        )
+        if response.parsed is None:
+            raise ValueError(f"Response is not a valid {schema.__name__}: {response.text}")
+        return response.parsed
+
+# Words the offline provider draws from. None of them is a section heading
+# keyword of the job description parser.
+_OFFLINE_WORDS = [
+    "python", "django", "react", "aws", "docker", "kubernetes", "postgresql", "java", "golang",
+    "typescript", "spark", "kafka", "terraform", "pytorch", "redis", "graphql", "bangalore",
+    "remote", "mumbai", "pune", "backend", "frontend", "platform", "data", "mobile", "senior",
+    "lead", "startup", "fintech", "ecommerce", "healthcare", "analytics", "payments", "search",
+]
+
+# Headings in the layout parse_job_description reads back
+_OFFLINE_SECTIONS = [
+    "Required Skills and Technologies", "Experience Requirements", "Project Requirements",
+    "Location and Work Arrangement", "General Profile Requirements",
+]
+
+class OfflineProvider(LLMProvider):
+    """
+    Deterministic stand-in that never touches the network.
+
+    Embeddings are unit vectors seeded by a hash of the text, so equal texts
+    always get equal vectors. Completions are canned, seeded by a hash of the
+    prompt: generate() answers in the section layout the job description
+    parser reads, and generate_structured() fills every field of the schema
+    with valid values. Each call sleeps for `latency` seconds (plus
+    `latency_per_item` per embedded text) to stand in for network time.
+    """
+
+    name = "offline"
+
+    def __init__(self, latency: float = 0.0, latency_per_item: float = 0.0):
+        self.latency = latency
+        self.latency_per_item = latency_per_item
+
+    def _rng(self, text: str) -> np.random.Generator:
+        return np.random.default_rng(int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little"))
+
+    def _wait(self, items: int = 1) -> None:
+        delay = self.latency + self.latency_per_item * items
+        if delay > 0:
+            time.sleep(delay)
+
+    def embed(self, texts: List[str], dimension: int, model: str) -> List[List[float]]:
+        self._wait(len(texts))
+        vectors = []
+        for text in texts:
+            vector = self._rng(f"{model}\n{text}").standard_normal(dimension)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+    def _words(self, rng: np.random.Generator, count: int) -> str:
+        return " ".join(rng.choice(_OFFLINE_WORDS, count))
+
+    def generate(self, prompt: str, model: str) -> str:
+        self._wait()
+        rng = self._rng(prompt)
+        return "\n".join(
+            f"**{heading}**\n{self._words(rng, 6)}\n{self._words(rng, 6)}" for heading in _OFFLINE_SECTIONS
+        )
+
+    def _fake(self, annotation: Any, field: str, rng: np.random.Generator) -> Any:
+        """A valid value for a field annotation."""
+        origin = typing.get_origin(annotation)
+        if origin in (typing.Union, types.UnionType):
+            options = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+            return self._fake(options[0], field, rng) if options else None
+        if origin is list:
+            (item,) = typing.get_args(annotation) or (str,)
+            return [self._fake(item, field, rng) for _ in range(int(rng.integers(1, 4)))]
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return self._fake_model(annotation, rng)
+        if annotation is bool:
+            return bool(rng.integers(0, 2))
+        if annotation is int:
+            return int(rng.integers(0, 20))
+        if annotation is float:
+            return float(rng.random())
+        if "email" in field:
+            return f"{self._words(rng, 1)}{int(rng.integers(1000, 10 ** 6))}@example.com"
+        if "url" in field or "link" in field:
+            return f"https://example.com/{self._words(rng, 1)}"
+        if "date" in field:
+            return f"{int(rng.integers(2010, 2025))}-{int(rng.integers(1, 13)):02d}"
+        return self._words(rng, 3)
+
+    def _fake_model(self, schema: Type[BaseModel], rng: np.random.Generator) -> BaseModel:
+        return schema(**{
+            field: self._fake(info.annotation, field, rng) for field, info in schema.model_fields.items()
+        })
+
+    def generate_structured(self, prompt: str, schema: Type[BaseModel], model: str) -> BaseModel:
+        self._wait()
+        return self._fake_model(schema, self._rng(prompt))
+
+class LexicalProvider(LLMProvider):
+    """
+    In-process hashed TF-IDF embeddings (see LexicalEmbedder): no network, no
+    model download, thousands of texts per second. It only embeds, so it is
+    meant as the embedding provider (LLM_PROVIDER['EMBEDDING_NAME']) while
+    Gemini is slow or down, or as a cheap first-stage engine. Its vectors live
+    in a different space from any model's, so switching to or from it needs an
+    index rebuild.
+
+    IDF weights are fitted on the profile texts at every rebuild and saved to
+    idf_path; every process reloads them when the file changes.
+    """
+
+    name = "lexical"
+    remote = False
+
+    def __init__(self, idf_path: str = None):
+        self.idf_path = idf_path
+        self._idf = None
+        self._idf_mtime = None
+        self._lock = threading.Lock()
+
+    def model_id(self, model: str) -> str:
+        return f"{self.name}/{LexicalEmbedder.version}"
+
+    def _current_idf(self) -> Any:
+        """IDF weights, reloaded when another process saved new ones."""
+        if not self.idf_path:
+            return self._idf
+        try:
+            mtime = os.stat(self.idf_path).st_mtime_ns
+        except OSError:
+            return self._idf
+        if mtime != self._idf_mtime:
+            with self._lock:
+                if mtime != self._idf_mtime:
+                    embedder = LexicalEmbedder()
+                    if embedder.load_idf(self.idf_path):
+                        self._idf = embedder.idf
+                    else:
+                        print(f"Warning: Ignoring lexical IDF weights in {self.idf_path}")
+                    self._idf_mtime = mtime
+        return self._idf
+
+    def embed(self, texts: List[str], dimension: int, model: str) -> List[List[float]]:
+        return LexicalEmbedder(dimension, idf=self._current_idf()).embed(texts).tolist()
+
+    @property
+    def fittable(self) -> bool:
+        return True
+
+    def fit(self, batches: Iterable[List[str]]) -> None:
+        """Fit IDF weights and use them in this process right away."""
+        idf = LexicalEmbedder().fit(batches).idf
+        with self._lock:
+            self._idf = idf
+
+    def save_fit(self) -> None:
+        """Save the fitted IDF weights for the other processes."""
+        if not self.idf_path or self._idf is None:
+            return
+        LexicalEmbedder(idf=self._idf).save_idf(self.idf_path)
+        with self._lock:
+            self._idf_mtime = os.stat(self.idf_path).st_mtime_ns
+
+_PROVIDERS = {
+    "gemini": GeminiProvider,
+    "offline": OfflineProvider,
+    "lexical": LexicalProvider,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+def get_provider(name: str = None) -> LLMProvider:
+    """The provider registered under name, by default the one selected in settings.LLM_PROVIDER."""
+    config: Dict[str, Any] = getattr(settings, "LLM_PROVIDER", {})
+    name = name or config.get("NAME", "gemini")
+    if name not in _PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name}")
+    with _instances_lock:
+        if name not in _instances:
+            if name == "offline":
+                _instances[name] = OfflineProvider(
+                    float(config.get("OFFLINE_LATENCY", 0.0)),
+                    float(config.get("OFFLINE_LATENCY_PER_ITEM", 0.0))
+                )
+            elif name == "lexical":
+                _instances[name] = LexicalProvider(config.get("LEXICAL_IDF_PATH"))
+            else:
+                _instances[name] = _PROVIDERS[name]()
+        return _instances[name]
+
+def get_embedding_provider() -> LLMProvider:
+    """The provider that embeds profiles and queries: LLM_PROVIDER['EMBEDDING_NAME'], else the main provider."""
+    config: Dict[str, Any] = getattr(settings, "LLM_PROVIDER", {})
+    return get_provider(config.get("EMBEDDING_NAME") or None)
@@ -0,0 +1,63 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from candidate.profile_embeddings import get_embedding_manager, ASPECTS
+from candidate.vector_index import INDEX_TYPES, index_bytes_per_vector, storage_report
+from candidate.embedding_utils import get_embedding_cache
+
+class Command(BaseCommand):
+    help = 'Report memory per vector and recall against exact search for each index storage type'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aspect', default='skills', choices=ASPECTS,
+                            help='Aspect index whose vectors are compared')
+        parser.add_argument('--query-aspect', default='profile', choices=ASPECTS,
+                            help='Aspect whose stored vectors are used as queries')
+        parser.add_argument('--queries', type=int, default=100, help='Number of sampled queries')
+        parser.add_argument('--k', type=int, default=10, help='Cut-off for recall@k')
+        parser.add_argument('--index-type', default='flat', choices=INDEX_TYPES,
+                            help='Index type built for every storage type')
+
+    def handle(self, *args, **options):
+        manager = get_embedding_manager()
+        if manager.ntotal == 0:
+            raise CommandError('The candidate index is empty. Build it with initialize_index first.')
+
+        self.stdout.write(
+            f'Live index: {manager.ntotal} candidates, {manager.index_type}/{manager.storage}, '
+            f'rerank {"on" if manager.reranking else "off"}'
+        )
+        self.stdout.write(
+            f'  base segment: {len(manager.base_ids)} candidates (generation {manager.generation}), '
+            f'delta segment: {len(manager.delta_ids)} candidates, {len(manager.tombstones)} tombstones'
+        )
+        for aspect in ASPECTS:
+            self.stdout.write(f'  {aspect}: {index_bytes_per_vector(manager.indexes[aspect]):.0f} bytes/vector')
+        cache = get_embedding_cache()
+        if cache is not None:
+            stats = cache.stats()
+            self.stdout.write(
+                f'Embedding cache: {stats["entries"]} vectors, {stats["bytes"] / 2**20:.1f} of '
+                f'{stats["max_bytes"] / 2**20:.0f} MiB'
+            )
+
+        vectors = np.ascontiguousarray(manager._stored_vectors(options['aspect']), dtype=np.float32)
+        query_pool = manager._stored_vectors(options['query_aspect'])
+        sample = np.random.default_rng(0).choice(
+            len(query_pool), min(options['queries'], len(query_pool)), replace=False
+        )
+        queries = np.ascontiguousarray(query_pool[sample], dtype=np.float32)
+
+        self.stdout.write(
+            f'\nStorage comparison on "{options["aspect"]}" ({len(vectors)} vectors, '
+            f'{len(queries)} queries, {options["index_type"]}, recall@{options["k"]}):'
+        )
+        self.stdout.write(f'{"storage":<16}{"bytes/vector":>14}{"vs float32":>12}{"recall":>10}{"ms/query":>10}')
+        report = storage_report(vectors, queries, options['k'], options['index_type'], manager.index_config)
+        baseline = report[0]['bytes_per_vector']
+        for row in report:
+            self.stdout.write(
+                f'{row["storage"]:<16}{row["bytes_per_vector"]:>14.0f}'
+                f'{baseline / row["bytes_per_vector"]:>11.1f}x'
+                f'{row["recall_at_k"]:>10.3f}{row["search_ms_per_query"]:>10.3f}'
+            )
+        self.stdout.write(self.style.SUCCESS('Index report completed'))
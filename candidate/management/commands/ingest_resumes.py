@@ -0,0 +1,216 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Tuple
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from candidate.models import CandidateEmbeddingState
+from candidate.profile_embeddings import (
+    deferred_profile_refreshes, flush_profile_refreshes, refresh_profile_embeddings
+)
+from candidate.resume_jobs import save_resume_profile
+from candidate.resume_parser import ResumeData, extract_resume_details, extract_text_from_path
+
+RESUME_EXTENSIONS = ('.pdf', '.docx')
+
+class Command(BaseCommand):
+    help = (
+        'Create candidate profiles from a directory of PDF and DOCX resumes. Text is extracted '
+        'in a process pool, resumes are parsed concurrently, each profile is written in one '
+        'transaction and embedded in batches. Progress is checkpointed, so an interrupted run '
+        'picks up where it stopped when started again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory searched recursively for resumes')
+        parser.add_argument('--extract-workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes extracting text from files')
+        parser.add_argument('--parse-workers', type=int, default=8,
+                            help='Resumes parsed by the LLM at once')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Resumes per batch; each batch is embedded together once written')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Checkpoint file (default .ingest_checkpoint.jsonl in the directory)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint and process every resume again')
+        parser.add_argument('--source', default='resume import',
+                            help='Source recorded on the created candidates')
+        parser.add_argument('--limit', type=int, default=None, help='Process at most this many resumes')
+
+    def handle(self, *args, **options):
+        directory = os.path.abspath(options['directory'])
+        if not os.path.isdir(directory):
+            raise CommandError(f'{directory} is not a directory')
+        if options['batch_size'] < 1 or options['parse_workers'] < 1 or options['extract_workers'] < 1:
+            raise CommandError('Batch size and worker counts must be at least 1')
+        checkpoint_path = options['checkpoint'] or os.path.join(directory, '.ingest_checkpoint.jsonl')
+        if options['restart'] and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        done = self._read_checkpoint(checkpoint_path)
+        paths = sorted(
+            os.path.relpath(os.path.join(root, name), directory)
+            for root, _, names in os.walk(directory)
+            for name in names
+            if name.lower().endswith(RESUME_EXTENSIONS)
+        )
+        pending = [path for path in paths if path not in done]
+        if options['limit'] is not None:
+            pending = pending[:options['limit']]
+        self.stdout.write(f'{len(paths)} resumes found, {len(paths) - len(pending)} already processed, {len(pending)} to go')
+
+        self.stats = {stage: {'items': 0, 'seconds': 0.0} for stage in ('extract', 'parse', 'write', 'embed')}
+        self.failed = 0
+        started = time.perf_counter()
+        with deferred_profile_refreshes(), open(checkpoint_path, 'a') as checkpoint, \
+                ProcessPoolExecutor(options['extract_workers'], mp_context=multiprocessing.get_context('spawn')) as extract_pool, \
+                ThreadPoolExecutor(options['parse_workers']) as parse_pool:
+            # Candidates a previous run saved but did not get to embed
+            saved_ids = [entry['candidate_id'] for entry in done.values() if entry.get('candidate_id')]
+            embedded = set(
+                CandidateEmbeddingState.objects.filter(candidate_id__in=saved_ids).values_list('candidate_id', flat=True)
+            )
+            unembedded = [candidate_id for candidate_id in saved_ids if candidate_id not in embedded]
+            for start in range(0, len(unembedded), options['batch_size']):
+                self._embed(unembedded[start:start + options['batch_size']])
+
+            batches = [pending[start:start + options['batch_size']] for start in range(0, len(pending), options['batch_size'])]
+            # Text of the next batch is extracted while the current one is parsed
+            extraction = self._submit_extraction(extract_pool, directory, batches[0]) if batches else None
+            for number, batch in enumerate(batches):
+                texts = self._collect_extraction(extraction)
+                if number + 1 < len(batches):
+                    extraction = self._submit_extraction(extract_pool, directory, batches[number + 1])
+                candidate_ids = self._parse_and_write(parse_pool, directory, batch, texts, checkpoint, options['source'])
+                self._embed(candidate_ids)
+                elapsed = time.perf_counter() - started
+                processed = sum(len(b) for b in batches[:number + 1])
+                self.stdout.write(
+                    f'{processed}/{len(pending)} resumes, {self.stats["write"]["items"]} saved, '
+                    f'{self.failed} failed, {processed / elapsed:.2f} resumes/s'
+                )
+        flush_profile_refreshes()
+        self._report(time.perf_counter() - started)
+
+    def _read_checkpoint(self, path: str) -> Dict[str, Dict[str, Any]]:
+        """Resumes already saved or failed for good, by path relative to the directory."""
+        done = {}
+        if os.path.exists(path):
+            with open(path) as checkpoint:
+                for line in checkpoint:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    done[entry['file']] = entry
+        return done
+
+    def _submit_extraction(self, pool: ProcessPoolExecutor, directory: str,
+                           batch: List[str]) -> Tuple[float, List[float], Dict[Any, str]]:
+        submitted_at, finished_at = time.perf_counter(), []
+        futures = {}
+        for path in batch:
+            future = pool.submit(extract_text_from_path, os.path.join(directory, path))
+            future.add_done_callback(lambda _: finished_at.append(time.perf_counter()))
+            futures[future] = path
+        return submitted_at, finished_at, futures
+
+    def _collect_extraction(self, extraction: Tuple[float, List[float], Dict[Any, str]]) -> Dict[str, Any]:
+        """Text of each resume of a batch, or the exception that stopped its extraction."""
+        submitted_at, finished_at, futures = extraction
+        texts = {}
+        for future in as_completed(futures):
+            try:
+                texts[futures[future]] = future.result()
+            except Exception as e:
+                texts[futures[future]] = e
+        self.stats['extract']['items'] += len(futures)
+        # Until the last file was extracted, not until the results were needed
+        self.stats['extract']['seconds'] += max(finished_at, default=time.perf_counter()) - submitted_at
+        return texts
+
+    def _parse(self, text: Any) -> ResumeData:
+        if isinstance(text, Exception):
+            # Unreadable files fail the same way on every run
+            raise ValueError(f'Could not extract text: {str(text)}')
+        if not text or not text.strip():
+            raise ValueError('No text found in the resume')
+        resume_data = extract_resume_details(text)
+        if not resume_data:
+            # Transient as far as we know, so not checkpointed and retried on the next run
+            raise Exception('Failed to parse resume')
+        if not resume_data.personal_info or not resume_data.personal_info.email:
+            raise ValueError('No email address found in the resume')
+        return resume_data
+
+    def _parse_and_write(self, pool: ThreadPoolExecutor, directory: str, batch: List[str], texts: Dict[str, Any],
+                         checkpoint, source: str) -> List[int]:
+        """Parse a batch concurrently and write each profile as soon as it is parsed. Returns the new candidate ids."""
+        parse_started = time.perf_counter()
+        futures = {pool.submit(self._parse, texts[path]): path for path in batch}
+        candidate_ids = []
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                resume_data = future.result()
+            except Exception as e:
+                self._fail(checkpoint, path, e, permanent=isinstance(e, ValueError))
+                continue
+            write_started = time.perf_counter()
+            name = None
+            try:
+                with open(os.path.join(directory, path), 'rb') as resume_file:
+                    name = default_storage.save(f'resumes/{os.path.basename(path)}', File(resume_file))
+                candidate = save_resume_profile(None, resume_data, name, source=source)
+            except Exception as e:
+                if name:
+                    default_storage.delete(name)
+                # Duplicate emails fail the same way on every run
+                self._fail(checkpoint, path, e, permanent=isinstance(e, IntegrityError))
+                continue
+            finally:
+                self.stats['write']['seconds'] += time.perf_counter() - write_started
+            self.stats['write']['items'] += 1
+            candidate_ids.append(candidate.id)
+            self._checkpoint(checkpoint, {'file': path, 'status': 'saved', 'candidate_id': candidate.id})
+        self.stats['parse']['items'] += len(batch)
+        self.stats['parse']['seconds'] += time.perf_counter() - parse_started
+        return candidate_ids
+
+    def _embed(self, candidate_ids: List[int]) -> None:
+        if not candidate_ids:
+            return
+        embed_started = time.perf_counter()
+        try:
+            refresh_profile_embeddings(candidate_ids)
+        except Exception as e:
+            # Saved profiles without embeddings are embedded at the start of the next run
+            self.stderr.write(f'Error embedding {len(candidate_ids)} candidates: {str(e)}')
+            return
+        finally:
+            self.stats['embed']['seconds'] += time.perf_counter() - embed_started
+        self.stats['embed']['items'] += len(candidate_ids)
+
+    def _checkpoint(self, checkpoint, entry: Dict[str, Any]) -> None:
+        checkpoint.write(json.dumps(entry) + '\n')
+        checkpoint.flush()
+
+    def _fail(self, checkpoint, path: str, error: Exception, permanent: bool) -> None:
+        self.failed += 1
+        self.stderr.write(f'{path}: {str(error)}')
+        if permanent:
+            self._checkpoint(checkpoint, {'file': path, 'status': 'failed', 'error': str(error)})
+
+    def _report(self, elapsed: float) -> None:
+        self.stdout.write(f'\n{"stage":<10}{"items":>8}{"seconds":>10}{"per second":>12}')
+        for stage, stats in self.stats.items():
+            rate = stats['items'] / stats['seconds'] if stats['seconds'] else 0.0
+            self.stdout.write(f'{stage:<10}{stats["items"]:>8}{stats["seconds"]:>10.1f}{rate:>12.2f}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved {self.stats["write"]["items"]} candidates, {self.failed} failed, in {elapsed:.1f}s'
+        ))
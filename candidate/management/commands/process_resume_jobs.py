@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from candidate.resume_jobs import claim_next_job, get_job_config, requeue_stale_jobs, run_resume_job
+
+class Command(BaseCommand):
+    help = 'Process queued resume uploads. Run several workers to process more resumes at once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of waiting for new jobs')
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help='Exit after processing this many jobs')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds to wait between checks of an empty queue (default RESUME_JOBS POLL_INTERVAL)')
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval']
+        if poll_interval is None:
+            poll_interval = get_job_config()['POLL_INTERVAL']
+        processed = 0
+        self.stdout.write('Waiting for resume jobs')
+        while options['max_jobs'] is None or processed < options['max_jobs']:
+            close_old_connections()
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale jobs')
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(poll_interval)
+                continue
+            started = time.perf_counter()
+            run_resume_job(job)
+            processed += 1
+            self.stdout.write(
+                f'Job {job.id} {job.status} at stage {job.stage} in {time.perf_counter() - started:.1f}s'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} resume jobs'))
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.21 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("candidate", "0005_alter_candidate_gender"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ParsedJobDescription",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(
+                        help_text="sha256 of the parser version and JD text",
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "parser_version",
+                    models.CharField(
+                        help_text="Hash of the model and prompt that produced the sections",
+                        max_length=64,
+                    ),
+                ),
+                ("sections", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_used_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["-last_used_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.21 on 2026-10-18 14:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("candidate", "0006_parsedjobdescription"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CandidateEmbeddingState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "embedding_model",
+                    models.CharField(
+                        help_text="Embedding model that produced the vectors",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "aspect_hashes",
+                    models.JSONField(
+                        default=dict,
+                        help_text="Aspect name -> sha256 of its section text",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "candidate",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="embedding_state",
+                        to="candidate.candidate",
+                    ),
+                ),
+            ],
+        ),
+    ]
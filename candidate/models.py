@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model # Commented out for now
 
 User = get_user_model() # Commented out for now
@@ -147,4 +148,70 @@ class Certification(models.Model):
         return f"{self.name} ({self.candidate.name})"
 
     class Meta:
-        ordering = ['-issue_date']
\ No newline at end of file
+        ordering = ['-issue_date']
+
+
+class ParsedJobDescription(models.Model):
+    """Cached parse_job_description output, keyed by a hash of the JD text and the parser version."""
+    content_hash = models.CharField(max_length=64, unique=True, help_text="sha256 of the parser version and JD text")
+    parser_version = models.CharField(max_length=64, help_text="Hash of the model and prompt that produced the sections")
+    sections = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Parsed JD {self.content_hash[:12]}"
+
+    class Meta:
+        ordering = ['-last_used_at']
+
+
+class CandidateEmbeddingState(models.Model):
+    """Hashes of the section texts behind a candidate's indexed embeddings, so only changed aspects are re-embedded."""
+    candidate = models.OneToOneField(Candidate, on_delete=models.CASCADE, related_name='embedding_state')
+    embedding_model = models.CharField(max_length=255, help_text="Embedding model that produced the vectors")
+    aspect_hashes = models.JSONField(default=dict, help_text="Aspect name -> sha256 of its section text")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Embedding state of candidate {self.candidate_id}"
+
+
+class ResumeJob(models.Model):
+    """An uploaded resume waiting for, or done with, background extraction into a candidate profile."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'), ('running', 'Running'),
+        ('succeeded', 'Succeeded'), ('failed', 'Failed'),
+    ]
+    STAGE_CHOICES = [
+        ('queued', 'Queued'), ('extracting', 'Extracting text'),
+        ('parsing', 'Parsing resume'), ('saving', 'Saving profile'), ('done', 'Done'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resume_jobs')
+    resume = models.FileField(upload_to='resumes/')
+    idempotency_key = models.CharField(max_length=255, blank=True, null=True, help_text="Client key that makes retried uploads return the same job")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default='queued', help_text="Last stage reached, where a failed job stopped")
+    error = models.TextField(blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now, help_text="Earliest time a worker may run the job, pushed back between retries")
+    candidate = models.ForeignKey(Candidate, on_delete=models.SET_NULL, related_name='resume_jobs', blank=True, null=True)
+    result = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Resume job {self.id} ({self.status})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'available_at'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_resume_job_idempotency_key',
+            )
+        ]
@@ -1,17 +1,83 @@
+import atexit
+import hashlib
 import os
-from typing import List, Dict, Any
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-import faiss
 from django.conf import settings
-from .models import Candidate, Project, WorkExperience, Education
-from .embedding_utils import get_embedding, parse_job_description
+from .models import Candidate, CandidateEmbeddingState, Project, WorkExperience, Education
+from .embedding_utils import EMBEDDING_MODEL, get_embeddings, parse_job_description
+from .llm_providers import get_embedding_provider
+from .vector_index import (
+    get_index_config, select_index_type, select_storage, detect_index_type, detect_storage,
+    create_index, build_index, clone_index, is_configured_backend, remove_ids, search_params,
+    supports_selector, read_index, write_index
+)
+from .attribute_store import AttributeStore
+from .bm25_index import BM25Index
+from .skill_index import SkillIndex
+from .index_snapshots import (
+    SnapshotWriter, generation_file, index_lock, read_generation, read_manifest,
+    remove_old_generations, write_array, write_manifest
+)
+from .index_registry import IndexRegistry
+from .reembed_queue import ReembedQueue
+from .search_rankings import RankingCache
+from .search_cache import SearchResultCache, search_key
+
+# Profile aspects, each one stored in its own sub-index
+ASPECTS = ["profile", "skills", "experience", "projects", "location"]
+
+# Aspects whose texts make up a candidate's document in the BM25 keyword index
+KEYWORD_ASPECTS = ["skills", "experience", "projects"]
+
+# Retrieval modes of rank_profiles
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+
+# Candidates embedded together during a rebuild; their texts share batched embedding requests
+REBUILD_CHUNK_SIZE = 200
+
+def _contains(sorted_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Membership of ids in a sorted id array, by binary search."""
+    if not len(sorted_ids):
+        return np.zeros(len(ids), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return sorted_ids[positions] == ids
 
 class ProfileEmbeddingManager:
-    def __init__(self):
-        # Initialize FAISS index for 1536-dimensional vectors with cosine similarity
+    def __init__(self, mmap: bool = None):
+        # One FAISS index per aspect for 1536-dimensional vectors with cosine similarity.
+        # Vectors are keyed by Candidate.id, so each candidate has at most one live row per aspect.
+        #
+        # Each aspect is split into two segments:
+        #   - the base segment, the published snapshot, memory-mapped and never modified in place;
+        #   - the delta segment, a small in-memory flat index taking every upsert.
+        # Base rows of updated or deleted candidates are masked by tombstones until
+        # compaction folds the delta into a new base snapshot (see compact).
         self.dimension = 1536
-        self.index = faiss.IndexFlatIP(self.dimension)  # Inner product for cosine similarity
-        self.candidate_emails = []  # Store candidate emails in the same order as vectors
+        self.index_config = get_index_config()
+        # Saved base indexes are mapped read-only and shared through the page cache
+        self.mmap = self.index_config["MMAP"] if mmap is None else mmap
+        self.mapped = False  # Whether the base indexes are mapped from the snapshot files
+        self.generation = 0  # Snapshot generation the base segment was loaded from or last compacted into
+        self.snapshot = None  # Paths of the snapshot files behind the base segment
+        self.index_type = "flat"
+        self.storage = "float32"
+        self.indexes = {aspect: self._new_aspect_index() for aspect in ASPECTS}
+        # Full-precision copies for exact re-ranking when the aspect indexes are compressed
+        self.full_indexes = self._new_full_indexes()
+        self.base_ids = np.empty(0, dtype=np.int64)  # Sorted ids of the candidates in the base segment
+        self.delta = {aspect: self._new_aspect_index() for aspect in ASPECTS}
+        self.delta_ids = np.empty(0, dtype=np.int64)  # Sorted ids of the candidates in the delta segment
+        self.tombstones = np.empty(0, dtype=np.int64)  # Sorted base ids superseded by the delta or deleted
+        # Candidate id -> sequence number of its latest change not yet compacted
+        self._changes = {}
+        self._change_seq = 0
+        self._write_lock = threading.RLock()
+        self._snapshot_writer = None
+        self._attribute_store = None
         self.index_path = "candidate_embeddings"
         
         # Weights for different aspects of the profile
@@ -28,11 +94,286 @@ class ProfileEmbeddingManager:
             self.load_index(self.index_path)
         except Exception as e:
             print(f"No existing index found or error loading index: {str(e)}")
-            # Initialize empty index
-            self.index = faiss.IndexFlatIP(self.dimension)
-            self.candidate_emails = []
+            # Initialize empty indexes
+            self.reset_index()
+
+    def _new_aspect_index(self) -> Any:
+        """Create an empty aspect index whose vectors are addressed by candidate id."""
+        return create_index("flat", self.dimension, config=self.index_config)
+
+    def _new_full_indexes(self) -> Dict[str, Any]:
+        """Empty full-precision stores, or None when re-ranking is disabled."""
+        if not self.index_config["RERANK"]:
+            return None
+        return {aspect: create_index("flat", self.dimension, config=self.index_config) for aspect in ASPECTS}
+
+    def _clear_delta(self) -> None:
+        """Start with an empty delta segment and no pending changes."""
+        self.delta = {aspect: self._new_aspect_index() for aspect in ASPECTS}
+        self.delta_ids = np.empty(0, dtype=np.int64)
+        self.tombstones = np.empty(0, dtype=np.int64)
+        self._changes = {}
+
+    def reset_index(self) -> None:
+        """Drop all vectors and start with empty aspect indexes."""
+        self.mapped = False
+        self.snapshot = None
+        self.index_type = "flat"
+        self.storage = "float32"
+        self.indexes = {aspect: self._new_aspect_index() for aspect in ASPECTS}
+        self.full_indexes = self._new_full_indexes()
+        self.base_ids = np.empty(0, dtype=np.int64)
+        self._clear_delta()
+
+    def _reconstruct(self, aspect: str, ids: np.ndarray) -> np.ndarray:
+        """
+        Stored vectors of live candidates for an aspect: delta rows as added,
+        base rows at the best precision kept (lock held by the caller).
+        """
+        vectors = np.empty((len(ids), self.dimension), dtype=np.float32)
+        in_delta = _contains(self.delta_ids, ids)
+        if in_delta.any():
+            vectors[in_delta] = self.delta[aspect].reconstruct_batch(ids[in_delta])
+        if not in_delta.all():
+            source = self.full_indexes[aspect] if self.full_indexes else self.indexes[aspect]
+            vectors[~in_delta] = source.reconstruct_batch(ids[~in_delta])
+        return vectors
+
+    def _stored_vectors(self, aspect: str) -> np.ndarray:
+        """Vectors of all indexed candidates for an aspect, at the best precision kept."""
+        with self._write_lock:
+            return self._reconstruct(aspect, self.candidate_ids)
+
+    def stored_embeddings(self, candidate_id: int) -> Optional[Dict[str, np.ndarray]]:
+        """A candidate's stored vector for every aspect, or None if it is not indexed."""
+        ids = np.array([candidate_id], dtype=np.int64)
+        with self._write_lock:
+            if not self._is_live(ids)[0]:
+                return None
+            return {aspect: self._reconstruct(aspect, ids)[0] for aspect in ASPECTS}
+
+    @property
+    def attribute_store(self) -> AttributeStore:
+        """Candidate attributes for filtered searches, loaded on first use and refreshed periodically."""
+        store = self._attribute_store
+        if store is None or time.monotonic() - store.loaded_at > self.index_config["ATTRIBUTE_REFRESH_INTERVAL"]:
+            store = self._attribute_store = AttributeStore().load()
+        return store
 
-    def _prepare_profile_text(self, candidate: Candidate) -> Dict[str, str]:
+    @property
+    def snapshot_writer(self) -> SnapshotWriter:
+        """Debounced compaction of this instance's delta segment, started on the first change."""
+        if self._snapshot_writer is None:
+            self._snapshot_writer = SnapshotWriter(
+                self.compact,
+                self.index_config["FLUSH_INTERVAL"],
+                self.index_config["FLUSH_MAX_PENDING"]
+            )
+        return self._snapshot_writer
+
+    def _private_base(self) -> Dict[str, Any]:
+        """In-memory copies of the base segment that compaction may modify."""
+        with self._write_lock:
+            mapped, indexes, full_indexes, ids = self.mapped, self.indexes, self.full_indexes, self.base_ids
+        if mapped:
+            # Mapped indexes cannot be cloned, so read the snapshot files again
+            return self._read_snapshot(self.index_path, mmap=False)
+        return {
+            "indexes": {aspect: clone_index(index) for aspect, index in indexes.items()},
+            "full_indexes": {aspect: clone_index(index) for aspect, index in (full_indexes or {}).items()},
+            "ids": ids.copy(),
+        }
+
+    def _merge_segments(self, base: Dict[str, Any], changed_ids: np.ndarray, delta_ids: np.ndarray,
+                        delta_vectors: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        """
+        Fold delta vectors into a private copy of the base segment and drop the changed base rows.
+        Updates the copy in place while the layout fits the new corpus size, and rebuilds
+        (retraining ANN structures) when the index type, storage or backend has to change.
+        """
+        live_base_ids = np.setdiff1d(base["ids"], changed_ids)
+        ids = np.union1d(live_base_ids, delta_ids)
+        index_type = select_index_type(len(ids), self.index_config)
+        storage = select_storage(len(ids), self.index_config)
+        first_index = base["indexes"][ASPECTS[0]]
+        stale_ids = np.intersect1d(base["ids"], changed_ids)
+        # HNSW cannot delete rows, so it is rebuilt once stale rows outnumber live ones
+        in_place = (
+            (index_type, storage) == (detect_index_type(first_index), detect_storage(first_index))
+            and (index_type != "hnsw" or first_index.ntotal + len(delta_ids) <= 2 * len(ids))
+            and is_configured_backend(first_index, self.index_config)
+        )
+        if in_place:
+            for aspect in ASPECTS:
+                for index in (base["indexes"][aspect], base["full_indexes"].get(aspect)):
+                    if index is None:
+                        continue
+                    if len(stale_ids):
+                        remove_ids(index, stale_ids)
+                    if len(delta_ids):
+                        index.add_with_ids(delta_vectors[aspect], delta_ids)
+            return {**base, "ids": ids, "index_type": index_type, "storage": storage}
+
+        print(f"Rebuilding {len(ASPECTS)} aspect indexes as {index_type}/{storage} over {len(ids)} candidates")
+        indexes, full_indexes = {}, {}
+        for aspect in ASPECTS:
+            source = base["full_indexes"].get(aspect, base["indexes"][aspect])
+            vectors = np.concatenate([
+                source.reconstruct_batch(live_base_ids) if len(live_base_ids)
+                else np.empty((0, self.dimension), dtype=np.float32),
+                delta_vectors[aspect]
+            ])
+            row_ids = np.concatenate([live_base_ids, delta_ids])
+            indexes[aspect] = build_index(index_type, self.dimension, vectors, row_ids, self.index_config, storage)
+            if self.index_config["RERANK"]:
+                full_indexes[aspect] = build_index("flat", self.dimension, vectors, row_ids, self.index_config)
+        return {"indexes": indexes, "full_indexes": full_indexes, "ids": ids,
+                "index_type": index_type, "storage": storage}
+
+    def compact(self, rebase: bool = True) -> None:
+        """
+        Fold the delta segment into a new base snapshot and drop tombstoned rows.
+
+        Runs in the background (see snapshot_writer); searches keep using the current
+        segments until the merged base is swapped in, and writes arriving meanwhile stay
+        in the delta for the next compaction. If another process published since this
+        base was loaded, the delta is folded into that newer snapshot instead, unless
+        rebase is False (a full rebuild that replaces whatever was published).
+        """
+        try:
+            with index_lock(self.index_path):
+                with self._write_lock:
+                    changes = dict(self._changes)
+                    if rebase and not changes:
+                        return
+                    delta_ids = self.delta_ids.copy()
+                    delta_vectors = {
+                        aspect: self.delta[aspect].reconstruct_batch(delta_ids) if len(delta_ids)
+                        else np.empty((0, self.dimension), dtype=np.float32)
+                        for aspect in ASPECTS
+                    }
+                latest = read_generation(self.index_path)
+                if rebase and latest != self.generation:
+                    print(f"Folding {len(changes)} changes into snapshot generation {latest}")
+                    base = self._read_snapshot(self.index_path, mmap=False)
+                else:
+                    base = self._private_base()
+                changed_ids = np.array(sorted(changes), dtype=np.int64)
+                merged = self._merge_segments(base, changed_ids, delta_ids, delta_vectors)
+                merged["generation"] = latest + 1
+                merged["snapshot"] = self.save_index(self.index_path, merged["generation"], merged)
+
+                with self._write_lock:
+                    # Changes made after the delta was copied stay pending
+                    merged_ids = np.array(
+                        [candidate_id for candidate_id, seq in changes.items() if self._changes.get(candidate_id) == seq],
+                        dtype=np.int64
+                    )
+                    for candidate_id in merged_ids.tolist():
+                        del self._changes[candidate_id]
+                    for index in self.delta.values():
+                        index.remove_ids(merged_ids)
+                    self.delta_ids = np.setdiff1d(self.delta_ids, merged_ids)
+                    self._set_base(merged)
+                if self.mmap:
+                    # Serve the new base from the page cache instead of the private copy
+                    snapshot = self._read_snapshot(self.index_path, mmap=True)
+                    with self._write_lock:
+                        self._set_base(snapshot)
+                remove_old_generations(self.index_path, int(self.index_config["KEEP_GENERATIONS"]))
+        except Exception as e:
+            raise Exception(f"Error compacting index: {str(e)}")
+
+    def _set_base(self, base: Dict[str, Any]) -> None:
+        """Install a base segment and recompute the tombstones of pending changes (lock held)."""
+        self.indexes = base["indexes"]
+        self.full_indexes = base["full_indexes"] or self._new_full_indexes()
+        self.base_ids = base["ids"]
+        self.generation = base["generation"]
+        self.snapshot = base["snapshot"]
+        self.mapped = base.get("mapped", False)
+        self.index_type = detect_index_type(self.indexes[ASPECTS[0]])
+        self.storage = detect_storage(self.indexes[ASPECTS[0]])
+        pending_ids = np.array(sorted(self._changes), dtype=np.int64)
+        self.tombstones = np.intersect1d(self.base_ids, pending_ids)
+
+    def is_stale(self) -> bool:
+        """
+        Whether another process has published a newer generation than the one loaded.
+        An instance with uncompacted changes is never stale, so its own edits stay visible.
+        """
+        if self._changes:
+            return False
+        return read_generation(self.index_path) != self.generation
+
+    @property
+    def reranking(self) -> bool:
+        """Whether searches rescore a widened shortlist against full-precision vectors."""
+        return bool(self.full_indexes) and self.storage != "float32"
+
+    @property
+    def candidate_ids(self) -> np.ndarray:
+        """Sorted ids of all live candidates across both segments."""
+        return np.union1d(np.setdiff1d(self.base_ids, self.tombstones), self.delta_ids)
+
+    @property
+    def ntotal(self) -> int:
+        """Number of live candidates across both segments."""
+        return len(self.base_ids) - len(self.tombstones) + len(self.delta_ids)
+
+    def _shortlist(self, queries: np.ndarray, query_aspects: List[str], k: int, nprobe: int,
+                   ef_search: int, allowed_ids: np.ndarray = None) -> np.ndarray:
+        """
+        Sorted ids of the candidates found by searching each aspect index with its own query.
+        allowed_ids restricts the search inside the indexes where the index supports it,
+        and the hits are filtered either way.
+        """
+        # Compressed indexes get a wider shortlist that is re-ranked on full vectors later
+        shortlist_k = k * self.index_config["RERANK_K_FACTOR"] if self.reranking else k
+        # Both segments are searched and their hits merged; base rows masked by
+        # tombstones are skipped, so the base asks for that many extra hits.
+        with self._write_lock:
+            base_indexes, base_ids, tombstones = self.indexes, self.base_ids, self.tombstones
+        hits = []
+        for row, aspect in enumerate(query_aspects):
+            try:
+                query_array = queries[row:row + 1]
+                index = base_indexes[aspect]
+                if index.ntotal:
+                    params = search_params(index, nprobe, ef_search, self.index_config, allowed_ids)
+                    # HNSW keeps stale rows of updated candidates until it is rebuilt
+                    search_k = shortlist_k + len(tombstones) + index.ntotal - len(base_ids)
+                    if allowed_ids is not None and not supports_selector(index):
+                        # Filter after the search, widened by the share of ineligible candidates
+                        search_k *= -(-index.ntotal // len(allowed_ids))
+                    distances, ids = index.search(query_array, min(search_k, index.ntotal), params=params)
+                    ids = ids[0][ids[0] >= 0]
+                    hits.append(ids[_contains(base_ids, ids) & ~_contains(tombstones, ids)])
+                with self._write_lock:
+                    delta_index = self.delta[aspect]
+                    if delta_index.ntotal:
+                        params = search_params(delta_index, config=self.index_config, allowed_ids=allowed_ids)
+                        distances, ids = delta_index.search(
+                            query_array, min(shortlist_k, delta_index.ntotal), params=params
+                        )
+                        hits.append(ids[0][ids[0] >= 0])
+                print(f"Search completed for {aspect}")
+            except Exception as e:
+                print(f"Error searching for aspect {aspect}: {str(e)}")
+                raise Exception(f"Failed to search for aspect {aspect}: {str(e)}")
+        
+        shortlist = np.unique(np.concatenate(hits)) if hits else np.empty(0, dtype=np.int64)
+        if allowed_ids is not None:
+            shortlist = shortlist[_contains(allowed_ids, shortlist)]
+        return shortlist
+
+    def _is_live(self, ids: np.ndarray) -> np.ndarray:
+        """Which ids belong to live candidates in either segment (lock held)."""
+        in_base = _contains(self.base_ids, ids) & ~_contains(self.tombstones, ids)
+        return in_base | _contains(self.delta_ids, ids)
+
+    @staticmethod
+    def _prepare_profile_text(candidate: Candidate) -> Dict[str, str]:
         """Prepare text for different sections of the profile."""
         # Basic profile information
         profile_text = f"""
@@ -47,7 +388,8 @@ class ProfileEmbeddingManager:
         skills_text = candidate.skills or "No skills specified"
 
         # Experience summary
-        work_experiences = WorkExperience.objects.filter(candidate=candidate)
+        # Related managers, so rebuilds can prefetch these for many candidates at once
+        work_experiences = candidate.work_experiences.all()
         experience_text = "\n".join([
             f"Role: {exp.role_designation} at {exp.company_name} "
             f"({exp.start_date} to {exp.end_date or 'Present'})"
@@ -55,7 +397,7 @@ class ProfileEmbeddingManager:
         ]) or "No work experience specified"
 
         # Projects summary
-        projects = Project.objects.filter(candidate=candidate)
+        projects = candidate.projects.all()
         projects_text = "\n".join([
             f"Project: {proj.title}\n"
             f"Description: {proj.description}\n"
@@ -78,36 +420,91 @@ class ProfileEmbeddingManager:
         }
 
     def generate_embeddings(self, candidate: Candidate) -> Dict[str, List[float]]:
-        """Generate embeddings for all sections of a candidate's profile."""
-        texts = self._prepare_profile_text(candidate)
-        embeddings = {
-            "profile_embedding": get_embedding(texts["profile"]),
-            "skills_embedding": get_embedding(texts["skills"]),
-            "experience_embedding": get_embedding(texts["experience"]),
-            "projects_embedding": get_embedding(texts["projects"]),
-            "location_embedding": get_embedding(texts["location"])
-        }
-        
-        return embeddings
+        """Generate embeddings for all sections of a candidate's profile in one request."""
+        return self.generate_embeddings_batch([candidate])[0]
 
-    def add_to_index(self, candidate: Candidate) -> None:
-        """Add a candidate's profile to the FAISS index."""
+    def generate_embeddings_batch(self, candidates: List[Candidate]) -> List[Dict[str, List[float]]]:
+        """
+        Generate embeddings for all sections of many profiles, packing the texts of
+        every candidate into shared embedding requests.
+        """
+        texts = [self._prepare_profile_text(candidate) for candidate in candidates]
+        vectors = get_embeddings([candidate_texts[aspect] for candidate_texts in texts for aspect in ASPECTS])
+        return [
+            {
+                f"{aspect}_embedding": vectors[position * len(ASPECTS) + offset]
+                for offset, aspect in enumerate(ASPECTS)
+            }
+            for position in range(len(candidates))
+        ]
+
+    def _record_change(self, candidate_id: int) -> None:
+        """Mark a candidate as changed since the base segment and tombstone its base row (lock held)."""
+        self._change_seq += 1
+        self._changes[candidate_id] = self._change_seq
+        ids = np.array([candidate_id], dtype=np.int64)
+        if _contains(self.base_ids, ids)[0]:
+            self.tombstones = np.union1d(self.tombstones, ids)
+
+    def add_to_index(self, candidate: Candidate, save: bool = True,
+                     embeddings: Dict[str, List[float]] = None) -> Dict[str, List[float]]:
+        """
+        Add a candidate's profile to the delta segment, replacing any previous vectors.
+        The change is searchable right away and compacted into the base snapshot in the
+        background; bulk loads pass save=False and compact once at the end.
+        embeddings generated beforehand (see generate_embeddings_batch) skip generation;
+        otherwise the hashes of the embedded texts are recorded for refresh_profile_embeddings.
+        Returns the embeddings.
+        """
         try:
-            embeddings = self.generate_embeddings(candidate)
-            
-            # Normalize and add all embeddings to index
-            for aspect, embedding in embeddings.items():
-                # Normalize the embedding vector
-                normalized_vector = self._normalize_vector(embedding)
-                vector = np.array([normalized_vector], dtype=np.float32)
-                self.index.add(vector)
-                self.candidate_emails.append(candidate.user.email)
-            
-            # Save the updated index
-            self.save_index(self.index_path)
+            texts = None
+            if embeddings is None:
+                texts = self._prepare_profile_text(candidate)
+                embeddings = self.generate_embeddings(candidate)
+            ids = np.array([candidate.id], dtype=np.int64)
+            # Normalize each aspect embedding; a zero vector is a failed embedding, never a profile
+            vectors = {}
+            for aspect in ASPECTS:
+                embedding = embeddings[f"{aspect}_embedding"]
+                if not np.any(embedding):
+                    raise ValueError(f"Empty {aspect} embedding")
+                vectors[aspect] = np.array([self._normalize_vector(embedding)], dtype=np.float32)
+            with self._write_lock:
+                # Every aspect holds one live row per candidate
+                for aspect, vector in vectors.items():
+                    self.delta[aspect].remove_ids(ids)
+                    self.delta[aspect].add_with_ids(vector, ids)
+                self.delta_ids = np.union1d(self.delta_ids, ids)
+                self._record_change(candidate.id)
+            if self._attribute_store is not None:
+                self._attribute_store.upsert(candidate)
+            if save:
+                update_profile_keywords(candidate)
+                self.snapshot_writer.mark_dirty()
+            if texts is not None:
+                save_aspect_hashes({candidate.id: texts})
+            return embeddings
         except Exception as e:
             raise Exception(f"Error adding candidate to index: {str(e)}")
 
+    def remove_from_index(self, candidate_id: int) -> None:
+        """Remove a candidate's vectors: drop its delta rows and tombstone its base rows."""
+        try:
+            ids = np.array([candidate_id], dtype=np.int64)
+            with self._write_lock:
+                in_base = _contains(self.base_ids, ids)[0] and not _contains(self.tombstones, ids)[0]
+                if not in_base and not _contains(self.delta_ids, ids)[0]:
+                    return
+                for index in self.delta.values():
+                    index.remove_ids(ids)
+                self.delta_ids = np.setdiff1d(self.delta_ids, ids)
+                self._record_change(candidate_id)
+            if self._attribute_store is not None:
+                self._attribute_store.remove(candidate_id)
+            self.snapshot_writer.mark_dirty()
+        except Exception as e:
+            raise Exception(f"Error removing candidate from index: {str(e)}")
+
     def _normalize_vector(self, vector: List[float]) -> List[float]:
         """Normalize a vector for cosine similarity."""
         vector = np.array(vector)
@@ -116,15 +513,139 @@ class ProfileEmbeddingManager:
             return vector
         return vector / norm
 
-    def search_similar_profiles(self, query_text: str, k: int = 10) -> List[Dict[str, Any]]:
-        """Search for similar profiles based on a query using weighted multi-aspect search."""
+    def _filter_ids(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Sorted ids of the candidates matching attribute filters and the "skills" boolean query."""
+        attribute_filters = {key: value for key, value in filters.items() if key != "skills"}
+        allowed_ids = self.attribute_store.filter_ids(attribute_filters) if attribute_filters else None
+        if "skills" in filters:
+            if not isinstance(filters["skills"], str):
+                raise ValueError("Filter skills expects a query string")
+            skill_ids = get_skill_index().filter_ids(filters["skills"])
+            allowed_ids = skill_ids if allowed_ids is None else np.intersect1d(allowed_ids, skill_ids, assume_unique=True)
+        return allowed_ids
+
+    def _default_mode(self, query_text: str) -> str:
+        """Retrieval mode of a query when the caller does not pick one; lexical is opt-in."""
+        return "hybrid" if self.index_config["HYBRID_SEARCH"] else "dense"
+
+    def _keyword_hits(self, query_text: str, depth: int, allowed_ids: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """The depth best BM25 matches among live candidates, with their scores, best first."""
+        keyword_index = get_keyword_index()
+        # Documents of candidates missing from the vector index bound the hits dropped below
+        extra = max(0, keyword_index.documents - self.ntotal)
+        ids, scores = keyword_index.search(query_text, depth + extra, allowed_ids)
+        with self._write_lock:
+            live = self._is_live(ids)
+        return ids[live][:depth], scores[live][:depth]
+
+    def _fuse(self, candidate_ids: np.ndarray, dense_scores: np.ndarray, keyword_ids: np.ndarray,
+              keyword_scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reciprocal-rank fusion of the dense ranking of candidate_ids (sorted) and the BM25
+        ranking keyword_ids (best first): each ranking adds 1 / (RRF_K + rank).
+        Returns the fused scores and the BM25 scores, both aligned with candidate_ids.
+        """
+        rrf_k = self.index_config["RRF_K"]
+        dense_ranks = np.empty(len(candidate_ids), dtype=np.int64)
+        dense_ranks[np.argsort(-dense_scores, kind="stable")] = np.arange(len(candidate_ids))
+        fused = 1.0 / (rrf_k + 1 + dense_ranks)
+        lexical = np.zeros(len(candidate_ids), dtype=np.float32)
+        found = _contains(candidate_ids, keyword_ids)
+        positions = np.searchsorted(candidate_ids, keyword_ids[found])
+        fused[positions] += 1.0 / (rrf_k + 1 + np.flatnonzero(found))
+        lexical[positions] = keyword_scores[found]
+        return fused, lexical
+
+    def rank_profiles(self, query_text: str, depth: int = 10, nprobe: int = None,
+                      ef_search: int = None, filters: Dict[str, Any] = None, mode: str = None) -> Dict[str, Any]:
+        """
+        Rank the candidates matching a query, best first, down to depth candidates.
+        Rankings are cached per normalized query and options until the index changes.
+        nprobe (IVF) and ef_search (HNSW) trade recall for speed on ANN indexes.
+        filters restrict results to candidates whose attributes match, using Django-style
+        lookups on the fields in attribute_store.FILTER_LOOKUPS, e.g.
+        {"is_actively_looking": True, "experience__gte": 3, "preferred_locations__in": ["Bangalore", "Remote"]},
+        and "skills" takes a boolean skill query (see skill_index), e.g. "python AND django AND NOT php".
+        mode is one of SEARCH_MODES: "dense" ranks by embedding similarity, "lexical" by
+        BM25 over the keyword aspects with no parsing or embedding, and "hybrid" adds the
+        BM25 matches to the dense shortlist and orders them by reciprocal-rank fusion.
+        mode defaults to hybrid, or dense without HYBRID_SEARCH; lexical is only used when asked for.
+        
+        Returns:
+            Dict[str, Any]: Ranked "ids" with their weighted similarity "total_scores" (None in
+            lexical mode, which embeds nothing), the per-aspect weighted "aspect_scores"
+            (aspects x candidates), "query_aspects", "aspect_queries", the "mode" used and,
+            unless dense, the BM25 "lexical_scores"
+        """
         try:
             if not query_text:
                 raise ValueError("Query text cannot be empty")
+            if mode is not None and mode not in SEARCH_MODES:
+                raise ValueError(f"Unknown search mode: {mode}")
 
-            if self.index.ntotal == 0:
+            if self.ntotal == 0:
                 raise ValueError("No profiles in the search index. Please add some profiles first.")
             
+            requested_mode = mode
+            mode = mode or self._default_mode(query_text)
+            
+            # Repeated searches are served from the result cache. Local keys carry the generation and
+            # this process's uncompacted changes; the shared tier is only used for a published
+            # generation with no local edits on top, which every worker sees the same way.
+            # Filter attributes and keyword documents change without a new generation and are
+            # versioned per process, so filtered and keyword searches stay in the local tier.
+            options = {"depth": depth, "nprobe": nprobe, "ef_search": ef_search,
+                       "filters": filters or {}, "weights": self.weights, "mode": requested_mode}
+            with self._write_lock:
+                generation, change_seq, pending = self.generation, self._change_seq, bool(self._changes)
+            attributes = None
+            if filters:
+                attributes = ()
+                if any(key != "skills" for key in filters):
+                    store = self.attribute_store
+                    attributes += (store.loaded_at, store.version)
+                if "skills" in filters:
+                    skill_index = get_skill_index()
+                    attributes += (skill_index.loaded_at, skill_index.version)
+            # Keyword documents change with candidate saves that leave the vectors alone
+            keywords = None if mode == "dense" else get_keyword_index().version
+            cache_key = search_key(query_text, version=(generation, change_seq), attributes=attributes,
+                                   keywords=keywords, **options)
+            shared = not pending and not filters and mode == "dense"
+            shared_key = search_key(query_text, generation=generation, **options) if shared else None
+            cached = result_cache.get(cache_key, shared_key)
+            if cached is not None:
+                print(f"Search served from the result cache: {query_text[:50]}")
+                return cached
+            
+            # Compile the filters to the sorted ids of eligible, indexed candidates
+            allowed_ids = None
+            if filters:
+                allowed_ids = self._filter_ids(filters)
+                with self._write_lock:
+                    allowed_ids = allowed_ids[self._is_live(allowed_ids)]
+                print(f"Filters matched {len(allowed_ids)} indexed candidates")
+                if not len(allowed_ids):
+                    raise ValueError("No matching profiles found")
+            
+            if mode == "lexical":
+                # Keyword queries are answered from the BM25 index alone
+                keyword_ids, keyword_scores = self._keyword_hits(query_text, depth, allowed_ids)
+                if len(keyword_ids):
+                    print(f"Keyword search matched {len(keyword_ids)} candidates")
+                    ranking = {
+                        "ids": keyword_ids,
+                        "total_scores": None,
+                        "aspect_scores": np.empty((0, len(keyword_ids)), dtype=np.float32),
+                        "query_aspects": [],
+                        "aspect_queries": {},
+                        "lexical_scores": keyword_scores,
+                        "mode": mode,
+                    }
+                    result_cache.set(cache_key, ranking, shared_key)
+                    return ranking
+                raise ValueError("No matching profiles found")
+            
             print(f"Starting search with query: {query_text}")
             
             # Parse the job description into different aspects
@@ -135,110 +656,150 @@ class ProfileEmbeddingManager:
                 print(f"Error parsing job description: {str(e)}")
                 raise Exception(f"Failed to parse job description: {str(e)}")
             
-            # Generate query embeddings for different aspects
-            query_embeddings = {}
-            for aspect, text in parsed_jd.items():
-                try:
-                    embedding = get_embedding(text)
-                    if not embedding or len(embedding) != self.dimension:
-                        raise ValueError(f"Invalid embedding dimension for {aspect}")
-                    query_embeddings[aspect] = embedding
-                    print(f"Generated embedding for {aspect}")
-                except Exception as e:
-                    print(f"Error generating embedding for {aspect}: {str(e)}")
-                    raise Exception(f"Failed to generate embedding for {aspect}: {str(e)}")
+            # Generate query embeddings for every aspect in one request, one row per aspect
+            query_aspects = [aspect for aspect in ASPECTS if aspect in parsed_jd]
+            queries = np.empty((len(query_aspects), self.dimension), dtype=np.float32)
+            try:
+                embeddings = get_embeddings([parsed_jd[aspect] for aspect in query_aspects])
+            except Exception as e:
+                print(f"Error generating query embeddings: {str(e)}")
+                raise Exception(f"Failed to generate query embeddings: {str(e)}")
+            for row, aspect in enumerate(query_aspects):
+                embedding = embeddings[row]
+                if not embedding or len(embedding) != self.dimension:
+                    raise Exception(f"Failed to generate embedding for {aspect}: Invalid embedding dimension")
+                queries[row] = embedding
+            print(f"Generated embeddings for {len(query_aspects)} aspects")
             
-            # Normalize query embeddings
+            # Normalize all query embeddings at once
             try:
-                normalized_queries = {
-                    aspect: self._normalize_vector(embedding)
-                    for aspect, embedding in query_embeddings.items()
-                }
+                norms = np.linalg.norm(queries, axis=1, keepdims=True)
+                queries /= np.where(norms == 0, 1, norms)
                 print("Normalized all query embeddings")
             except Exception as e:
                 print(f"Error normalizing embeddings: {str(e)}")
                 raise Exception(f"Failed to normalize embeddings: {str(e)}")
             
-            # Search for each aspect
-            all_results = []
-            for aspect, query_vector in normalized_queries.items():
-                try:
-                    query_array = np.array([query_vector], dtype=np.float32)
-                    distances, indices = self.index.search(query_array, k)
-                    print(f"Search completed for {aspect}")
-                    
-                    # Convert distances to similarity scores and apply weights
-                    for i, idx in enumerate(indices[0]):
-                        if idx < len(self.candidate_emails):
-                            similarity = float(distances[0][i])  # Cosine similarity is already in [0,1]
-                            weighted_score = similarity * self.weights[aspect]
-                            all_results.append({
-                                "email": self.candidate_emails[idx],
-                                "aspect": aspect,
-                                "similarity_score": weighted_score,
-                                "aspect_query": parsed_jd[aspect]
-                            })
-                except Exception as e:
-                    print(f"Error searching for aspect {aspect}: {str(e)}")
-                    raise Exception(f"Failed to search for aspect {aspect}: {str(e)}")
-            
-            if not all_results:
+            if allowed_ids is not None and len(allowed_ids) <= self.index_config["FILTER_SCAN_THRESHOLD"]:
+                # Few eligible candidates: score every one of them exactly below instead of searching
+                shortlist = allowed_ids
+            else:
+                shortlist = self._shortlist(queries, query_aspects, depth, nprobe, ef_search, allowed_ids)
+            if mode == "hybrid":
+                # Keyword matches the embeddings missed join the shortlist and get exact dense scores
+                keyword_ids, keyword_scores = self._keyword_hits(query_text, depth, allowed_ids)
+                shortlist = np.union1d(shortlist, keyword_ids)
+            if not len(shortlist):
                 print("No results found in initial search")
                 raise ValueError("No matching profiles found")
             
-            # Combine results by email
+            # Fuse scores: every shortlisted candidate gets an exact weighted total over all aspects
             try:
-                combined_results = {}
-                for result in all_results:
-                    email = result["email"]
-                    if email not in combined_results:
-                        combined_results[email] = {
-                            "email": email,
-                            "total_score": 0,
-                            "aspect_scores": {},
-                            "aspect_queries": {}
-                        }
-                    combined_results[email]["total_score"] += result["similarity_score"]
-                    combined_results[email]["aspect_scores"][result["aspect"]] = result["similarity_score"]
-                    combined_results[email]["aspect_queries"][result["aspect"]] = result["aspect_query"]
-                print(f"Combined results for {len(combined_results)} candidates")
+                with self._write_lock:
+                    # Skip candidates deleted since the shortlist was taken
+                    candidate_ids = shortlist[self._is_live(shortlist)]
+                    similarities = np.stack([
+                        self._reconstruct(aspect, candidate_ids) @ queries[row]
+                        for row, aspect in enumerate(query_aspects)
+                    ])
+                if not len(candidate_ids):
+                    raise ValueError("No matching profiles found")
+                weights = np.array([self.weights[aspect] for aspect in query_aspects], dtype=np.float32)
+                weighted_scores = similarities * weights[:, None]  # aspects x candidates
+                total_scores = weighted_scores.sum(axis=0)
+                rank_scores = total_scores
+                if mode == "hybrid":
+                    rank_scores, lexical_scores = self._fuse(candidate_ids, total_scores, keyword_ids, keyword_scores)
+                
+                # Top depth by rank score: partial selection, then sort only the selected rows
+                top = min(depth, len(candidate_ids))
+                top_positions = np.argpartition(-rank_scores, top - 1)[:top]
+                top_positions = top_positions[np.argsort(-rank_scores[top_positions], kind="stable")]
+                print(f"Combined results for {len(candidate_ids)} candidates")
+            except ValueError:
+                raise
             except Exception as e:
                 print(f"Error combining results: {str(e)}")
                 raise Exception(f"Failed to combine results: {str(e)}")
             
-            # Sort by total score and get top k results
+            ranking = {
+                "ids": candidate_ids[top_positions],
+                "total_scores": total_scores[top_positions],
+                "aspect_scores": weighted_scores[:, top_positions],
+                "query_aspects": query_aspects,
+                "aspect_queries": {aspect: parsed_jd[aspect] for aspect in query_aspects},
+                "mode": mode,
+            }
+            if mode == "hybrid":
+                ranking["lexical_scores"] = lexical_scores[top_positions]
+            result_cache.set(cache_key, ranking, shared_key)
+            return ranking
+        except ValueError as ve:
+            print(f"ValueError in rank_profiles: {str(ve)}")
+            raise ValueError(str(ve))
+        except Exception as e:
+            print(f"Unexpected error in rank_profiles: {str(e)}")
+            raise Exception(f"Error in rank_profiles: {str(e)}")
+
+    def hydrate_results(self, ranking: Dict[str, Any], offset: int = 0, k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Result rows for ranking positions offset to offset + k, loaded in one query.
+        Candidates deleted since the ranking was taken are skipped.
+        """
+        positions = range(offset, min(offset + k, len(ranking["ids"])))
+        page_ids = ranking["ids"][offset:offset + k].tolist()
+        # One query, with the user and auth token joined in
+        candidates = Candidate.objects.select_related('user', 'user__auth_token').in_bulk(page_ids)
+        query_aspects = ranking["query_aspects"]
+        results = []
+        for position, candidate_id in zip(positions, page_ids):
+            candidate = candidates.get(candidate_id)
+            if candidate is None:
+                print(f"Warning: Candidate {candidate_id} not found in database")
+                continue
             try:
-                final_results = []
-                for email, scores in sorted(
-                    combined_results.items(),
-                    key=lambda x: x[1]["total_score"],
-                    reverse=True
-                )[:k]:
-                    try:
-                        candidate = Candidate.objects.select_related('user').get(user__email=email)
-                        final_results.append({
-                            "email": email,
-                            "name": candidate.name,
-                            "total_similarity_score": scores["total_score"],
-                            "aspect_scores": scores["aspect_scores"],
-                            "aspect_queries": scores["aspect_queries"],
-                            "current_role": candidate.current_job_title,
-                            "company": candidate.current_company,
-                            "user_token": candidate.user.auth_token.key if hasattr(candidate.user, 'auth_token') else None
-                        })
-                    except Candidate.DoesNotExist:
-                        print(f"Warning: Candidate with email {email} not found in database")
-                        continue
-                    except Exception as e:
-                        print(f"Warning: Error processing candidate {email}: {str(e)}")
-                        continue
-                
+                results.append({
+                    "candidate_id": candidate_id,
+                    "email": candidate.user.email if candidate.user else candidate.email,
+                    "name": candidate.name,
+                    # Similarity and BM25 scores are on different scales, so each keeps its own key
+                    "total_similarity_score": (
+                        float(ranking["total_scores"][position]) if ranking["total_scores"] is not None else None
+                    ),
+                    "aspect_scores": {
+                        aspect: float(ranking["aspect_scores"][row, position])
+                        for row, aspect in enumerate(query_aspects)
+                    },
+                    "aspect_queries": ranking["aspect_queries"],
+                    "keyword_score": float(ranking["lexical_scores"][position]) if "lexical_scores" in ranking else None,
+                    "mode": ranking.get("mode", "dense"),
+                    "current_role": candidate.current_job_title,
+                    "company": candidate.current_company,
+                    "user_token": candidate.user.auth_token.key if hasattr(candidate.user, 'auth_token') else None
+                })
+            except Exception as e:
+                print(f"Warning: Error processing candidate {candidate_id}: {str(e)}")
+                continue
+        return results
+
+    def search_similar_profiles(self, query_text: str, k: int = 10, nprobe: int = None, ef_search: int = None,
+                                filters: Dict[str, Any] = None, mode: str = None) -> List[Dict[str, Any]]:
+        """
+        Search for similar profiles based on a query using weighted multi-aspect search.
+        Takes the same options as rank_profiles and returns the top k results.
+        """
+        try:
+            ranking = self.rank_profiles(query_text, k, nprobe=nprobe, ef_search=ef_search, filters=filters, mode=mode)
+            try:
+                final_results = self.hydrate_results(ranking, 0, k)
                 if not final_results:
                     print("No final results after processing")
                     raise ValueError("No matching profiles found")
                 
                 print(f"Returning {len(final_results)} final results")
                 return final_results
+            except ValueError:
+                raise
             except Exception as e:
                 print(f"Error processing final results: {str(e)}")
                 raise Exception(f"Failed to process final results: {str(e)}")
@@ -250,22 +811,139 @@ class ProfileEmbeddingManager:
             print(f"Unexpected error in search_similar_profiles: {str(e)}")
             raise Exception(f"Error in search_similar_profiles: {str(e)}")
 
-    def save_index(self, filepath: str) -> None:
-        """Save the FAISS index and candidate emails to disk."""
+    def save_index(self, filepath: str, generation: int, segment: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Save a base segment (aspect indexes and candidate ids) as snapshot `generation`.
+        Every file is flushed to disk before the manifest naming them is
+        replaced, so a crash leaves either the old snapshot or the new one.
+        Returns the paths of the saved files.
+        """
         try:
-            faiss.write_index(self.index, f"{filepath}.index")
-            np.save(f"{filepath}_emails.npy", np.array(self.candidate_emails))
+            files = {
+                "generation": generation,
+                "indexes": {aspect: generation_file(filepath, generation, f"{aspect}.index") for aspect in ASPECTS},
+                "full_indexes": {
+                    aspect: generation_file(filepath, generation, f"{aspect}_full.index")
+                    for aspect in segment["full_indexes"]
+                },
+                "ids": generation_file(filepath, generation, "ids.npy"),
+            }
+            for aspect, index in segment["indexes"].items():
+                write_index(index, files["indexes"][aspect])
+            for aspect, index in segment["full_indexes"].items():
+                write_index(index, files["full_indexes"][aspect])
+            write_array(segment["ids"], files["ids"])
+            # The manifest stores names relative to its own directory
+            write_manifest(filepath, {
+                "generation": generation,
+                "index_type": segment["index_type"],
+                "storage": segment["storage"],
+                "ntotal": len(segment["ids"]),
+                "embedding_model": get_embedding_provider().model_id(EMBEDDING_MODEL),
+                "indexes": {aspect: os.path.basename(path) for aspect, path in files["indexes"].items()},
+                "full_indexes": {aspect: os.path.basename(path) for aspect, path in files["full_indexes"].items()},
+                "ids": os.path.basename(files["ids"]),
+            })
+            return files
         except Exception as e:
             raise Exception(f"Error saving index: {str(e)}")
 
-    def load_index(self, filepath: str) -> None:
-        """Load the FAISS index and candidate emails from disk."""
+    def _snapshot_files(self, filepath: str) -> Dict[str, Any]:
+        """Paths of the published snapshot, or of the unversioned files written before snapshots."""
+        manifest = read_manifest(filepath)
+        if manifest is None:
+            return {
+                "generation": 0,
+                "indexes": {aspect: f"{filepath}_{aspect}.index" for aspect in ASPECTS},
+                "full_indexes": {
+                    aspect: f"{filepath}_{aspect}_full.index" for aspect in ASPECTS
+                    if os.path.exists(f"{filepath}_{aspect}_full.index")
+                },
+                "ids": f"{filepath}_ids.npy",
+            }
+        directory = os.path.dirname(filepath)
+        return {
+            "generation": manifest["generation"],
+            "indexes": {aspect: os.path.join(directory, name) for aspect, name in manifest["indexes"].items()},
+            "full_indexes": {
+                aspect: os.path.join(directory, name) for aspect, name in manifest["full_indexes"].items()
+            },
+            "ids": os.path.join(directory, manifest["ids"]),
+        }
+
+    def _read_snapshot(self, filepath: str, mmap: bool) -> Dict[str, Any]:
+        """Read the published snapshot as a base segment, memory-mapped unless mmap is False."""
+        files = self._snapshot_files(filepath)
+        indexes = {aspect: read_index(files["indexes"][aspect], mmap) for aspect in ASPECTS}
+        ids = np.load(files["ids"]).astype(np.int64)
+        full_indexes = {}
+        if self.index_config["RERANK"]:
+            if len(files["full_indexes"]) == len(ASPECTS):
+                full_indexes = {aspect: read_index(files["full_indexes"][aspect], mmap) for aspect in ASPECTS}
+            else:
+                # Re-ranking was just enabled: seed the store from the best vectors available
+                full_indexes = self._new_full_indexes()
+                for aspect in ASPECTS:
+                    if len(ids):
+                        full_indexes[aspect].add_with_ids(indexes[aspect].reconstruct_batch(ids), ids)
+        return {"indexes": indexes, "full_indexes": full_indexes, "ids": ids,
+                "generation": files["generation"], "snapshot": files, "mapped": mmap}
+
+    def load_index(self, filepath: str, mmap: bool = None) -> None:
+        """Load the published snapshot as the base segment, memory-mapped unless mmap is False."""
         try:
-            self.index = faiss.read_index(f"{filepath}.index")
-            self.candidate_emails = np.load(f"{filepath}_emails.npy").tolist()
+            files = self._snapshot_files(filepath)
+            if not os.path.exists(files["indexes"][ASPECTS[0]]) and os.path.exists(f"{filepath}.index"):
+                self._load_legacy_index(filepath)
+                return
+            snapshot = self._read_snapshot(filepath, self.mmap if mmap is None else mmap)
+            manifest = read_manifest(filepath) or {}
+            model = get_embedding_provider().model_id(EMBEDDING_MODEL)
+            if manifest.get("embedding_model", model) != model:
+                print(f"Warning: Index was embedded with {manifest['embedding_model']} but queries use {model}; "
+                      "rebuild the index")
+            with self._write_lock:
+                self._clear_delta()
+                self._set_base(snapshot)
         except Exception as e:
             raise Exception(f"Error loading index: {str(e)}")
 
+    def _load_legacy_index(self, filepath: str) -> None:
+        """Convert a legacy shared index (five interleaved rows per candidate, keyed by email)."""
+        legacy_index = read_index(f"{filepath}.index", mmap=False)
+        legacy_emails = np.load(f"{filepath}_emails.npy").tolist()
+        if legacy_index.ntotal % len(ASPECTS) != 0:
+            raise ValueError(f"Legacy index has {legacy_index.ntotal} vectors, expected a multiple of {len(ASPECTS)}")
+        vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal)
+        emails = legacy_emails[::len(ASPECTS)]
+        ids_by_email = dict(
+            Candidate.objects.filter(user__email__in=emails).values_list('user__email', 'id')
+        )
+        # Later rows are newer embeddings of the same candidate, so the last one wins
+        rows_by_id = {}
+        for row, email in enumerate(emails):
+            if email in ids_by_email:
+                rows_by_id[ids_by_email[email]] = row
+        ids = np.array(list(rows_by_id.keys()), dtype=np.int64)
+        rows = np.array(list(rows_by_id.values()), dtype=np.int64)
+        self.reset_index()
+        for position, aspect in enumerate(ASPECTS):
+            aspect_vectors = np.ascontiguousarray(vectors[position::len(ASPECTS)][rows])
+            self.indexes[aspect].add_with_ids(aspect_vectors, ids)
+            if self.full_indexes:
+                self.full_indexes[aspect].add_with_ids(aspect_vectors, ids)
+        self.base_ids = np.sort(ids)
+        print(f"Converted legacy index with {len(ids)} candidates to per-aspect indexes")
+
+def _profile_text_batches(embedding_manager: ProfileEmbeddingManager, candidates: Any, total: int):
+    """Texts of every aspect of the candidates, one list per rebuild chunk."""
+    for start in range(0, total, REBUILD_CHUNK_SIZE):
+        batch = []
+        for candidate in candidates[start:start + REBUILD_CHUNK_SIZE]:
+            texts = embedding_manager._prepare_profile_text(candidate)
+            batch.extend(texts[aspect] for aspect in ASPECTS)
+        yield batch
+
 def initialize_index() -> None:
     """Initialize the FAISS index with all existing candidates."""
     try:
@@ -277,38 +955,350 @@ def initialize_index() -> None:
 
         print(f"Found {candidates.count()} candidates to index")
         
-        # Clear existing index
-        embedding_manager.index = faiss.IndexFlatIP(embedding_manager.dimension)
-        embedding_manager.candidate_emails = []
+        # Build into a fresh manager so live searches keep the old index until the publish
+        embedding_manager = ProfileEmbeddingManager()
+        embedding_manager.reset_index()
         
-        # Add each candidate to the index
-        for candidate in candidates:
+        candidates = candidates.order_by('id').prefetch_related('work_experiences', 'projects')
+        total = candidates.count()
+        provider = get_embedding_provider()
+        if provider.fittable:
+            # Corpus statistics (lexical IDF) come from the profiles being indexed
+            provider.fit(_profile_text_batches(embedding_manager, candidates, total))
+            print(f"Fitted the {provider.name} embedder on {total} candidates")
+
+        # Embed candidates in chunks, packing the texts of a whole chunk into shared requests
+        for start in range(0, total, REBUILD_CHUNK_SIZE):
+            chunk = list(candidates[start:start + REBUILD_CHUNK_SIZE])
             try:
-                embedding_manager.add_to_index(candidate)
-                print(f"Added candidate {candidate.user.email} to index")
+                chunk_embeddings = embedding_manager.generate_embeddings_batch(chunk)
             except Exception as e:
-                print(f"Error adding candidate {candidate.user.email} to index: {str(e)}")
-                continue
+                # Fall back to one request per candidate, so only the failing ones are skipped
+                print(f"Error embedding candidates {chunk[0].id} to {chunk[-1].id}, retrying one by one: {str(e)}")
+                chunk_embeddings = [None] * len(chunk)
+            chunk_texts = {}
+            for candidate, embeddings in zip(chunk, chunk_embeddings):
+                try:
+                    if embeddings is not None:
+                        embedding_manager.add_to_index(candidate, save=False, embeddings=embeddings)
+                        chunk_texts[candidate.id] = embedding_manager._prepare_profile_text(candidate)
+                    else:
+                        embedding_manager.add_to_index(candidate, save=False)
+                except Exception as e:
+                    print(f"Error adding candidate {candidate.id} to index: {str(e)}")
+                    continue
+            save_aspect_hashes(chunk_texts)
+            print(f"Added {min(start + REBUILD_CHUNK_SIZE, total)} of {total} candidates to index")
+        
+        # Compact into a base picked for the final corpus size, trained on the full set
+        embedding_manager.compact(rebase=False)
+        provider.save_fit()
+        index_registry.reset()
         
         print("Index initialization completed")
     except Exception as e:
         print(f"Error initializing index: {str(e)}")
         raise Exception(f"Failed to initialize index: {str(e)}")
 
-# Create a singleton instance
-embedding_manager = ProfileEmbeddingManager()
+# Process-wide live index, reloaded when another process publishes a new generation
+index_registry = IndexRegistry(ProfileEmbeddingManager, get_index_config()["RELOAD_INTERVAL"])
+
+# Rankings behind the cursors of paged searches
+ranking_cache = RankingCache(get_index_config()["RANKING_CACHE"], get_index_config()["RANKING_TTL"])
+
+# Rankings of recent searches, shared by every manager this process loads
+result_cache = SearchResultCache(
+    get_index_config()["RESULT_CACHE_SIZE"],
+    get_index_config()["RESULT_CACHE_TTL"],
+    get_index_config()["RESULT_CACHE_ALIAS"]
+)
+
+_keyword_index = None
+_keyword_index_lock = threading.Lock()
+
+def _keyword_text(candidate: Candidate) -> str:
+    """A candidate's document in the BM25 index: its keyword aspect texts."""
+    texts = ProfileEmbeddingManager._prepare_profile_text(candidate)
+    return "\n".join(texts[aspect] for aspect in KEYWORD_ASPECTS)
+
+def load_keyword_index() -> BM25Index:
+    """Build the BM25 index over every candidate's keyword aspects from the database."""
+    config = get_index_config()
+    candidates = Candidate.objects.order_by('id').prefetch_related('work_experiences', 'projects')
+    keyword_index = BM25Index(config["BM25_K1"], config["BM25_B"]).build(
+        (candidate.id, _keyword_text(candidate)) for candidate in candidates.iterator(chunk_size=REBUILD_CHUNK_SIZE)
+    )
+    print(f"Built keyword index over {keyword_index.documents} candidates")
+    return keyword_index
+
+def get_keyword_index() -> BM25Index:
+    """
+    This process's BM25 index, shared by every manager it loads. Built on first use,
+    kept current by this process's edits, and rebuilt every KEYWORD_REFRESH_INTERVAL
+    seconds to pick up other processes' edits.
+    """
+    global _keyword_index
+    keyword_index = _keyword_index
+    interval = get_index_config()["KEYWORD_REFRESH_INTERVAL"]
+    if keyword_index is None or time.monotonic() - keyword_index.loaded_at > interval:
+        with _keyword_index_lock:
+            if _keyword_index is None or time.monotonic() - _keyword_index.loaded_at > interval:
+                _keyword_index = load_keyword_index()
+            keyword_index = _keyword_index
+    return keyword_index
+
+_skill_index = None
+_skill_index_lock = threading.Lock()
+_skill_writer = None
+
+def _save_skill_index() -> None:
+    _skill_index.save(get_index_config()["SKILL_INDEX_PATH"])
+
+def _needs_sync(skill_index: SkillIndex, interval: float) -> bool:
+    """Whether a skill index was never synced or its last sync is older than interval seconds."""
+    return skill_index.loaded_at is None or time.monotonic() - skill_index.loaded_at > interval
+
+def get_skill_index() -> SkillIndex:
+    """
+    This process's skill index. Read from SKILL_INDEX_PATH on first use (built from the
+    database if the file is missing or unreadable) and brought up to date with candidates
+    saved since; then synced again every ATTRIBUTE_REFRESH_INTERVAL seconds.
+    """
+    global _skill_index, _skill_writer
+    config = get_index_config()
+    skill_index = _skill_index
+    if skill_index is not None and not _needs_sync(skill_index, config["ATTRIBUTE_REFRESH_INTERVAL"]):
+        return skill_index
+    with _skill_index_lock:
+        if _skill_index is None:
+            path = config["SKILL_INDEX_PATH"]
+            try:
+                skill_index = SkillIndex().read(path) if os.path.exists(path) else SkillIndex()
+            except Exception as e:
+                print(f"Error reading skill index, rebuilding it: {str(e)}")
+                skill_index = SkillIndex()
+            _skill_writer = SnapshotWriter(_save_skill_index, config["FLUSH_INTERVAL"], config["FLUSH_MAX_PENDING"])
+        else:
+            skill_index = _skill_index
+        if _needs_sync(skill_index, config["ATTRIBUTE_REFRESH_INTERVAL"]):
+            applied = skill_index.sync()
+            _skill_index = skill_index
+            if applied:
+                _skill_writer.mark_dirty(applied)
+        return skill_index
+
+def update_profile_skills(candidate: Candidate) -> None:
+    """Re-index a saved candidate's skills, if this process has loaded the skill index."""
+    if _skill_index is not None:
+        _skill_index.upsert(candidate.id, candidate.skills)
+        _skill_writer.mark_dirty()
+
+def remove_profile_skills(candidate_id: int) -> None:
+    """Drop a deleted candidate from the skill index, if this process has loaded it."""
+    if _skill_index is not None:
+        _skill_index.remove(candidate_id)
+        _skill_writer.mark_dirty()
+
+def update_profile_keywords(candidate: Candidate) -> None:
+    """Refresh a candidate's BM25 document, if this process has built the keyword index."""
+    if _keyword_index is not None:
+        _keyword_index.upsert(candidate.id, _keyword_text(candidate))
+
+def remove_profile_keywords(candidate_id: int) -> None:
+    """Drop a deleted candidate's BM25 document, if this process has built the keyword index."""
+    if _keyword_index is not None:
+        _keyword_index.remove(candidate_id)
+
+def aspect_hashes(texts: Dict[str, str]) -> Dict[str, str]:
+    """sha256 of each aspect's profile text."""
+    return {aspect: hashlib.sha256(texts[aspect].encode("utf-8")).hexdigest() for aspect in ASPECTS}
+
+def save_aspect_hashes(texts_by_candidate: Dict[int, Dict[str, str]]) -> None:
+    """Record the aspect texts behind candidates' indexed embeddings."""
+    if not texts_by_candidate:
+        return
+    model = get_embedding_provider().model_id(EMBEDDING_MODEL)
+    try:
+        CandidateEmbeddingState.objects.bulk_create(
+            [
+                CandidateEmbeddingState(candidate_id=candidate_id, embedding_model=model, aspect_hashes=aspect_hashes(texts))
+                for candidate_id, texts in texts_by_candidate.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["candidate"],
+            update_fields=["embedding_model", "aspect_hashes", "updated_at"],
+        )
+    except Exception as e:
+        # Only costs a full re-embedding on the candidate's next refresh
+        print(f"Error saving embedding state of {len(texts_by_candidate)} candidates: {str(e)}")
+
+def refresh_profile_embeddings(candidate_ids: List[int]) -> Dict[str, int]:
+    """
+    Bring the indexed embeddings of these candidates up to date with their profiles.
+
+    Each aspect text is hashed and compared with the hash recorded when it was last
+    embedded; only changed aspects are re-embedded, in one batch across all candidates,
+    and the unchanged ones keep their stored vectors. Candidates missing from the index,
+    or embedded by another model, are embedded in full; deleted ones are removed.
+    Returns the number of candidates updated and of aspect texts embedded.
+    """
+    manager = get_embedding_manager()
+    candidates = list(Candidate.objects.filter(id__in=candidate_ids).prefetch_related('work_experiences', 'projects'))
+    for candidate_id in set(candidate_ids) - {candidate.id for candidate in candidates}:
+        manager.remove_from_index(candidate_id)
+
+    model = get_embedding_provider().model_id(EMBEDDING_MODEL)
+    recorded = {
+        state.candidate_id: state.aspect_hashes
+        for state in CandidateEmbeddingState.objects.filter(candidate_id__in=candidate_ids, embedding_model=model)
+    }
+    updates = []  # (candidate, texts, stored vectors, changed aspects)
+    requests = []
+    for candidate in candidates:
+        texts = manager._prepare_profile_text(candidate)
+        stored = manager.stored_embeddings(candidate.id)
+        previous = recorded.get(candidate.id, {}) if stored is not None else {}
+        hashes = aspect_hashes(texts)
+        changed = [aspect for aspect in ASPECTS if hashes[aspect] != previous.get(aspect)]
+        if changed:
+            updates.append((candidate, texts, stored, changed))
+            requests.extend(texts[aspect] for aspect in changed)
+
+    vectors = get_embeddings(requests) if requests else []
+    position = 0
+    updated = {}
+    for candidate, texts, stored, changed in updates:
+        embeddings = {f"{aspect}_embedding": stored[aspect] for aspect in ASPECTS if aspect not in changed}
+        for aspect in changed:
+            embeddings[f"{aspect}_embedding"] = vectors[position]
+            position += 1
+        try:
+            manager.add_to_index(candidate, embeddings=embeddings)
+            updated[candidate.id] = texts
+        except Exception as e:
+            print(f"Error refreshing embeddings for candidate {candidate.id}: {str(e)}")
+    save_aspect_hashes(updated)
+    if updates:
+        print(f"Re-embedded {len(requests)} aspects of {len(updated)} candidates")
+    return {"candidates": len(updated), "aspects": len(requests)}
+
+_reembed_queue = None
+_reembed_queue_lock = threading.Lock()
+_deferred_refreshes = threading.local()
+
+@contextmanager
+def deferred_profile_refreshes():
+    """Within this block, profiles saved by this thread are not queued; the caller embeds them itself."""
+    _deferred_refreshes.active = True
+    try:
+        yield
+    finally:
+        _deferred_refreshes.active = False
+
+def enqueue_profile_refresh(candidate_id: int) -> None:
+    """Queue a candidate whose profile changed for a background refresh_profile_embeddings."""
+    global _reembed_queue
+    config = get_index_config()
+    if not config["REEMBED_ON_SAVE"] or getattr(_deferred_refreshes, "active", False):
+        return
+    if _reembed_queue is None:
+        with _reembed_queue_lock:
+            if _reembed_queue is None:
+                _reembed_queue = ReembedQueue(
+                    refresh_profile_embeddings, config["REEMBED_DELAY"], config["REEMBED_MAX_DELAY"],
+                    config["REEMBED_MAX_ATTEMPTS"]
+                )
+                atexit.register(flush_profile_refreshes)
+    _reembed_queue.enqueue(candidate_id)
+
+def flush_profile_refreshes() -> None:
+    """
+    Re-embed queued candidates now and write the resulting snapshot; runs at exit,
+    so the refreshes are compacted even if the snapshot writer flushed first.
+    """
+    if _reembed_queue is not None:
+        _reembed_queue.flush()
+    manager = index_registry.peek()
+    if manager is not None and manager._snapshot_writer is not None:
+        manager._snapshot_writer.flush()
+
+def get_embedding_manager() -> ProfileEmbeddingManager:
+    """Return this process's live embedding manager."""
+    return index_registry.get()
 
 def update_profile_embeddings(candidate_id: int) -> None:
     """Update embeddings for a specific candidate."""
     try:
         candidate = Candidate.objects.get(id=candidate_id)
-        embedding_manager.add_to_index(candidate)
+        get_embedding_manager().add_to_index(candidate)
     except Exception as e:
         raise Exception(f"Error updating embeddings for candidate {candidate_id}: {str(e)}")
 
-def search_candidates(query: str, k: int = 10) -> List[Dict[str, Any]]:
-    """Search for candidates based on a query."""
+def update_profile_attributes(candidate: Candidate) -> None:
+    """Refresh a saved candidate's filter attributes, if this process has loaded them."""
+    manager = index_registry.peek()
+    if manager is not None and manager._attribute_store is not None:
+        manager._attribute_store.upsert(candidate)
+
+def remove_profile_embeddings(candidate_id: int) -> None:
+    """Remove a deleted candidate's embeddings from the index."""
     try:
-        return embedding_manager.search_similar_profiles(query, k)
+        get_embedding_manager().remove_from_index(candidate_id)
+    except Exception as e:
+        raise Exception(f"Error removing embeddings for candidate {candidate_id}: {str(e)}")
+
+def search_candidates(query: str, k: int = 10, nprobe: int = None, ef_search: int = None,
+                      filters: Dict[str, Any] = None, mode: str = None) -> List[Dict[str, Any]]:
+    """Search for candidates based on a query, optionally restricted by attribute filters."""
+    try:
+        return get_embedding_manager().search_similar_profiles(
+            query, k, nprobe=nprobe, ef_search=ef_search, filters=filters, mode=mode
+        )
+    except ValueError:
+        # Invalid requests and empty results keep their type for the views
+        raise
+    except Exception as e:
+        raise Exception(f"Error searching candidates: {str(e)}")
+
+
+def search_candidates_page(query: str = None, k: int = 10, nprobe: int = None, ef_search: int = None,
+                           filters: Dict[str, Any] = None, cursor: str = None, mode: str = None) -> Dict[str, Any]:
+    """
+    One page of a candidate search.
+    
+    Without a cursor the query is ranked down to RANKING_DEPTH candidates (at least k),
+    the ranking is cached for RANKING_TTL seconds and its first k results are returned.
+    With a cursor from a previous page the next k results are sliced from the cached
+    ranking, with no parsing, embedding or index search.
+    
+    Returns:
+        Dict[str, Any]: "results", the "query", the retrieval "mode", the "offset" of the page,
+        the "total" number of ranked candidates and the "next_cursor" (None on the last page)
+    """
+    try:
+        if k < 1:
+            raise ValueError("Page size k must be at least 1")
+        manager = get_embedding_manager()
+        if cursor:
+            ranking_id, ranking, offset = ranking_cache.read_cursor(cursor)
+        else:
+            depth = max(k, int(manager.index_config["RANKING_DEPTH"]))
+            ranking = manager.rank_profiles(query, depth, nprobe=nprobe, ef_search=ef_search,
+                                            filters=filters, mode=mode)
+            # Copy, as the ranking itself may be shared through the result cache
+            ranking = dict(ranking, query=query)
+            ranking_id, offset = ranking_cache.store(ranking), 0
+        results = manager.hydrate_results(ranking, offset, k)
+        next_offset = offset + k
+        return {
+            "results": results,
+            "query": ranking["query"],
+            "mode": ranking.get("mode", "dense"),
+            "offset": offset,
+            "total": len(ranking["ids"]),
+            "next_cursor": ranking_cache.make_cursor(ranking_id, next_offset) if next_offset < len(ranking["ids"]) else None,
+        }
+    except ValueError:
+        raise
     except Exception as e:
-        raise Exception(f"Error searching candidates: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Error searching candidates: {str(e)}")
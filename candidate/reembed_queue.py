@@ -0,0 +1,124 @@
+import threading
+import time
+from typing import Callable, List, Optional
+from django.db import close_old_connections
+
+class ReembedQueue:
+    """
+    Debounced queue of candidates whose profiles changed.
+
+    Callers report each change with enqueue(). A background worker hands the
+    queued ids to the process callback in one batch once no id has arrived for
+    delay seconds, or max_delay seconds after the oldest queued id, so the
+    saves of one edit (a candidate and its projects) become one refresh.
+
+    Ids of a failed batch are retried one at a time, so one bad profile does
+    not fail the others again, after delay * 2**attempts seconds. An id that
+    failed max_attempts times is dropped; enqueueing it again (a new save)
+    starts over. Owners call flush() before exiting to process anything
+    still queued.
+    """
+
+    def __init__(self, process: Callable[[List[int]], None], delay: float = 2.0, max_delay: float = 10.0,
+                 max_attempts: int = 5):
+        self._process = process
+        self._delay = delay
+        self._max_delay = max_delay
+        self._max_attempts = max_attempts
+        self._pending = set()
+        self._first_at = None
+        self._last_at = None
+        self._attempts = {}  # Candidate id -> failed attempts, while it is being retried
+        self._retry_at = {}  # Candidate id -> monotonic time of its next attempt
+        self._worker = None
+        self._condition = threading.Condition()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._retry_at)
+
+    def _take(self) -> List[int]:
+        """Empty the queue and return its ids (lock held)."""
+        batch = sorted(self._pending)
+        self._pending = set()
+        self._first_at = self._last_at = None
+        return batch
+
+    def enqueue(self, candidate_id: int) -> None:
+        """Queue a candidate for processing after the debounce delay."""
+        now = time.monotonic()
+        with self._condition:
+            self._pending.add(candidate_id)
+            self._attempts.pop(candidate_id, None)
+            self._retry_at.pop(candidate_id, None)
+            if self._first_at is None:
+                self._first_at = now
+            self._last_at = now
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+            self._condition.notify()
+
+    def _next_batch(self) -> Optional[List[int]]:
+        """The batch due now, or None after waiting until the next one may be due (lock held)."""
+        now = time.monotonic()
+        wait = None
+        if self._pending:
+            due = min(self._last_at + self._delay, self._first_at + self._max_delay)
+            if due <= now:
+                return self._take()
+            wait = due - now
+        if self._retry_at:
+            candidate_id = min(self._retry_at, key=self._retry_at.get)
+            if self._retry_at[candidate_id] <= now:
+                del self._retry_at[candidate_id]
+                return [candidate_id]
+            retry_wait = self._retry_at[candidate_id] - now
+            wait = retry_wait if wait is None else min(wait, retry_wait)
+        self._condition.wait(wait)
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                batch = None
+                while batch is None:
+                    batch = self._next_batch()
+            self._run_batch(batch)
+            # Worker threads hold their own database connection
+            close_old_connections()
+
+    def _run_batch(self, batch: List[int]) -> None:
+        try:
+            self._process(batch)
+        except Exception as e:
+            print(f"Error processing {len(batch)} queued candidates: {str(e)}")
+            now = time.monotonic()
+            with self._condition:
+                for candidate_id in batch:
+                    if candidate_id in self._pending:
+                        # Saved again meanwhile, so already queued afresh
+                        continue
+                    attempts = self._attempts.get(candidate_id, 0) + 1
+                    if attempts >= self._max_attempts:
+                        self._attempts.pop(candidate_id, None)
+                        print(f"Giving up on candidate {candidate_id} after {attempts} failed attempts")
+                        continue
+                    self._attempts[candidate_id] = attempts
+                    self._retry_at[candidate_id] = now + self._delay * 2 ** attempts
+                self._condition.notify()
+        else:
+            with self._condition:
+                for candidate_id in batch:
+                    self._attempts.pop(candidate_id, None)
+
+    def flush(self) -> None:
+        """Process queued candidates now, on the caller's thread; ids awaiting a retry get one more attempt."""
+        with self._condition:
+            batch = self._take()
+            retries = sorted(self._retry_at)
+            self._retry_at = {}
+        if batch:
+            self._run_batch(batch)
+        for candidate_id in retries:
+            self._run_batch([candidate_id])
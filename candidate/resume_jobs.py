@@ -0,0 +1,231 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Candidate, Education, Project, ResumeJob, WorkExperience
+from .resume_parser import ResumeData, extract_resume_details, extract_text_from_file, parse_date
+
+RESUME_JOB_DEFAULTS = {
+    "POLL_INTERVAL": 1.0,
+    "MAX_ATTEMPTS": 3,
+    "RETRY_BACKOFF": 30.0,
+    "STALE_AFTER": 900.0,
+}
+
+def get_job_config() -> Dict[str, Any]:
+    """Resume job settings: RESUME_JOB_DEFAULTS overridden by settings.RESUME_JOBS."""
+    config = dict(RESUME_JOB_DEFAULTS)
+    config.update(getattr(settings, "RESUME_JOBS", {}))
+    return config
+
+def _total_experience(resume_data: ResumeData) -> float:
+    """Years of professional experience, summed over the dated positions of a resume."""
+    total_experience = 0
+    for exp in resume_data.professional_experience or []:
+        start_date = parse_date(exp.start_date)
+        if start_date:
+            # Positions without a parsable end date ("Present") run until today
+            end_date = parse_date(exp.end_date) or date.today()
+            total_experience += (end_date - start_date).days / 365.25
+    return round(total_experience, 1)
+
+def save_resume_profile(user: Any, resume_data: ResumeData, resume: str = None, source: str = None) -> Candidate:
+    """
+    Replace a user's candidate profile with the details extracted from a resume.
+
+    The old profile is deleted and the candidate, work experiences, education and
+    projects are written in one transaction, the related rows with one bulk insert
+    each. Once committed the candidate is queued for embedding.
+    """
+    personal_info = resume_data.personal_info
+    skills = []
+    if resume_data.technical_skills:
+        skills.extend(resume_data.technical_skills.technical_skills or [])
+        skills.extend(resume_data.technical_skills.frameworks_libraries or [])
+        skills.extend(resume_data.technical_skills.tools or [])
+
+    with transaction.atomic():
+        if user is not None:
+            Candidate.objects.filter(user=user).delete()
+        candidate = Candidate.objects.create(
+            user=user,
+            name=personal_info.name if personal_info else '',
+            email=personal_info.email if personal_info else '',
+            phone=personal_info.phone if personal_info else '',
+            linkedin_profile=personal_info.linkedin_url if personal_info else '',
+            current_job_title=personal_info.title if personal_info else '',
+            current_company='',
+            skills=', '.join(skills),
+            experience=_total_experience(resume_data),
+            resume=resume,
+            source=source
+        )
+        WorkExperience.objects.bulk_create([
+            WorkExperience(
+                candidate=candidate,
+                company_name=exp.company,
+                role_designation=exp.role,
+                start_date=parse_date(exp.start_date) or datetime.now().date(),
+                end_date=parse_date(exp.end_date),
+                responsibilities='\n'.join(exp.responsibilities) if exp.responsibilities else '',
+                technologies_used=''
+            )
+            for exp in resume_data.professional_experience or []
+            if exp.company and exp.role
+        ])
+        Education.objects.bulk_create([
+            Education(
+                candidate=candidate,
+                institution=edu.institution,
+                degree=edu.degree,
+                field_of_study='',
+                start_date=parse_date(edu.start_date),
+                end_date=parse_date(edu.end_date)
+            )
+            for edu in resume_data.education or []
+            if edu.institution and edu.degree
+        ])
+        Project.objects.bulk_create([
+            Project(
+                candidate=candidate,
+                title=proj.project_name,
+                description=proj.description or '',
+                tech_stack=', '.join(proj.tech_stack) if proj.tech_stack else 'Not specified',
+                role_in_project='Not specified'
+            )
+            for proj in resume_data.projects or []
+            if proj.project_name
+        ])
+        # Bulk inserts send no post_save signals, so queue the finished profile explicitly
+        transaction.on_commit(lambda: _enqueue_embedding(candidate.id))
+    return candidate
+
+def _enqueue_embedding(candidate_id: int) -> None:
+    # Imported lazily so saving profiles does not open the index
+    from .profile_embeddings import enqueue_profile_refresh
+    try:
+        enqueue_profile_refresh(candidate_id)
+    except Exception as e:
+        print(f"Error queueing embeddings for candidate {candidate_id}: {str(e)}")
+
+def create_resume_job(user: Any, resume_file: Any, idempotency_key: str = None) -> Tuple[ResumeJob, bool]:
+    """
+    Store an uploaded resume and queue it for processing.
+    Returns the job and whether it was created; an upload repeating a user's
+    idempotency key returns that key's existing job instead.
+    """
+    if idempotency_key:
+        existing = ResumeJob.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return existing, False
+    try:
+        with transaction.atomic():
+            return ResumeJob.objects.create(user=user, resume=resume_file, idempotency_key=idempotency_key or None), True
+    except IntegrityError:
+        # A concurrent upload with the same key won the insert
+        if idempotency_key:
+            existing = ResumeJob.objects.filter(user=user, idempotency_key=idempotency_key).first()
+            if existing is not None:
+                return existing, False
+        raise
+
+def resume_job_status(job: ResumeJob) -> Dict[str, Any]:
+    """A job's state as returned by the upload and status endpoints."""
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'stage': job.stage,
+        'error': job.error or None,
+        'attempts': job.attempts,
+        'candidate_id': job.candidate_id,
+        'result': job.result,
+        'created_at': job.created_at,
+        'updated_at': job.updated_at,
+        'finished_at': job.finished_at,
+    }
+
+def requeue_stale_jobs() -> int:
+    """
+    Return running jobs whose worker stopped reporting progress (killed or crashed)
+    to the queue, or fail them once they used up their attempts. Returns the count.
+    """
+    config = get_job_config()
+    now = timezone.now()
+    stale = ResumeJob.objects.filter(status='running', updated_at__lt=now - timedelta(seconds=config["STALE_AFTER"]))
+    failed = stale.filter(attempts__gte=config["MAX_ATTEMPTS"]).update(
+        status='failed', error='Worker stopped while processing the job', updated_at=now, finished_at=now
+    )
+    requeued = stale.update(status='queued', available_at=now, updated_at=now)
+    return failed + requeued
+
+def claim_next_job() -> Optional[ResumeJob]:
+    """
+    Mark the oldest runnable queued job as running and return it, or None if there is none.
+    The claim is a conditional update, so concurrent workers never run the same job.
+    """
+    while True:
+        now = timezone.now()
+        job_id = ResumeJob.objects.filter(status='queued', available_at__lte=now).order_by(
+            'available_at', 'id'
+        ).values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        claimed = ResumeJob.objects.filter(id=job_id, status='queued').update(
+            status='running', attempts=F('attempts') + 1, error='', updated_at=now
+        )
+        if claimed:
+            return ResumeJob.objects.select_related('user').get(id=job_id)
+
+def _set_stage(job: ResumeJob, stage: str) -> None:
+    job.stage = stage
+    job.save(update_fields=['stage', 'updated_at'])
+
+def run_resume_job(job: ResumeJob) -> None:
+    """
+    Process a claimed job: extract the resume text, parse it and save the profile.
+    Invalid resumes fail the job at once; other errors (LLM or network) queue it
+    again after RETRY_BACKOFF seconds, doubled per attempt, until MAX_ATTEMPTS.
+    """
+    config = get_job_config()
+    try:
+        _set_stage(job, 'extracting')
+        with job.resume.open('rb') as resume_file:
+            resume_text = extract_text_from_file(resume_file)
+        if not resume_text or not resume_text.strip():
+            raise ValueError("No text found in the resume")
+
+        _set_stage(job, 'parsing')
+        resume_data = extract_resume_details(resume_text)
+        if not resume_data:
+            raise Exception("Failed to parse resume")
+
+        _set_stage(job, 'saving')
+        candidate = save_resume_profile(job.user, resume_data, job.resume.name)
+        job.status = 'succeeded'
+        job.stage = 'done'
+        job.candidate = candidate
+        job.result = {
+            'message': 'Resume processed successfully. Profile has been created.',
+            'resume_url': candidate.resume.url,
+            'profile_updated': True,
+            'projects_created': len(resume_data.projects) if resume_data.projects else 0
+        }
+        job.finished_at = timezone.now()
+        job.save()
+        print(f"Resume job {job.id} created candidate {candidate.id}")
+    except Exception as e:
+        job.error = str(e)
+        # Invalid files and profiles that conflict with existing ones fail the same way every time
+        if isinstance(e, (ValueError, IntegrityError)) or job.attempts >= config["MAX_ATTEMPTS"]:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            print(f"Resume job {job.id} failed at {job.stage}: {str(e)}")
+        else:
+            job.status = 'queued'
+            job.available_at = timezone.now() + timedelta(
+                seconds=config["RETRY_BACKOFF"] * 2 ** (job.attempts - 1)
+            )
+            print(f"Resume job {job.id} failed at {job.stage}, retrying later: {str(e)}")
+        job.save()
@@ -1,14 +1,11 @@
-from google import genai
 from pydantic import BaseModel
 import json
-from dotenv import load_dotenv
-import os
 import PyPDF2
 import docx
+from datetime import datetime
+from .llm_providers import get_provider
 
-load_dotenv()
-
-api_key = os.getenv("GEMINI_API")
+RESUME_MODEL = "gemini-2.0-flash"
 
 class PersonalInfo(BaseModel):
     name: str | None = None
@@ -54,6 +51,45 @@ class ResumeData(BaseModel):
     additional_information: list[str] | None = None
     projects: list[Project] | None = None
 
+def parse_date(date_str):
+    """
+    Parse date string in various formats to datetime.date object
+    Handles formats like:
+    - YYYY-MM-DD
+    - MMM YYYY (e.g., Jan 2023)
+    - MM/YYYY
+    - YYYY
+    """
+    if not date_str:
+        return None
+        
+    # Try YYYY-MM-DD format
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        pass
+        
+    # Try MMM YYYY format (e.g., Jan 2023)
+    try:
+        return datetime.strptime(date_str, '%b %Y').date()
+    except ValueError:
+        pass
+        
+    # Try MM/YYYY format
+    try:
+        return datetime.strptime(date_str, '%m/%Y').date()
+    except ValueError:
+        pass
+        
+    # Try YYYY format
+    try:
+        return datetime.strptime(date_str, '%Y').date()
+    except ValueError:
+        pass
+        
+    # If all parsing attempts fail, return None
+    return None
+
 def extract_text_from_file(file):
     """Extract text from PDF or DOCX file"""
     if file.name.endswith('.pdf'):
@@ -71,9 +107,14 @@ def extract_text_from_file(file):
     else:
         raise ValueError("Unsupported file format. Please upload a PDF or DOCX file.")
 
+def extract_text_from_path(path: str) -> str:
+    """Extract text from a PDF or DOCX file on disk (picklable, for process pools)."""
+    with open(path, 'rb') as file:
+        return extract_text_from_file(file)
+
 def extract_resume_details(resume_content: str) -> ResumeData | None:
     """
-    Extracts details from resume content using a Generative AI model.
+    Extracts details from resume content using the configured LLM provider.
 
     Args:
         resume_content: The text content of the resume.
@@ -81,7 +122,6 @@ def extract_resume_details(resume_content: str) -> ResumeData | None:
     Returns:
         A ResumeData object containing the extracted information, or None if extraction fails.
     """
-    client = genai.Client(api_key=api_key)
     prompt = f"""
     Extract ONLY the information that is EXPLICITLY mentioned in the resume content provided below.
     DO NOT make any assumptions or inferences about missing information.
@@ -177,16 +217,7 @@ def extract_resume_details(resume_content: str) -> ResumeData | None:
     """
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config={
-                "response_mime_type": "application/json",
-                "response_schema": ResumeData,
-            },
-        )
-        return response.parsed
+        return get_provider().generate_structured(prompt, ResumeData, RESUME_MODEL)
     except Exception as e:
         print(f"Error during resume extraction: {e}")
-        print(f"Raw response: {response.text if 'response' in locals() else 'No response'}")
         return None 
\ No newline at end of file
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from django.core.cache import caches
+
+def normalize_query(text: str) -> str:
+    """Query text with case and runs of whitespace folded, so trivially different queries share entries."""
+    return " ".join(text.split()).casefold()
+
+def search_key(query: str, **options: Any) -> str:
+    """Stable cache key of a normalized query and the options that change its results."""
+    payload = json.dumps({"q": normalize_query(query), **options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class SearchResultCache:
+    """
+    Two-tier cache of search results.
+
+    The first tier is an LRU dict in this process holding up to max_entries
+    results. The optional second tier is a Django cache alias shared by every
+    worker. Entries expire after ttl seconds in both tiers. Callers put the
+    index version into the key, so a new generation never serves older results.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0, alias: Optional[str] = None):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._alias = alias
+        self._entries = OrderedDict()  # key -> (expiry, value), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _shared_key(self, key: str) -> str:
+        return f"search_result:{key}"
+
+    def get(self, key: str, shared_key: Optional[str] = None) -> Any:
+        """Cached value of a key, or None. shared_key looks the shared tier up on a local miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+        value = None
+        if shared_key is not None and self._alias is not None:
+            try:
+                value = caches[self._alias].get(self._shared_key(shared_key))
+            except Exception as e:
+                print(f"Error reading shared search cache: {str(e)}")
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._set_local(key, value)
+        return value
+
+    def _set_local(self, key: str, value: Any) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, key: str, value: Any, shared_key: Optional[str] = None) -> None:
+        """Cache a value locally, and in the shared tier under shared_key if given."""
+        self._set_local(key, value)
+        if shared_key is not None and self._alias is not None:
+            try:
+                caches[self._alias].set(self._shared_key(shared_key), value, self._ttl)
+            except Exception as e:
+                print(f"Error writing shared search cache: {str(e)}")
+
+    def clear(self) -> None:
+        """Drop every local entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
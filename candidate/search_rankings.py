@@ -0,0 +1,59 @@
+import uuid
+from typing import Any, Dict, Optional, Tuple
+from django.core import signing
+from django.core.cache import caches
+
+# Salt of the signed page cursors, so tokens signed for other purposes are rejected
+CURSOR_SALT = "candidate.search_rankings.cursor"
+
+class RankingCache:
+    """
+    Fused search rankings kept server-side for paging.
+
+    The first page of a search stores its whole ranking (ordered candidate ids
+    with their scores) under a random id in the Django cache. Following pages
+    are sliced out of the stored ranking, so they cost no LLM, embedding or
+    index work. Clients only see an opaque, signed cursor naming the ranking
+    and the offset of the next page.
+
+    Cursors work across workers only when the cache alias is shared (file,
+    database, Redis, Memcached); the candidate.E002 system check rejects a
+    process-local alias.
+    """
+
+    def __init__(self, alias: str = "shared", ttl: float = 600.0):
+        self._alias = alias
+        self._ttl = ttl
+
+    @property
+    def cache(self) -> Any:
+        return caches[self._alias]
+
+    def _key(self, ranking_id: str) -> str:
+        return f"search_ranking:{ranking_id}"
+
+    def store(self, ranking: Dict[str, Any]) -> str:
+        """Keep a ranking for the TTL and return its id."""
+        ranking_id = uuid.uuid4().hex
+        self.cache.set(self._key(ranking_id), ranking, self._ttl)
+        return ranking_id
+
+    def get(self, ranking_id: str) -> Optional[Dict[str, Any]]:
+        """A stored ranking, or None once it expired."""
+        return self.cache.get(self._key(ranking_id))
+
+    def make_cursor(self, ranking_id: str, offset: int) -> str:
+        """Opaque cursor for the page of a ranking starting at offset."""
+        return signing.dumps({"r": ranking_id, "o": offset}, salt=CURSOR_SALT, compress=True)
+
+    def read_cursor(self, cursor: str) -> Tuple[str, Dict[str, Any], int]:
+        """The ranking id, ranking and offset a cursor points at; ValueError if it is forged or expired."""
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT, max_age=self._ttl)
+            ranking_id, offset = payload["r"], int(payload["o"])
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise ValueError("Invalid search cursor")
+        ranking = self.get(ranking_id)
+        if ranking is None:
+            raise ValueError("Search cursor expired, run the search again")
+        return ranking_id, ranking, offset
@@ -0,0 +1,78 @@
+from typing import Callable
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Candidate, Project, WorkExperience
+
+def _on_commit(action: Callable[[int], None], candidate_id: int, description: str) -> None:
+    """
+    Run action(candidate_id) once the current transaction commits (right away outside one),
+    so a rolled-back delete leaves the indexes alone and re-embedding reads committed rows.
+    """
+    def run():
+        try:
+            action(candidate_id)
+        except Exception as e:
+            print(f"Error {description} for candidate {candidate_id}: {str(e)}")
+    transaction.on_commit(run)
+
+@receiver(post_delete, sender=Candidate)
+def remove_candidate_embeddings(sender, instance, **kwargs):
+    """Drop a deleted candidate's vectors so the index tracks the candidate table."""
+    # Imported lazily so loading the app does not open the index
+    from .profile_embeddings import remove_profile_embeddings
+    _on_commit(remove_profile_embeddings, instance.id, "removing embeddings")
+
+@receiver(post_save, sender=Candidate)
+def update_candidate_attributes(sender, instance, **kwargs):
+    """Keep this process's filter attributes in step with saved candidates."""
+    from .profile_embeddings import update_profile_attributes
+    try:
+        update_profile_attributes(instance)
+    except Exception as e:
+        print(f"Error updating attributes for candidate {instance.id}: {str(e)}")
+
+@receiver(post_save, sender=Candidate)
+def update_candidate_keywords(sender, instance, **kwargs):
+    """Keep this process's BM25 keyword index in step with saved candidates."""
+    from .profile_embeddings import update_profile_keywords
+    try:
+        update_profile_keywords(instance)
+    except Exception as e:
+        print(f"Error updating keywords for candidate {instance.id}: {str(e)}")
+
+@receiver(post_delete, sender=Candidate)
+def remove_candidate_keywords(sender, instance, **kwargs):
+    """Drop a deleted candidate from this process's BM25 keyword index."""
+    from .profile_embeddings import remove_profile_keywords
+    _on_commit(remove_profile_keywords, instance.id, "removing keywords")
+
+@receiver(post_save, sender=Candidate)
+def update_candidate_skills(sender, instance, **kwargs):
+    """Keep this process's skill index in step with saved candidates."""
+    from .profile_embeddings import update_profile_skills
+    try:
+        update_profile_skills(instance)
+    except Exception as e:
+        print(f"Error updating skills for candidate {instance.id}: {str(e)}")
+
+@receiver(post_delete, sender=Candidate)
+def remove_candidate_skills(sender, instance, **kwargs):
+    """Drop a deleted candidate from this process's skill index."""
+    from .profile_embeddings import remove_profile_skills
+    _on_commit(remove_profile_skills, instance.id, "removing skills")
+
+@receiver(post_save, sender=Candidate)
+def queue_candidate_reembedding(sender, instance, **kwargs):
+    """Re-embed the changed aspects of a saved candidate in the background."""
+    from .profile_embeddings import enqueue_profile_refresh
+    _on_commit(enqueue_profile_refresh, instance.id, "queueing re-embedding")
+
+@receiver(post_save, sender=WorkExperience)
+@receiver(post_delete, sender=WorkExperience)
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def queue_profile_section_reembedding(sender, instance, **kwargs):
+    """Re-embed the changed aspects of the candidate owning a saved or deleted profile section."""
+    from .profile_embeddings import enqueue_profile_refresh
+    _on_commit(enqueue_profile_refresh, instance.candidate_id, "queueing re-embedding")
@@ -0,0 +1,420 @@
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, List, Set
+import numpy as np
+from django.utils import timezone
+from .index_snapshots import atomic_write
+from .models import Candidate
+
+# Spellings folded into one skill name
+SKILL_ALIASES = {
+    "js": "javascript",
+    "ts": "typescript",
+    "reactjs": "react",
+    "react.js": "react",
+    "nodejs": "node.js",
+    "node": "node.js",
+    "golang": "go",
+    "postgres": "postgresql",
+    "k8s": "kubernetes",
+    "ml": "machine learning",
+    "scikit learn": "scikit-learn",
+    "sklearn": "scikit-learn",
+}
+
+_SEPARATORS = re.compile(r"[,;|\n]+")
+
+def normalize_skill(name: str) -> str:
+    """Canonical form of a skill: lowercased, single-spaced, without stray punctuation, aliases folded."""
+    skill = " ".join(str(name).lower().split()).strip(" .,:;!?()[]{}'\"")
+    return SKILL_ALIASES.get(skill, skill)
+
+def split_skills(value: str) -> Set[str]:
+    """Normalized skills of a comma-separated Candidate.skills value."""
+    return {skill for skill in (normalize_skill(part) for part in _SEPARATORS.split(value or "")) if skill}
+
+# Skill query language:
+#   query := or ; or := and ("OR" and)* ; and := not (("AND" | ",") not)*
+#   not := "NOT" not | "(" query ")" | skill
+# A skill is a quoted string or a run of words that are not operators, e.g.
+#   python AND (django OR flask), NOT php
+#   "machine learning" AND NOT (java OR c#)
+# Operators are case-insensitive; "&", "|" and "!" work as AND, OR and NOT.
+_QUERY_TOKEN = re.compile(r'\s*(?:(")([^"]*)"|([(),&|!])|([^\s(),&|!"]+))')
+_OPERATORS = {"and": "AND", "&": "AND", ",": "AND", "or": "OR", "|": "OR", "not": "NOT", "!": "NOT"}
+
+def _query_tokens(query: str) -> List[Any]:
+    """(kind, value) tokens of a skill query, with adjacent words joined into one skill."""
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _QUERY_TOKEN.match(query, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Invalid skill query near: {query[position:position + 20]}")
+        position = match.end()
+        quote, quoted, symbol, word = match.groups()
+        if quote:
+            tokens.append(("SKILL", quoted))
+        elif symbol in ("(", ")"):
+            tokens.append((symbol, symbol))
+        else:
+            text = symbol or word
+            operator = _OPERATORS.get(text.lower())
+            if operator:
+                tokens.append((operator, text))
+            elif tokens and tokens[-1][0] == "WORD":
+                tokens[-1] = ("WORD", f"{tokens[-1][1]} {text}")
+            else:
+                tokens.append(("WORD", text))
+    return [("SKILL", value) if kind == "WORD" else (kind, value) for kind, value in tokens]
+
+def parse_skill_query(query: str) -> Any:
+    """
+    Syntax tree of a skill query: ("skill", name), ("not", node), or ("and" | "or", left, right).
+    Raises ValueError on invalid syntax.
+    """
+    tokens = _query_tokens(query or "")
+    position = 0
+
+    def peek() -> str:
+        return tokens[position][0] if position < len(tokens) else None
+
+    def take(kind: str) -> Any:
+        nonlocal position
+        if peek() != kind:
+            found = tokens[position][1] if position < len(tokens) else "end of query"
+            raise ValueError(f"Invalid skill query: expected {kind.lower()}, found {found}")
+        position += 1
+        return tokens[position - 1][1]
+
+    def parse_or() -> Any:
+        node = parse_and()
+        while peek() == "OR":
+            take("OR")
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and() -> Any:
+        node = parse_not()
+        while peek() == "AND":
+            take("AND")
+            node = ("and", node, parse_not())
+        return node
+
+    def parse_not() -> Any:
+        if peek() == "NOT":
+            take("NOT")
+            return ("not", parse_not())
+        if peek() == "(":
+            take("(")
+            node = parse_or()
+            take(")")
+            return node
+        name = normalize_skill(take("SKILL"))
+        if not name:
+            raise ValueError("Invalid skill query: empty skill name")
+        return ("skill", name)
+
+    if not tokens:
+        raise ValueError("Skill query cannot be empty")
+    tree = parse_or()
+    if position < len(tokens):
+        raise ValueError(f"Invalid skill query: unexpected {tokens[position][1]}")
+    return tree
+
+def ids_to_bitmap(ids: np.ndarray, words: int) -> np.ndarray:
+    """Bitmap (uint64 words, bit i of the id space) of sorted, unique candidate ids."""
+    bitmap = np.zeros(words, dtype=np.uint64)
+    if len(ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = ids >> 6
+        starts = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1]])
+        bits = np.left_shift(np.uint64(1), (ids & 63).astype(np.uint64))
+        bitmap[positions[starts]] = np.bitwise_or.reduceat(bits, starts)
+    return bitmap
+
+def bitmap_to_ids(bitmap: np.ndarray) -> np.ndarray:
+    """Sorted candidate ids of the bits set in a bitmap (unpacking only its non-zero bytes)."""
+    octets = bitmap.view(np.uint8)
+    positions = np.flatnonzero(octets)
+    bits = np.unpackbits(octets[positions], bitorder="little").reshape(-1, 8)
+    rows, columns = np.nonzero(bits)
+    return positions[rows].astype(np.int64) * 8 + columns
+
+class SkillIndex:
+    """
+    Inverted index from normalized skills to the candidates listing them.
+
+    Every skill has a posting container over the candidate id space: a bitmap
+    (uint64 words) once it is no smaller than the skill's sorted id array, the
+    id array otherwise, as in Roaring bitmaps. A query compiles to bitwise
+    AND, OR and AND-NOT of whole bitmaps (NOT is taken against the bitmap of
+    every indexed candidate), so its cost depends on the id range, not on the
+    number of matches.
+
+    Each candidate's skills are kept as a forward index, read from the postings
+    at load and overridden by later upserts, so an update only touches the
+    skills that changed. synced_at is the database time up to which every
+    saved candidate is reflected (see sync()).
+    """
+
+    def __init__(self):
+        self.skills = {}  # Normalized skill -> skill number
+        self.names = []  # Skill number -> normalized skill
+        self.bitmaps = {}  # Skill number -> bitmap, for frequent skills
+        self.arrays = {}  # Skill number -> sorted ids, for the others
+        self.universe = np.zeros(0, dtype=np.uint64)  # Bitmap of every indexed candidate
+        self.count = 0
+        self._forward_ids = np.empty(0, dtype=np.int64)  # Sorted ids with skills at load time
+        self._forward_offsets = np.zeros(1, dtype=np.int64)
+        self._forward_skills = np.empty(0, dtype=np.int32)
+        self._changed = {}  # Candidate id -> skill numbers since load
+        self.synced_at = None
+        self.loaded_at = None  # time.monotonic() of the last sync(), None until the first
+        self.version = 0  # Bumped on every change, so cached filtered results can tell they are stale
+        self._lock = threading.Lock()
+
+    @property
+    def words(self) -> int:
+        return len(self.universe)
+
+    def _build(self, rows: List[Any]) -> None:
+        """Index (id, skills value) rows from scratch (lock held)."""
+        self.skills, self.names = {}, []
+        candidate_ids, skill_numbers = [], []
+        ids = []
+        for candidate_id, value in rows:
+            ids.append(candidate_id)
+            for skill in split_skills(value):
+                candidate_ids.append(candidate_id)
+                skill_numbers.append(self._number(skill))
+        self._set_postings(np.array(ids, dtype=np.int64), np.array(candidate_ids, dtype=np.int64),
+                           np.array(skill_numbers, dtype=np.int64))
+
+    def _number(self, skill: str) -> int:
+        """Number of a skill, added to the dictionary if new (lock held)."""
+        number = self.skills.get(skill)
+        if number is None:
+            number = self.skills[skill] = len(self.names)
+            self.names.append(skill)
+            self.arrays[number] = np.empty(0, dtype=np.int64)
+        return number
+
+    def _set_postings(self, ids: np.ndarray, candidate_ids: np.ndarray, skill_numbers: np.ndarray) -> None:
+        """Replace all containers with the (candidate, skill) pairs given (lock held)."""
+        ids = np.unique(ids)
+        self.count = len(ids)
+        self.universe = ids_to_bitmap(ids, int(ids[-1]) // 64 + 1 if len(ids) else 0)
+        # Postings: pairs ordered by skill, then by candidate
+        order = np.lexsort((candidate_ids, skill_numbers))
+        sorted_ids, sorted_skills = candidate_ids[order], skill_numbers[order]
+        bounds = np.searchsorted(sorted_skills, np.arange(len(self.names) + 1))
+        self.bitmaps, self.arrays = {}, {}
+        for number in range(len(self.names)):
+            self._store(number, sorted_ids[bounds[number]:bounds[number + 1]])
+        # Forward index: the same pairs ordered by candidate
+        order = np.argsort(candidate_ids, kind="stable")
+        forward_ids, self._forward_skills = candidate_ids[order], skill_numbers[order].astype(np.int32)
+        self._forward_ids, starts = np.unique(forward_ids, return_index=True)
+        self._forward_offsets = np.append(starts, len(forward_ids)).astype(np.int64)
+        self._changed = {}
+        self.version += 1
+
+    def _store(self, number: int, ids: np.ndarray) -> None:
+        """Keep a skill's sorted ids in the smaller container (lock held)."""
+        if len(ids) >= self.words:
+            self.bitmaps[number] = ids_to_bitmap(ids, self.words)
+            self.arrays.pop(number, None)
+        else:
+            self.arrays[number] = ids
+            self.bitmaps.pop(number, None)
+
+    def _grow(self, candidate_id: int) -> None:
+        """Widen every bitmap so the id fits, with headroom for the ids that follow (lock held)."""
+        needed = candidate_id // 64 + 1
+        if needed <= self.words:
+            return
+        words = max(needed, self.words + self.words // 4 + 16)
+        padding = np.zeros(words - self.words, dtype=np.uint64)
+        self.universe = np.concatenate([self.universe, padding])
+        for number, bitmap in self.bitmaps.items():
+            self.bitmaps[number] = np.concatenate([bitmap, padding])
+
+    def _current_skills(self, candidate_id: int) -> Set[int]:
+        """Skill numbers a candidate is indexed under (lock held)."""
+        if candidate_id in self._changed:
+            return self._changed[candidate_id]
+        position = int(np.searchsorted(self._forward_ids, candidate_id))
+        if position < len(self._forward_ids) and self._forward_ids[position] == candidate_id:
+            start, end = self._forward_offsets[position], self._forward_offsets[position + 1]
+            return set(self._forward_skills[start:end].tolist())
+        return set()
+
+    def _set_bit(self, number: int, candidate_id: int, value: bool) -> None:
+        """Add a candidate to or drop it from one skill's container (lock held)."""
+        if number in self.bitmaps:
+            word, mask = candidate_id >> 6, np.uint64(1) << np.uint64(candidate_id & 63)
+            if value:
+                self.bitmaps[number][word] |= mask
+            else:
+                self.bitmaps[number][word] &= ~mask
+            return
+        ids = self.arrays[number]
+        position = int(np.searchsorted(ids, candidate_id))
+        present = position < len(ids) and ids[position] == candidate_id
+        if value and not present:
+            self.arrays[number] = np.insert(ids, position, candidate_id)
+        elif not value and present:
+            self.arrays[number] = np.delete(ids, position)
+
+    def _in_universe(self, candidate_id: int) -> bool:
+        word = candidate_id >> 6
+        return word < self.words and bool(self.universe[word] >> np.uint64(candidate_id & 63) & np.uint64(1))
+
+    def _update(self, candidate_id: int, skills: Set[str]) -> None:
+        """Index a candidate under exactly these skills (lock held)."""
+        self._grow(candidate_id)
+        old = self._current_skills(candidate_id)
+        new = {self._number(skill) for skill in skills}
+        for number in old - new:
+            self._set_bit(number, candidate_id, False)
+        for number in new - old:
+            self._set_bit(number, candidate_id, True)
+        if not self._in_universe(candidate_id):
+            self.universe[candidate_id >> 6] |= np.uint64(1) << np.uint64(candidate_id & 63)
+            self.count += 1
+        self._changed[candidate_id] = new
+        self.version += 1
+
+    def upsert(self, candidate_id: int, skills_value: str) -> None:
+        """Insert or refresh one candidate's skills."""
+        with self._lock:
+            self._update(int(candidate_id), split_skills(skills_value))
+
+    def remove(self, candidate_id: int) -> None:
+        """Drop one candidate from every posting."""
+        candidate_id = int(candidate_id)
+        with self._lock:
+            if not self._in_universe(candidate_id):
+                return
+            for number in self._current_skills(candidate_id):
+                self._set_bit(number, candidate_id, False)
+            self.universe[candidate_id >> 6] &= ~(np.uint64(1) << np.uint64(candidate_id & 63))
+            self.count -= 1
+            self._changed[candidate_id] = set()
+            self.version += 1
+
+    def load(self) -> "SkillIndex":
+        """Index every candidate's skills with a single query."""
+        synced_at = timezone.now()
+        rows = list(Candidate.objects.values_list("id", "skills"))
+        with self._lock:
+            self._build(rows)
+            self.synced_at = synced_at
+            self.loaded_at = time.monotonic()
+        return self
+
+    def sync(self) -> int:
+        """
+        Catch up with candidates saved since synced_at and return how many were applied
+        (every candidate when it had to load from scratch).
+        Deletions by other processes leave no row behind, so a count that still differs
+        from the table's afterwards means a full reload.
+        """
+        if self.synced_at is None:
+            self.load()
+            return self.count
+        started = timezone.now()
+        # Overlap the previous sync a little so commits racing with it are not missed
+        since = self.synced_at - timedelta(seconds=1)
+        rows = list(Candidate.objects.filter(updated_at__gte=since).values_list("id", "skills"))
+        with self._lock:
+            for candidate_id, value in rows:
+                self._update(candidate_id, split_skills(value))
+            self.synced_at = started
+            self.loaded_at = time.monotonic()
+        if self.count != Candidate.objects.count():
+            print("Skill index lost track of deleted candidates, reloading")
+            self.load()
+            return self.count
+        return len(rows)
+
+    def save(self, path: str) -> None:
+        """Write the postings, replacing the file atomically."""
+        with self._lock:
+            ids = [self._ids(number) for number in range(len(self.names))]
+            data = {
+                "names": np.array(self.names, dtype=str),
+                "offsets": np.cumsum([0] + [len(skill_ids) for skill_ids in ids]).astype(np.int64),
+                "ids": np.concatenate(ids).astype(np.int64) if ids else np.empty(0, dtype=np.int64),
+                "universe": bitmap_to_ids(self.universe),
+                "synced_at": np.array(self.synced_at.timestamp() if self.synced_at else 0.0),
+            }
+        with atomic_write(path) as postings_file:
+            np.savez(postings_file, **data)
+
+    def read(self, path: str) -> "SkillIndex":
+        """Load postings saved by save(); loaded_at stays None until sync() catches up with the database."""
+        with np.load(path) as data:
+            names = data["names"].tolist()
+            offsets, ids = data["offsets"], data["ids"]
+            universe = data["universe"]
+            synced_at = float(data["synced_at"])
+        with self._lock:
+            self.skills = {name: number for number, name in enumerate(names)}
+            self.names = names
+            skill_numbers = np.repeat(np.arange(len(names)), np.diff(offsets))
+            self._set_postings(universe, ids, skill_numbers)
+            self.synced_at = datetime.fromtimestamp(synced_at, dt_timezone.utc)
+        return self
+
+    def _ids(self, number: int) -> np.ndarray:
+        """Sorted ids of one skill's candidates (lock held)."""
+        if number in self.bitmaps:
+            return bitmap_to_ids(self.bitmaps[number])
+        return self.arrays[number]
+
+    def _bitmap(self, number: int) -> np.ndarray:
+        """One skill's candidates as a bitmap (lock held)."""
+        if number in self.bitmaps:
+            return self.bitmaps[number]
+        return ids_to_bitmap(self.arrays[number], self.words)
+
+    def _evaluate(self, node: Any) -> np.ndarray:
+        """Bitmap of a query syntax tree (lock held)."""
+        kind = node[0]
+        if kind == "skill":
+            number = self.skills.get(node[1])
+            return np.zeros(self.words, dtype=np.uint64) if number is None else self._bitmap(number)
+        if kind == "not":
+            return self.universe & ~self._evaluate(node[1])
+        if kind == "and" and node[2][0] == "not":
+            # a AND NOT b without materializing NOT b
+            return self._evaluate(node[1]) & ~self._evaluate(node[2][1])
+        left, right = self._evaluate(node[1]), self._evaluate(node[2])
+        return left & right if kind == "and" else left | right
+
+    def match(self, query: str) -> np.ndarray:
+        """Bitmap of the candidates matching a skill query."""
+        tree = parse_skill_query(query)
+        with self._lock:
+            bitmap = self._evaluate(tree)
+            # A single frequent skill evaluates to the stored bitmap itself
+            return bitmap.copy() if tree[0] == "skill" else bitmap
+
+    def filter_ids(self, query: str) -> np.ndarray:
+        """Sorted ids of the candidates matching a skill query."""
+        return bitmap_to_ids(self.match(query))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "candidates": self.count,
+                "skills": len(self.names),
+                "bitmaps": len(self.bitmaps),
+                "bitmap_bytes": sum(bitmap.nbytes for bitmap in self.bitmaps.values()) + self.universe.nbytes,
+                "array_bytes": sum(ids.nbytes for ids in self.arrays.values()),
+            }
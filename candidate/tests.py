@@ -1,3 +1,1861 @@
-from django.test import TestCase
+import hashlib
+import io
+import itertools
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+import docx
+import faiss
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from . import embedding_utils, index_snapshots, llm_providers, profile_embeddings, vector_index
+from .attribute_store import AttributeStore
+from .bm25_index import BM25Index, tokenize
+from .checks import check_ranking_cache
+from .embedding_cache import EmbeddingCache, embedding_key
+from .embedding_executor import EmbeddingError, EmbeddingExecutor, TokenBucket
+from .index_registry import IndexRegistry
+from .lexical_embedder import LexicalEmbedder
+from .llm_providers import GeminiProvider, LexicalProvider, OfflineProvider, get_provider
+from .search_cache import SearchResultCache, normalize_query, search_key
+from .models import Candidate, CandidateEmbeddingState, Education, ParsedJobDescription, Project, ResumeJob
+from .profile_embeddings import ASPECTS, ProfileEmbeddingManager, get_embedding_manager, search_candidates_page
+from .reembed_queue import ReembedQueue
+from .resume_jobs import claim_next_job, create_resume_job, requeue_stale_jobs, run_resume_job
+from .resume_parser import ResumeData
+from .skill_index import SkillIndex, parse_skill_query, split_skills
+from .vector_backends import NumpyIndex, backend_of_file, get_backend
 
-# Create your tests here.
+def fake_embedding(text: str) -> list:
+    """Deterministic stand-in for a Gemini embedding: a random vector seeded by the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(1536).tolist()
+
+def fake_embeddings(texts: list) -> list:
+    return [fake_embedding(text) for text in texts]
+
+def gemini_client(test) -> mock.Mock:
+    """Serve the Gemini provider from a mock client for the rest of the test."""
+    provider = GeminiProvider()
+    provider._client = mock.Mock()
+    patcher = mock.patch.dict(llm_providers._instances, {"gemini": provider}, clear=True)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    return provider._client
+
+def stored_vectors(index, ids) -> np.ndarray:
+    """Vectors an id-mapped aspect index holds for these candidate ids."""
+    return np.stack([index.reconstruct(int(candidate_id)) for candidate_id in ids])
+
+def unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+class AspectIndexTests(TestCase):
+    """ProfileEmbeddingManager in a temporary directory, with the Gemini calls replaced by fake_embedding."""
+
+    query_sections = {aspect: f"{aspect} requirements: python, django, remote" for aspect in ASPECTS}
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory)
+        for target, options in [
+            ("candidate.profile_embeddings.get_embeddings", {"side_effect": fake_embeddings}),
+            ("candidate.profile_embeddings.parse_job_description", {"return_value": self.query_sections}),
+            ("candidate.profile_embeddings._keyword_index", {"new": None}),
+            ("candidate.profile_embeddings._skill_index", {"new": None}),
+            ("candidate.profile_embeddings._skill_writer", {"new": None}),
+            # Saves would re-embed on a background thread; refresh_profile_embeddings is called directly instead
+            ("candidate.profile_embeddings.enqueue_profile_refresh", {}),
+        ]:
+            patcher = mock.patch(target, **options)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        profile_embeddings.result_cache.clear()
+        # Flush what is still pending before leaving the directory, not at exit in the working tree
+        self.managers = []
+        self.addCleanup(lambda: [manager.snapshot_writer.flush() for manager in self.managers])
+        self.addCleanup(lambda: profile_embeddings._skill_writer and profile_embeddings._skill_writer.flush())
+
+    def manager(self, **kwargs) -> ProfileEmbeddingManager:
+        manager = ProfileEmbeddingManager(**kwargs)
+        # Rankings here are dense only; BM25 fusion has its own tests
+        manager.index_config = dict(manager.index_config, HYBRID_SEARCH=False)
+        self.managers.append(manager)
+        return manager
+
+    def create_candidate(self, number: int) -> Candidate:
+        user = get_user_model().objects.create_user(username=f"user{number}", email=f"user{number}@example.com")
+        return Candidate.objects.create(
+            user=user, name=f"Candidate {number}", email=user.email,
+            skills=f"Python, skill{number}", current_job_title=f"Engineer {number}", experience=number
+        )
+
+    def expected_score(self, manager: ProfileEmbeddingManager, candidate: Candidate) -> float:
+        texts = manager._prepare_profile_text(candidate)
+        return sum(
+            manager.weights[aspect] * float(unit(fake_embedding(texts[aspect])) @ unit(fake_embedding(self.query_sections[aspect])))
+            for aspect in ASPECTS
+        )
+
+    def test_each_aspect_index_holds_one_row_per_candidate(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(4)]
+        for candidate in candidates:
+            manager.add_to_index(candidate)
+        ids = [candidate.id for candidate in candidates]
+        self.assertEqual(manager.ntotal, 4)
+        self.assertEqual(manager.candidate_ids.tolist(), ids)
+        for aspect in ASPECTS:
+            self.assertEqual(manager.delta[aspect].ntotal, 4)
+
+        # Compacted into the base segment, saved per aspect and read back by the next manager
+        manager.compact()
+        for aspect in ASPECTS:
+            self.assertEqual(manager.indexes[aspect].ntotal, 4)
+            self.assertEqual(manager.delta[aspect].ntotal, 0)
+        reloaded = self.manager()
+        self.assertEqual(reloaded.candidate_ids.tolist(), ids)
+        for aspect in ASPECTS:
+            np.testing.assert_array_equal(
+                stored_vectors(reloaded.indexes[aspect], ids), stored_vectors(manager.indexes[aspect], ids)
+            )
+
+    def test_batch_packs_every_candidate_into_one_request(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(3)]
+        profile_embeddings.get_embeddings.reset_mock()
+        batch = manager.generate_embeddings_batch(candidates)
+        profile_embeddings.get_embeddings.assert_called_once()
+        self.assertEqual(len(profile_embeddings.get_embeddings.call_args.args[0]), 3 * len(ASPECTS))
+        for candidate, embeddings in zip(candidates, batch):
+            texts = manager._prepare_profile_text(candidate)
+            for aspect in ASPECTS:
+                self.assertEqual(embeddings[f"{aspect}_embedding"], fake_embedding(texts[aspect]))
+
+    def test_upsert_replaces_and_delete_removes_vectors(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(3)]
+        for candidate in candidates:
+            manager.add_to_index(candidate)
+
+        # Re-adding an edited candidate replaces its rows instead of adding more
+        edited = candidates[1]
+        edited.skills = "Rust, WebAssembly"
+        edited.save()
+        manager.add_to_index(edited)
+        self.assertEqual(manager.ntotal, 3)
+        skills = unit(fake_embedding(manager._prepare_profile_text(edited)["skills"]))
+        for aspect in ASPECTS:
+            self.assertEqual(manager.delta[aspect].ntotal, 3)
+        np.testing.assert_allclose(stored_vectors(manager.delta["skills"], [edited.id])[0], skills, rtol=1e-5)
+
+        # The post_delete receiver drops a deleted candidate's rows from every aspect index once
+        # the delete commits, and leaves them alone when it is rolled back
+        with mock.patch.object(profile_embeddings, "get_embedding_manager", return_value=manager):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    post_delete.send(sender=Candidate, instance=candidates[0])
+                    raise RuntimeError("rolled back")
+            self.assertEqual(callbacks, [])
+            self.assertEqual(manager.ntotal, 3)
+            with self.captureOnCommitCallbacks(execute=True):
+                post_delete.send(sender=Candidate, instance=candidates[0])
+        self.assertEqual(manager.candidate_ids.tolist(), [candidates[1].id, candidates[2].id])
+        for aspect in ASPECTS:
+            self.assertEqual(manager.delta[aspect].ntotal, 2)
+        results = manager.search_similar_profiles("Python developer", k=10)
+        self.assertEqual(sorted(result["email"] for result in results), sorted([candidates[1].email, candidates[2].email]))
+        manager.compact()
+        self.assertEqual(self.manager().candidate_ids.tolist(), [candidates[1].id, candidates[2].id])
+
+    def test_search_ranks_by_weighted_exact_scores(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(6)]
+        for candidate in candidates:
+            manager.add_to_index(candidate)
+        expected = sorted(
+            ((self.expected_score(manager, candidate), candidate.user.email) for candidate in candidates), reverse=True
+        )
+        results = manager.search_similar_profiles("Python developer", k=len(candidates))
+        self.assertEqual([result["email"] for result in results], [email for _, email in expected])
+        for result, (score, _) in zip(results, expected):
+            self.assertAlmostEqual(result["total_similarity_score"], score, places=5)
+            self.assertAlmostEqual(sum(result["aspect_scores"].values()), score, places=5)
+        self.assertEqual(len(manager.search_similar_profiles("Python developer", k=2)), 2)
+
+    def test_top_results_are_hydrated_in_one_query(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(6)]
+        for candidate in candidates:
+            manager.add_to_index(candidate)
+        # Indexed but missing from the database: skipped, not fatal
+        gone = Candidate(id=candidates[-1].id + 100, name="Gone", email="gone@example.com", skills="Python")
+        manager.add_to_index(gone, embeddings=manager.generate_embeddings(gone))
+
+        with self.assertNumQueries(1):
+            results = manager.search_similar_profiles("Python developer", k=7)
+        self.assertEqual(sorted(result["candidate_id"] for result in results), sorted(candidate.id for candidate in candidates))
+        scores = [result["total_similarity_score"] for result in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_only_parsed_aspects_are_queried_and_scored(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(5)]
+        for candidate in candidates[:3]:
+            manager.add_to_index(candidate)
+        manager.compact()
+        for candidate in candidates[3:]:
+            manager.add_to_index(candidate)
+
+        # Hits from the base and the delta segment are merged before fusion
+        sections = {"skills": "Python and Django", "experience": "Five years of backend work"}
+        with mock.patch("candidate.profile_embeddings.parse_job_description", return_value=sections):
+            results = manager.search_similar_profiles("Backend developer", k=5)
+        expected = {}
+        for candidate in candidates:
+            texts = manager._prepare_profile_text(candidate)
+            expected[candidate.user.email] = {
+                aspect: manager.weights[aspect] * float(unit(fake_embedding(texts[aspect])) @ unit(fake_embedding(text)))
+                for aspect, text in sections.items()
+            }
+        ranked = sorted(expected, key=lambda email: sum(expected[email].values()), reverse=True)
+        self.assertEqual([result["email"] for result in results], ranked)
+        for result in results:
+            self.assertEqual(set(result["aspect_scores"]), set(sections))
+            for aspect, score in result["aspect_scores"].items():
+                self.assertAlmostEqual(score, expected[result["email"]][aspect], places=5)
+            self.assertEqual(result["aspect_queries"], sections)
+
+    def test_filters_restrict_results_in_scan_and_index_paths(self):
+        candidates = [self.create_candidate(number) for number in range(6)]
+        manager = self.manager()
+        for candidate in candidates[:4]:
+            manager.add_to_index(candidate)
+        manager.compact()
+        for candidate in candidates[4:]:
+            manager.add_to_index(candidate)
+
+        eligible = [candidate for candidate in candidates if candidate.experience >= 2]
+        expected = sorted(((self.expected_score(manager, candidate), candidate.id) for candidate in eligible), reverse=True)
+        for scan_threshold in [20000, 0]:
+            # 0 pushes the eligible ids into the index search instead of scoring them directly
+            manager.index_config = dict(manager.index_config, FILTER_SCAN_THRESHOLD=scan_threshold)
+            results = manager.search_similar_profiles("Python developer", k=10, filters={"experience__gte": 2})
+            self.assertEqual([result["candidate_id"] for result in results], [candidate_id for _, candidate_id in expected])
+            for result, (score, _) in zip(results, expected):
+                self.assertAlmostEqual(result["total_similarity_score"], score, places=5)
+
+        # Saved attribute changes reach the loaded columns through post_save
+        with mock.patch.object(profile_embeddings.index_registry, "_instance", manager):
+            candidates[0].preferred_locations = "Pune, Remote"
+            candidates[0].save()
+        results = manager.search_similar_profiles("Python developer", k=10, filters={"preferred_locations__in": ["remote"]})
+        self.assertEqual([result["candidate_id"] for result in results], [candidates[0].id])
+
+        for filters in [{"salary__gte": 1}, {"status": "unknown"}, {"experience__gte": "many"}, {"status__in": "new"}]:
+            with self.assertRaises(ValueError):
+                manager.search_similar_profiles("Python developer", k=10, filters=filters)
+        with self.assertRaises(ValueError):
+            manager.search_similar_profiles("Python developer", k=10, filters={"experience__gt": 99})
+
+    def test_repeated_searches_are_served_from_the_result_cache(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(4)]
+        for candidate in candidates[:3]:
+            manager.add_to_index(candidate)
+        parse = profile_embeddings.parse_job_description
+        first = manager.rank_profiles("Python developer", 10)
+        again = manager.rank_profiles("  python   DEVELOPER ", 10)
+        self.assertIs(again, first)
+        self.assertEqual(parse.call_count, 1)
+        manager.rank_profiles("Python developer", 10, filters={"experience__gte": 1})
+        self.assertEqual(parse.call_count, 2)
+
+        # Upserts, deletes and compactions all change the key
+        manager.add_to_index(candidates[3])
+        self.assertIn(candidates[3].id, manager.rank_profiles("Python developer", 10)["ids"].tolist())
+        manager.remove_from_index(candidates[0].id)
+        self.assertNotIn(candidates[0].id, manager.rank_profiles("Python developer", 10)["ids"].tolist())
+        manager.compact()
+        manager.rank_profiles("Python developer", 10)
+        self.assertEqual(parse.call_count, 5)
+
+    def test_only_unfiltered_dense_rankings_are_shared_across_processes(self):
+        manager = self.manager()
+        for candidate in [self.create_candidate(number) for number in range(3)]:
+            manager.add_to_index(candidate)
+        manager.compact()
+        cache = profile_embeddings.result_cache
+        with mock.patch.object(cache, "set", wraps=cache.set) as store:
+            manager.rank_profiles("Python developer", 10, mode="dense")
+            manager.rank_profiles("Python developer", 10, mode="dense", filters={"experience__gte": 1})
+            manager.rank_profiles("Python developer", 10, mode="hybrid")
+            manager.rank_profiles("skill1", 10, mode="lexical")
+        shared_keys = [call.args[2] for call in store.call_args_list]
+        self.assertIsNotNone(shared_keys[0])
+        self.assertEqual(shared_keys[1:], [None, None, None])
+
+    def test_skill_queries_filter_like_attribute_filters(self):
+        candidates = [self.create_candidate(number) for number in range(5)]
+        manager = self.manager()
+        for candidate in candidates:
+            manager.add_to_index(candidate)
+
+        def found(filters):
+            return sorted(manager.rank_profiles("Python developer", 10, filters=filters)["ids"].tolist())
+
+        self.assertEqual(found({"skills": "skill1 OR skill3"}), [candidates[1].id, candidates[3].id])
+        self.assertEqual(found({"skills": "python AND NOT skill4", "experience__gte": 2}), [candidates[2].id, candidates[3].id])
+        for filters in [{"skills": "python AND"}, {"skills": ["python"]}]:
+            with self.assertRaises(ValueError):
+                manager.rank_profiles("Python developer", 10, filters=filters)
+        with self.assertRaisesMessage(ValueError, "No matching profiles found"):
+            manager.rank_profiles("Python developer", 10, filters={"skills": "cobol"})
+
+        # Saved skills reach the loaded index through post_save, and the cached ranking is not reused
+        candidates[0].skills = "Python, Skill1"
+        candidates[0].save()
+        self.assertEqual(found({"skills": "skill1 OR skill3"}), [candidates[0].id, candidates[1].id, candidates[3].id])
+
+    def test_skill_index_read_from_disk_syncs_on_first_use(self):
+        first = self.create_candidate(0)
+        SkillIndex().load().save("candidate_skills.npz")
+        second = self.create_candidate(1)
+        # Early in a process's life monotonic() is still below ATTRIBUTE_REFRESH_INTERVAL
+        with mock.patch("candidate.profile_embeddings.time.monotonic", return_value=5.0):
+            skill_index = profile_embeddings.get_skill_index()
+        self.assertEqual(skill_index.loaded_at, 5.0)
+        self.assertEqual(skill_index.filter_ids("python").tolist(), [first.id, second.id])
+
+        # A failed save keeps the previous postings and leaves no temp file behind
+        with mock.patch("candidate.skill_index.np.savez", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                skill_index.save("candidate_skills.npz")
+        self.assertEqual(SkillIndex().read("candidate_skills.npz").filter_ids("python").tolist(), [first.id])
+        self.assertEqual([name for name in os.listdir() if name.startswith("candidate_skills")], ["candidate_skills.npz"])
+
+    def test_refresh_re_embeds_only_changed_aspects(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(2)]
+        for candidate in candidates:
+            manager.add_to_index(candidate)
+        embed = profile_embeddings.get_embeddings
+        embed.reset_mock()
+        with mock.patch.object(profile_embeddings.index_registry, "_instance", manager):
+            ids = [candidate.id for candidate in candidates]
+            self.assertEqual(profile_embeddings.refresh_profile_embeddings(ids), {"candidates": 0, "aspects": 0})
+            embed.assert_not_called()
+
+            # One edited aspect is one embedded text; the other aspects keep their stored vectors
+            before = manager.stored_embeddings(candidates[0].id)
+            Project.objects.create(candidate=candidates[0], title="Search", description="BM25 ranking", tech_stack="Python")
+            self.assertEqual(profile_embeddings.refresh_profile_embeddings(ids), {"candidates": 1, "aspects": 1})
+            texts = manager._prepare_profile_text(Candidate.objects.get(id=candidates[0].id))
+            self.assertEqual(embed.call_args.args[0], [texts["projects"]])
+            after = manager.stored_embeddings(candidates[0].id)
+            np.testing.assert_allclose(after["projects"], unit(fake_embedding(texts["projects"])), rtol=1e-5, atol=1e-6)
+            for aspect in ASPECTS:
+                if aspect != "projects":
+                    np.testing.assert_array_equal(after[aspect], before[aspect])
+
+            # Candidates embedded by another model are embedded in full, deleted ones are dropped
+            CandidateEmbeddingState.objects.filter(candidate_id=candidates[1].id).update(embedding_model="other")
+            gone = Candidate(id=candidates[-1].id + 100, name="Gone", email="gone@example.com", skills="Python")
+            manager.add_to_index(gone, embeddings=manager.generate_embeddings(gone))
+            self.assertEqual(
+                profile_embeddings.refresh_profile_embeddings([candidates[1].id, gone.id]),
+                {"candidates": 1, "aspects": len(ASPECTS)}
+            )
+            self.assertIsNone(manager.stored_embeddings(gone.id))
+
+    def test_profile_section_saves_queue_their_candidate(self):
+        enqueue = profile_embeddings.enqueue_profile_refresh
+        # Queued once the save commits, so the re-embedding reads the committed profile
+        with self.captureOnCommitCallbacks(execute=True):
+            candidate = self.create_candidate(1)
+            enqueue.assert_not_called()
+        enqueue.assert_called_with(candidate.id)
+        enqueue.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            project = Project.objects.create(candidate=candidate, title="Search", description="BM25", tech_stack="Python")
+            project.delete()
+        self.assertEqual(enqueue.call_args_list, [mock.call(candidate.id), mock.call(candidate.id)])
+        # Education is in no aspect text
+        enqueue.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            Education.objects.create(candidate=candidate, degree="BSc", institution="IIT").delete()
+        enqueue.assert_not_called()
+
+    def test_manager_switches_to_ann_index_at_threshold(self):
+        # IVF needs 39 training points for its single list
+        candidates = [self.create_candidate(number) for number in range(40)]
+        for ann_type in ["ivf", "hnsw"]:
+            with override_settings(EMBEDDING_INDEX={"TYPE": "auto", "ANN_TYPE": ann_type, "ANN_THRESHOLD": 4}):
+                manager = self.manager()
+                manager.reset_index()
+                for candidate in candidates[:3]:
+                    manager.add_to_index(candidate)
+                self.assertEqual(manager.index_type, "flat")
+                for candidate in candidates[3:]:
+                    manager.add_to_index(candidate)
+                manager.compact()
+                self.assertEqual(manager.index_type, ann_type)
+                self.assertEqual(self.manager().index_type, ann_type)
+
+                # An upsert on HNSW leaves a stale row behind, which search must not return
+                candidates[0].skills = "Haskell"
+                candidates[0].save()
+                manager.add_to_index(candidates[0])
+                results = manager.search_similar_profiles("Python developer", k=5, nprobe=4, ef_search=128)
+                expected = sorted(
+                    ((self.expected_score(manager, candidate), candidate.user.email) for candidate in candidates),
+                    reverse=True
+                )
+                self.assertEqual([result["email"] for result in results], [email for _, email in expected[:5]])
+
+    def test_compressed_storage_reranks_on_full_vectors(self):
+        candidates = [self.create_candidate(number) for number in range(6)]
+        config = {"TYPE": "flat", "STORAGE": "sq8", "COMPRESS_THRESHOLD": 4, "RERANK": True}
+        with override_settings(EMBEDDING_INDEX=config):
+            manager = self.manager()
+            for candidate in candidates:
+                manager.add_to_index(candidate)
+            manager.compact()
+            self.assertEqual(manager.storage, "sq8")
+            self.assertTrue(manager.reranking)
+
+            # Scores come from the float32 copies, not the quantized codes
+            results = manager.search_similar_profiles("Python developer", k=3)
+            expected = sorted(
+                ((self.expected_score(manager, candidate), candidate.user.email) for candidate in candidates), reverse=True
+            )[:3]
+            self.assertEqual([result["email"] for result in results], [email for _, email in expected])
+            for result, (score, _) in zip(results, expected):
+                self.assertAlmostEqual(result["total_similarity_score"], score, places=5)
+
+            reloaded = self.manager()
+            self.assertEqual(reloaded.storage, "sq8")
+            self.assertTrue(reloaded.reranking)
+            self.assertEqual(set(reloaded.full_indexes), set(ASPECTS))
+
+    def test_pq_below_its_training_minimum_stays_float32(self):
+        candidates = [self.create_candidate(number) for number in range(6)]
+        with override_settings(EMBEDDING_INDEX={"TYPE": "auto", "STORAGE": "pq", "COMPRESS_THRESHOLD": 4, "PQ_M": 2}):
+            manager = self.manager()
+            for candidate in candidates:
+                manager.add_to_index(candidate)
+            manager.compact()
+            self.assertEqual((manager.index_type, manager.storage), ("flat", "float32"))
+            self.assertEqual(len(manager.search_similar_profiles("Python developer", k=3)), 3)
+
+    def test_saved_indexes_are_memory_mapped_read_only(self):
+        candidates = [self.create_candidate(number) for number in range(4)]
+        writer = self.manager(mmap=False)
+        for candidate in candidates[:3]:
+            writer.add_to_index(candidate)
+        writer.compact()
+        self.assertFalse(writer.mapped)
+
+        mapped = self.manager()
+        self.assertTrue(mapped.mapped)
+        self.assertEqual(
+            mapped.search_similar_profiles("Python developer", k=3),
+            writer.search_similar_profiles("Python developer", k=3)
+        )
+
+        # A write goes to the delta; compaction publishes it and maps the new base again
+        mapped.add_to_index(candidates[3])
+        self.assertTrue(mapped.mapped)
+        self.assertEqual(mapped.ntotal, 4)
+        mapped.compact()
+        self.assertTrue(mapped.mapped)
+        self.assertEqual(self.manager().candidate_ids.tolist(), [candidate.id for candidate in candidates])
+        self.assertEqual([name for name in os.listdir() if ".tmp" in name], [])
+
+    def test_publish_bumps_generation_and_marks_other_managers_stale(self):
+        candidates = [self.create_candidate(number) for number in range(2)]
+        first, second = self.manager(), self.manager()
+        first.add_to_index(candidates[0])
+        self.assertEqual(first.generation, 0)
+        self.assertFalse(first.is_stale())
+        first.compact()
+        self.assertEqual(first.generation, 1)
+        self.assertFalse(first.is_stale())
+        self.assertTrue(second.is_stale())
+
+        # The stale manager reloads, then publishes on top of the other one's write
+        second = self.manager()
+        second.add_to_index(candidates[1])
+        second.compact()
+        self.assertEqual(second.generation, 2)
+        self.assertTrue(first.is_stale())
+        self.assertEqual(second.candidate_ids.tolist(), [candidate.id for candidate in candidates])
+
+    def test_compaction_folds_delta_into_newer_snapshot(self):
+        candidates = [self.create_candidate(number) for number in range(3)]
+        first = self.manager()
+        first.add_to_index(candidates[0])
+        first.compact()
+        second = self.manager()
+        first.add_to_index(candidates[1])
+        second.add_to_index(candidates[2])
+        first.compact()
+
+        # second loaded generation 1; its compaction reads generation 2 and keeps first's edit
+        second.compact()
+        self.assertEqual(second.generation, 3)
+        ids = [candidate.id for candidate in candidates]
+        self.assertEqual(second.candidate_ids.tolist(), ids)
+        self.assertEqual(self.manager().candidate_ids.tolist(), ids)
+
+    def test_manifest_names_one_generation_and_old_ones_are_removed(self):
+        manager = self.manager()
+        for number in range(4):
+            manager.add_to_index(self.create_candidate(number))
+            manager.compact()
+        manifest = index_snapshots.read_manifest("candidate_embeddings")
+        self.assertEqual(manifest["generation"], 4)
+        for name in list(manifest["indexes"].values()) + [manifest["ids"]]:
+            self.assertTrue(name.startswith("candidate_embeddings.g4_"), name)
+            self.assertTrue(os.path.exists(name))
+
+        # KEEP_GENERATIONS is 2 by default; no temp files survive a publish
+        generations = {int(match.group(1)) for match in map(re.compile(r"candidate_embeddings\.g(\d+)_").match, os.listdir()) if match}
+        self.assertEqual(generations, {3, 4})
+        self.assertEqual([name for name in os.listdir() if ".tmp" in name], [])
+
+    def test_tombstones_mask_base_rows_until_compaction(self):
+        candidates = [self.create_candidate(number) for number in range(5)]
+        manager = self.manager()
+        for candidate in candidates:
+            manager.add_to_index(candidate)
+        manager.compact()
+        before = {result["email"]: result["total_similarity_score"]
+                  for result in manager.search_similar_profiles("Python developer", k=5)}
+
+        # An update and a delete leave the base untouched and tombstone its rows
+        edited, deleted = candidates[1], candidates[3]
+        edited.skills = "Rust, WebAssembly"
+        edited.save()
+        manager.add_to_index(edited)
+        manager.remove_from_index(deleted.id)
+        self.assertEqual(manager.tombstones.tolist(), sorted([edited.id, deleted.id]))
+        self.assertEqual(manager.delta_ids.tolist(), [edited.id])
+        self.assertEqual(manager.indexes["skills"].ntotal, 5)
+        self.assertEqual(manager.ntotal, 4)
+
+        results = manager.search_similar_profiles("Python developer", k=5)
+        merged = {result["email"]: result["total_similarity_score"] for result in results}
+        self.assertEqual(sorted(merged), sorted(candidate.email for candidate in candidates if candidate != deleted))
+        self.assertAlmostEqual(merged[edited.email], self.expected_score(manager, edited), places=5)
+        for email, score in merged.items():
+            if email != edited.email:
+                self.assertAlmostEqual(score, before[email], places=5)
+
+        # Compaction drops the masked rows without changing any result
+        manager.compact()
+        self.assertEqual(len(manager.tombstones), 0)
+        self.assertEqual(len(manager.delta_ids), 0)
+        self.assertEqual(manager.indexes["skills"].ntotal, 4)
+        compacted = manager.search_similar_profiles("Python developer", k=5)
+        self.assertEqual([result["email"] for result in compacted], [result["email"] for result in results])
+        for result, expected in zip(compacted, results):
+            self.assertAlmostEqual(result["total_similarity_score"], expected["total_similarity_score"], places=5)
+
+    def test_numpy_backend_serves_and_compacts_the_same_results(self):
+        candidates = [self.create_candidate(number) for number in range(5)]
+        with override_settings(EMBEDDING_INDEX={"BACKEND": "numpy"}):
+            manager = self.manager()
+            for candidate in candidates[:4]:
+                manager.add_to_index(candidate)
+            manager.compact()
+            self.assertIsInstance(manager.indexes["skills"], NumpyIndex)
+            manager.add_to_index(candidates[4])
+            manager.remove_from_index(candidates[0].id)
+            results = manager.search_similar_profiles("Python developer", k=5)
+            manager.compact()
+
+            reloaded = self.manager()
+            self.assertTrue(reloaded.indexes["skills"].mapped)
+            self.assertEqual(reloaded.candidate_ids.tolist(), [candidate.id for candidate in candidates[1:]])
+            reloaded_results = reloaded.search_similar_profiles("Python developer", k=5)
+        expected = sorted(
+            ((self.expected_score(manager, candidate), candidate.user.email) for candidate in candidates[1:]), reverse=True
+        )
+        for found in (results, reloaded_results):
+            self.assertEqual([result["email"] for result in found], [email for _, email in expected])
+            for result, (score, _) in zip(found, expected):
+                self.assertAlmostEqual(result["total_similarity_score"], score, places=5)
+
+    def test_lexical_mode_ranks_by_bm25_alone(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(4)]
+        for candidate in candidates:
+            manager.add_to_index(candidate)
+        profile_embeddings.get_embeddings.reset_mock()
+        ranking = manager.rank_profiles("Skill2", 10, mode="lexical")
+        self.assertEqual(ranking["ids"].tolist(), [candidates[2].id])
+        self.assertEqual(ranking["mode"], "lexical")
+        self.assertGreater(ranking["lexical_scores"][0], 0)
+        # BM25 scores are unbounded, so they are reported apart from similarities
+        self.assertIsNone(ranking["total_scores"])
+        (result,) = manager.hydrate_results(ranking)
+        self.assertIsNone(result["total_similarity_score"])
+        self.assertAlmostEqual(result["keyword_score"], float(ranking["lexical_scores"][0]), places=5)
+        self.assertEqual(result["mode"], "lexical")
+        profile_embeddings.parse_job_description.assert_not_called()
+        profile_embeddings.get_embeddings.assert_not_called()
+        with self.assertRaisesMessage(ValueError, "No matching profiles found"):
+            manager.rank_profiles("cobol", 10, mode="lexical")
+
+        # Deleted candidates drop out of the keyword results with their vectors
+        manager.remove_from_index(candidates[2].id)
+        profile_embeddings.remove_profile_keywords(candidates[2].id)
+        with self.assertRaises(ValueError):
+            manager.rank_profiles("skill2", 10, mode="lexical")
+
+    def test_hybrid_mode_fuses_dense_and_bm25_ranks(self):
+        manager = self.manager()
+        candidates = [self.create_candidate(number) for number in range(6)]
+        for candidate in candidates:
+            manager.add_to_index(candidate)
+        query = "skill4 skill1"
+        dense = manager.rank_profiles(query, 10, mode="dense")
+        hybrid = manager.rank_profiles(query, 10, mode="hybrid")
+        keyword_ids, keyword_scores = profile_embeddings.get_keyword_index().search(query, 10)
+        self.assertEqual(sorted(keyword_ids.tolist()), [candidates[1].id, candidates[4].id])
+
+        rrf_k = manager.index_config["RRF_K"]
+        fused = {candidate_id: 1 / (rrf_k + 1 + rank) for rank, candidate_id in enumerate(dense["ids"].tolist())}
+        for rank, candidate_id in enumerate(keyword_ids.tolist()):
+            fused[candidate_id] += 1 / (rrf_k + 1 + rank)
+        self.assertEqual(hybrid["mode"], "hybrid")
+        self.assertEqual(sorted(hybrid["ids"].tolist()), sorted(fused))
+        ordered = [fused[candidate_id] for candidate_id in hybrid["ids"].tolist()]
+        self.assertEqual(ordered, sorted(ordered, reverse=True))
+        # Totals stay the dense similarities, BM25 scores are reported apart
+        dense_scores = dict(zip(dense["ids"].tolist(), dense["total_scores"].tolist()))
+        for candidate_id, total, lexical in zip(hybrid["ids"].tolist(), hybrid["total_scores"].tolist(),
+                                                hybrid["lexical_scores"].tolist()):
+            self.assertAlmostEqual(total, dense_scores[candidate_id], places=5)
+            expected = dict(zip(keyword_ids.tolist(), keyword_scores.tolist())).get(candidate_id, 0.0)
+            self.assertAlmostEqual(lexical, expected, places=5)
+
+    def test_default_mode_is_hybrid_or_dense_and_lexical_is_opt_in(self):
+        manager = self.manager()
+        manager.index_config["HYBRID_SEARCH"] = True
+        self.assertEqual(manager._default_mode("Kafka, Terraform"), "hybrid")
+        self.assertEqual(manager._default_mode("Senior backend engineer with Kafka and Terraform"), "hybrid")
+        manager.index_config["HYBRID_SEARCH"] = False
+        self.assertEqual(manager._default_mode("Kafka, Terraform"), "dense")
+        with self.assertRaisesMessage(ValueError, "Unknown search mode"):
+            manager.rank_profiles("Kafka", 10, mode="fuzzy")
+
+    def test_legacy_index_is_split_per_aspect(self):
+        # The old layout: one shared index with the five aspect rows of each candidate in turn, keyed by email
+        candidates = [self.create_candidate(number) for number in range(3)]
+        vectors = np.random.default_rng(0).standard_normal((3 * len(ASPECTS), 1536)).astype(np.float32)
+        legacy = faiss.IndexFlatIP(1536)
+        legacy.add(vectors)
+        faiss.write_index(legacy, "candidate_embeddings.index")
+        emails = [f"user{row // len(ASPECTS)}@example.com" for row in range(len(vectors))]
+        np.save("candidate_embeddings_emails.npy", np.array(emails))
+
+        manager = self.manager()
+        ids = [candidate.id for candidate in candidates]
+        self.assertEqual(manager.candidate_ids.tolist(), ids)
+        for position, aspect in enumerate(ASPECTS):
+            np.testing.assert_array_equal(stored_vectors(manager.indexes[aspect], ids), vectors[position::len(ASPECTS)])
+
+class SearchCursorTests(TestCase):
+    """Paging through search_candidates_page with the live manager of a temporary directory."""
+
+    query = "Backend engineer with Python"
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory)
+        patcher = mock.patch("candidate.profile_embeddings.get_embeddings", side_effect=fake_embeddings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            "candidate.profile_embeddings.parse_job_description",
+            side_effect=lambda text: {aspect: f"{aspect}: {text}" for aspect in ASPECTS}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(profile_embeddings.index_registry.reset)
+        self.addCleanup(lambda: get_embedding_manager().snapshot_writer.flush())
+        for name, value in [("_keyword_index", None), ("enqueue_profile_refresh", mock.Mock())]:
+            patcher = mock.patch.object(profile_embeddings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        profile_embeddings.index_registry.reset()
+        profile_embeddings.ranking_cache.cache.clear()
+        profile_embeddings.result_cache.clear()
+
+        manager = get_embedding_manager()
+        for number in range(7):
+            user = get_user_model().objects.create_user(username=f"user{number}", email=f"user{number}@example.com")
+            manager.add_to_index(Candidate.objects.create(
+                user=user, name=f"Candidate {number}", email=user.email, skills=f"Python, skill{number}"
+            ))
+        self.ranked_ids = manager.rank_profiles(self.query, 50)["ids"].tolist()
+
+    def page_ids(self, page) -> list:
+        return [result["candidate_id"] for result in page["results"]]
+
+    def test_cursor_returns_the_next_page_of_the_ranking(self):
+        first = search_candidates_page(self.query, 3)
+        self.assertEqual((first["offset"], first["total"], first["query"]), (0, 7, self.query))
+        self.assertEqual(self.page_ids(first), self.ranked_ids[:3])
+
+        # Later pages come from the cached ranking: no parsing, embedding or search
+        with mock.patch.object(ProfileEmbeddingManager, "rank_profiles") as rank_profiles, self.assertNumQueries(1):
+            second = search_candidates_page(cursor=first["next_cursor"], k=3)
+        rank_profiles.assert_not_called()
+        self.assertEqual((second["offset"], second["query"]), (3, self.query))
+        self.assertEqual(self.page_ids(second), self.ranked_ids[3:6])
+
+        last = search_candidates_page(cursor=second["next_cursor"], k=3)
+        self.assertEqual(self.page_ids(last), self.ranked_ids[6:])
+        self.assertIsNone(last["next_cursor"])
+
+    def test_invalid_or_expired_cursor_is_rejected(self):
+        cursor = search_candidates_page(self.query, 2)["next_cursor"]
+        tampered = cursor[:-2] + ("A" if cursor[-2] != "A" else "B") + cursor[-1]
+        for bad_cursor in ["not-a-cursor", tampered]:
+            with self.subTest(cursor=bad_cursor):
+                with self.assertRaisesMessage(ValueError, "Invalid search cursor"):
+                    search_candidates_page(cursor=bad_cursor, k=2)
+        profile_embeddings.ranking_cache.cache.clear()
+        with self.assertRaisesMessage(ValueError, "expired"):
+            search_candidates_page(cursor=cursor, k=2)
+        with self.assertRaises(ValueError):
+            search_candidates_page(self.query, 0)
+
+class RankingCacheCheckTests(SimpleTestCase):
+    """The candidate.E001/E002 system checks on the cache behind search cursors."""
+
+    def errors(self, backend, alias="rankings"):
+        with override_settings(CACHES={"rankings": {"BACKEND": backend, "LOCATION": "rankings"}},
+                               EMBEDDING_INDEX={"RANKING_CACHE": alias}):
+            return [error.id for error in check_ranking_cache(None)]
+
+    def test_process_local_and_missing_aliases_are_errors(self):
+        self.assertEqual(self.errors("django.core.cache.backends.locmem.LocMemCache"), ["candidate.E002"])
+        self.assertEqual(self.errors("django.core.cache.backends.dummy.DummyCache"), ["candidate.E002"])
+        self.assertEqual(self.errors("django.core.cache.backends.locmem.LocMemCache", alias="other"), ["candidate.E001"])
+        self.assertEqual(self.errors("django.core.cache.backends.filebased.FileBasedCache"), [])
+        self.assertEqual(self.errors("django.core.cache.backends.redis.RedisCache"), [])
+
+class SearchViewTests(TestCase):
+    """Request validation of the search endpoint, with the search itself mocked."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username="recruiter"))
+        patcher = mock.patch("candidate.embedding_views.search_candidates_page", return_value={
+            "query": "python", "results": [], "offset": 0, "total": 0, "next_cursor": None, "mode": "dense"
+        })
+        self.search = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body):
+        return self.client.post("/api/embeddings/search/", body, format="json")
+
+    def test_invalid_numbers_are_rejected_with_400(self):
+        for body in [{"k": [5]}, {"k": "many"}, {"nprobe": [1, 2]}, {"nprobe": {"n": 1}}, {"nprobe": 0},
+                     {"ef_search": -3}, {"ef_search": "deep"}, {"filters": ["remote"]}]:
+            with self.subTest(body=body):
+                self.assertEqual(self.post(dict(body, q="python")).status_code, 400)
+        self.search.assert_not_called()
+
+    def test_valid_parameters_reach_the_search(self):
+        response = self.post({"q": "python", "k": "5", "nprobe": "4", "ef_search": 64})
+        self.assertEqual(response.status_code, 200)
+        self.search.assert_called_once_with("python", 5, nprobe=4, ef_search=64, filters=None, cursor=None, mode=None)
+
+class SearchResultCacheTests(SimpleTestCase):
+    """The two-tier search result cache with a controlled clock."""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("candidate.search_cache.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_keys_fold_case_and_whitespace_only(self):
+        self.assertEqual(normalize_query("  Senior\tPython   Engineer "), "senior python engineer")
+        self.assertEqual(search_key("Python  Engineer", depth=10), search_key("python engineer", depth=10))
+        self.assertNotEqual(search_key("python engineer", depth=10), search_key("python engineer", depth=20))
+        self.assertNotEqual(search_key("python engineer"), search_key("python engineers"))
+
+    def test_local_tier_evicts_least_recently_used_and_expires(self):
+        cache = SearchResultCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.now += 61
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats(), {"entries": 1, "hits": 3, "misses": 2})
+
+    def test_shared_tier_fills_other_processes_local_tier(self):
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+        writer = SearchResultCache(ttl=60, alias="default")
+        reader = SearchResultCache(ttl=60, alias="default")
+        writer.set("local-a", {"ids": [1]}, shared_key="generation-1")
+        self.assertIsNone(reader.get("local-b"))
+        self.assertEqual(reader.get("local-b", shared_key="generation-1"), {"ids": [1]})
+        # Now held locally as well
+        caches["default"].clear()
+        self.assertEqual(reader.get("local-b"), {"ids": [1]})
+        self.assertIsNone(SearchResultCache(ttl=60).get("local-c", shared_key="generation-1"))
+
+class ParsedJobDescriptionCacheTests(TestCase):
+    """parse_job_description with the Gemini client replaced by a mock."""
+
+    response = """
+        Required Skills and Technologies
+        Python, Django
+        Experience Requirements
+        Five years
+        Location and Work Arrangement
+        Remote
+        """
+
+    def setUp(self):
+        embedding_utils._parsed_jd_cache.clear()
+        self.addCleanup(embedding_utils._parsed_jd_cache.clear)
+        self.generate = gemini_client(self).models.generate_content
+        self.generate.return_value = mock.Mock(text=self.response)
+
+    def test_parse_is_stored_and_reused(self):
+        sections = embedding_utils.parse_job_description("Senior Django developer")
+        self.assertEqual(sections["skills"], "Python, Django")
+        self.assertEqual(sections["projects"], "No specific requirements mentioned")
+        self.assertEqual(embedding_utils.parse_job_description("  Senior Django developer\n"), sections)
+        self.assertEqual(self.generate.call_count, 1)
+
+        # Another process, with an empty in-memory tier, reads the row
+        embedding_utils._parsed_jd_cache.clear()
+        self.assertEqual(embedding_utils.parse_job_description("Senior Django developer"), sections)
+        self.assertEqual(self.generate.call_count, 1)
+        row = ParsedJobDescription.objects.get()
+        self.assertEqual(row.parser_version, embedding_utils.jd_parser_version())
+        self.assertEqual(row.content_hash, embedding_utils.jd_content_hash("Senior Django developer"))
+
+        # A new parser version does not match old rows
+        embedding_utils._parsed_jd_cache.clear()
+        with mock.patch.object(embedding_utils, "jd_parser_version", return_value="next"):
+            embedding_utils.parse_job_description("Senior Django developer")
+        self.assertEqual(self.generate.call_count, 2)
+
+    def test_failed_calls_are_not_cached(self):
+        self.generate.side_effect = RuntimeError("quota exceeded")
+        fallback = embedding_utils.parse_job_description("Data engineer")
+        self.assertEqual(set(fallback.values()), {"Data engineer"})
+        self.assertFalse(ParsedJobDescription.objects.exists())
+        self.generate.side_effect = None
+        self.assertEqual(embedding_utils.parse_job_description("Data engineer")["skills"], "Python, Django")
+        self.assertEqual(self.generate.call_count, 2)
+
+    def test_responses_without_sections_are_not_cached(self):
+        self.generate.return_value = mock.Mock(text="I cannot help with that request.")
+        embedding_utils.parse_job_description("Data engineer")
+        self.assertFalse(ParsedJobDescription.objects.exists())
+        embedding_utils.parse_job_description("Data engineer")
+        self.assertEqual(self.generate.call_count, 2)
+
+class EmbeddingCacheTests(SimpleTestCase):
+    """EmbeddingCache in a temporary SQLite file, and get_embedding in front of it."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, "embeddings.sqlite3")
+        self.now = 1000.0
+        patcher = mock.patch("candidate.embedding_cache.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def vector(self, value: float) -> np.ndarray:
+        return np.full(4, value, dtype=np.float32)
+
+    def test_vectors_round_trip_and_persist(self):
+        cache = EmbeddingCache(self.path)
+        keys = [embedding_key("model", 4, text) for text in ["a", "b", "c"]]
+        self.assertNotEqual(embedding_key("model", 4, "a"), embedding_key("other", 4, "a"))
+        cache.set_many({keys[0]: [0.5, 1, 2, 3], keys[1]: self.vector(7)})
+        found = cache.get_many(keys)
+        self.assertEqual(set(found), set(keys[:2]))
+        np.testing.assert_array_equal(found[keys[0]], [0.5, 1, 2, 3])
+        self.assertEqual(found[keys[0]].dtype, np.float32)
+        self.assertEqual((cache.hits, cache.misses, cache.writes), (2, 1, 2))
+
+        # Another process opening the same file sees the rows
+        other = EmbeddingCache(self.path)
+        np.testing.assert_array_equal(other.get(keys[1]), self.vector(7))
+        self.assertIsNone(other.get(keys[2]))
+        self.assertEqual(other.stats()["entries"], 2)
+        self.assertEqual(other.stats()["bytes"], 32)
+
+    def test_least_recently_used_rows_are_evicted_past_the_limit(self):
+        # Three 16-byte vectors fit in 48 bytes; eviction goes down to 90% of the limit
+        cache = EmbeddingCache(self.path, max_bytes=48)
+        for number in range(3):
+            self.now += 1
+            cache.set(f"key{number}".encode(), self.vector(number))
+        self.now += 1
+        cache.get(b"key0")
+        self.now += 1
+        cache.set(b"key3", self.vector(3))
+        self.assertEqual(cache.evictions, 2)
+        self.assertEqual(sorted(cache.get_many([b"key0", b"key1", b"key2", b"key3"])), [b"key0", b"key3"])
+        self.assertLessEqual(cache.size_bytes(), 48 * 0.9)
+
+    def test_rewritten_keys_do_not_grow_the_size(self):
+        cache = EmbeddingCache(self.path, max_bytes=48)
+        cache.set_many({b"key0": self.vector(0), b"key1": self.vector(1)})
+        # Writing the same keys again replaces their rows, so nothing is evicted
+        for _ in range(5):
+            cache.set_many({b"key0": self.vector(0), b"key1": self.vector(1), b"key2": self.vector(2)})
+        self.assertEqual(cache.evictions, 0)
+        self.assertEqual(cache._size, cache.size_bytes())
+        self.assertEqual(cache.size_bytes(), 48)
+
+    def test_get_embeddings_batches_new_texts_only(self):
+        client = gemini_client(self)
+        client.models.embed_content.side_effect = lambda model, contents: mock.Mock(
+            embeddings=[mock.Mock(values=[float(len(text))] * 8) for text in contents]
+        )
+        with mock.patch.object(embedding_utils, "_embedding_cache", None), \
+                override_settings(EMBEDDING_CACHE={"PATH": self.path}, EMBEDDING_BATCH_SIZE=2):
+            texts = ["a", "bb", "a", "ccc", "dddd", "bb"]
+            vectors = embedding_utils.get_embeddings(texts, dimension=8)
+            self.assertEqual([vector[0] for vector in vectors], [1, 2, 1, 3, 4, 2])
+            # Four distinct texts in batches of two
+            self.assertEqual([len(call.kwargs["contents"]) for call in client.models.embed_content.call_args_list], [2, 2])
+
+            vectors = embedding_utils.get_embeddings(["ccc", "eeeee", "a"], dimension=8)
+            self.assertEqual([vector[0] for vector in vectors], [3, 5, 1])
+            self.assertEqual(client.models.embed_content.call_args.kwargs["contents"], ["eeeee"])
+
+    def test_get_embedding_calls_the_api_once_per_text(self):
+        client = gemini_client(self)
+        client.models.embed_content.return_value = mock.Mock(embeddings=[mock.Mock(values=[0.25] * 8)])
+        with mock.patch.object(embedding_utils, "_embedding_cache", None), \
+                override_settings(EMBEDDING_CACHE={"PATH": self.path}):
+            self.assertEqual(embedding_utils.get_embedding("Python", dimension=8), [0.25] * 8)
+            self.assertEqual(embedding_utils.get_embedding("Python", dimension=8), [0.25] * 8)
+            self.assertEqual(client.models.embed_content.call_count, 1)
+
+            # Failed calls raise instead of handing out zero vectors, and nothing is cached
+            client.models.embed_content.side_effect = RuntimeError("invalid request")
+            with self.assertRaises(EmbeddingError):
+                embedding_utils.get_embedding("Django", dimension=8)
+            client.models.embed_content.side_effect = None
+            self.assertEqual(embedding_utils.get_embedding("Django", dimension=8), [0.25] * 8)
+            self.assertEqual(client.models.embed_content.call_count, 3)
+
+class OfflineProviderTests(TestCase):
+    """The offline LLM provider, and the JD parser and caches running on it."""
+
+    def setUp(self):
+        patcher = mock.patch.dict(llm_providers._instances, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        embedding_utils._parsed_jd_cache.clear()
+        self.addCleanup(embedding_utils._parsed_jd_cache.clear)
+
+    def test_embeddings_are_deterministic_unit_vectors(self):
+        provider = OfflineProvider()
+        first, second, other = provider.embed(["python", "python", "django"], 16, "model")
+        self.assertEqual(len(first), 16)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0, places=6)
+        self.assertNotEqual(provider.embed(["python"], 16, "other")[0], first)
+
+    def test_structured_output_fills_the_schema_with_valid_values(self):
+        provider = OfflineProvider()
+        resume = provider.generate_structured("resume text", ResumeData, "model")
+        self.assertIsInstance(resume, ResumeData)
+        self.assertEqual(resume, provider.generate_structured("resume text", ResumeData, "model"))
+        self.assertRegex(resume.personal_info.email, r"^\w+@example\.com$")
+        self.assertTrue(resume.personal_info.linkedin_url.startswith("https://"))
+        self.assertRegex(resume.education[0].start_date, r"^\d{4}-\d{2}$")
+        self.assertTrue(all(isinstance(skill, str) for skill in resume.technical_skills.technical_skills))
+
+    @override_settings(LLM_PROVIDER={"NAME": "offline"})
+    def test_selected_in_settings_and_keyed_apart_from_gemini(self):
+        self.assertIsInstance(get_provider(), OfflineProvider)
+        self.assertIs(get_provider(), get_provider())
+        self.assertEqual(get_provider().model_id("text-embedding-004"), "offline/text-embedding-004")
+        self.assertEqual(GeminiProvider().model_id("text-embedding-004"), "text-embedding-004")
+        # Its completions use the layout the job description parser reads
+        sections = embedding_utils.parse_job_description("Senior Django developer")
+        self.assertTrue(all(sections[aspect] != "No specific requirements mentioned" for aspect in ASPECTS))
+        self.assertTrue(all("Senior Django developer" not in value for value in sections.values()))
+
+    def test_unknown_provider_is_rejected(self):
+        with self.assertRaises(ValueError):
+            get_provider("nonexistent")
+
+class LexicalEmbedderTests(SimpleTestCase):
+    """LexicalEmbedder vectors and IDF weights, and the lexical provider serving them."""
+
+    texts = [
+        "Senior Python developer with Django and PostgreSQL",
+        "Python engineer, Django REST framework and Postgres",
+        "Registered nurse in a pediatric ward",
+    ]
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.idf_path = os.path.join(directory, "idf.npy")
+
+    def test_vectors_are_deterministic_and_normalized(self):
+        embedder = LexicalEmbedder(dimension=64, hash_bits=16)
+        vectors = embedder.embed(self.texts)
+        self.assertEqual(vectors.shape, (3, 64))
+        self.assertEqual(vectors.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+        np.testing.assert_array_equal(LexicalEmbedder(dimension=64, hash_bits=16).embed(self.texts), vectors)
+        # Texts of a batch never share features
+        for text, vector in zip(self.texts, vectors):
+            np.testing.assert_allclose(embedder.embed([text])[0], vector, rtol=1e-5, atol=1e-6)
+        self.assertFalse(embedder.embed([""]).any())
+
+    def test_texts_sharing_words_are_closer(self):
+        vectors = LexicalEmbedder(dimension=256).embed(self.texts)
+        self.assertGreater(vectors[0] @ vectors[1], vectors[0] @ vectors[2] + 0.2)
+        # Case and punctuation do not change the features
+        np.testing.assert_allclose(
+            LexicalEmbedder(dimension=256).embed(["PYTHON, django!"])[0],
+            LexicalEmbedder(dimension=256).embed(["python django"])[0], rtol=1e-5
+        )
+
+    def test_fitted_idf_down_weights_common_features(self):
+        embedder = LexicalEmbedder(hash_bits=16).fit([self.texts[:2], self.texts[2:]])
+        _, python, _ = embedder._term_frequencies(["python"])
+        _, nurse, _ = embedder._term_frequencies(["nurse"])
+        self.assertLess(embedder.idf[python].min(), embedder.idf[nurse].min())
+        # Smoothed: a feature no document has weighs log((1 + 3) / 1) + 1
+        self.assertAlmostEqual(float(embedder.idf.max()), float(np.log(4)) + 1, places=5)
+
+    def test_idf_round_trips_through_a_file(self):
+        embedder = LexicalEmbedder(hash_bits=16).fit([self.texts])
+        embedder.save_idf(self.idf_path)
+        loaded = LexicalEmbedder(hash_bits=16)
+        self.assertTrue(loaded.load_idf(self.idf_path))
+        np.testing.assert_array_equal(loaded.idf, embedder.idf)
+        self.assertFalse(LexicalEmbedder(hash_bits=12).load_idf(self.idf_path))
+        self.assertFalse(loaded.load_idf(self.idf_path + ".missing"))
+
+        # A failed save leaves the previous weights in place and no temp file behind
+        refitted = LexicalEmbedder(hash_bits=16).fit([self.texts[:1]])
+        with mock.patch("candidate.lexical_embedder.np.save", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                refitted.save_idf(self.idf_path)
+        self.assertTrue(loaded.load_idf(self.idf_path))
+        np.testing.assert_array_equal(loaded.idf, embedder.idf)
+        self.assertEqual(os.listdir(os.path.dirname(self.idf_path)), ["idf.npy"])
+
+    def test_provider_reloads_idf_saved_by_another_process(self):
+        provider, other = LexicalProvider(self.idf_path), LexicalProvider(self.idf_path)
+        before = provider.embed(self.texts[:1], 64, "model")
+        other.fit([self.texts])
+        other.save_fit()
+        after = provider.embed(self.texts[:1], 64, "model")
+        self.assertNotEqual(after, before)
+        self.assertEqual(after, other.embed(self.texts[:1], 64, "model"))
+
+    def test_local_embeddings_skip_the_cache_and_executor(self):
+        config = {"NAME": "offline", "EMBEDDING_NAME": "lexical", "LEXICAL_IDF_PATH": None}
+        with mock.patch.dict(llm_providers._instances, clear=True), override_settings(LLM_PROVIDER=config), \
+                mock.patch.object(embedding_utils, "get_embedding_cache") as cache, \
+                mock.patch.object(embedding_utils, "get_embedding_executor") as executor:
+            vectors = embedding_utils.get_embeddings(self.texts, dimension=32)
+            self.assertEqual(vectors, LexicalEmbedder(dimension=32).embed(self.texts).tolist())
+            cache.assert_not_called()
+            executor.assert_not_called()
+
+class ProviderError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+class EmbeddingExecutorTests(SimpleTestCase):
+    """TokenBucket and EmbeddingExecutor retries against a fake clock."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.sleeps = []
+        clock = mock.Mock(monotonic=lambda: self.now, sleep=self.sleep)
+        patcher = mock.patch("candidate.embedding_executor.time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def test_token_bucket_allows_a_burst_then_the_rate(self):
+        bucket = TokenBucket(rate=4, capacity=2)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual(self.sleeps, [])
+        bucket.acquire()
+        self.assertEqual(self.sleeps, [0.25])
+        # Idle time refills the bucket, never past its capacity
+        self.now += 10
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(self.sleeps, [0.25, 0.25])
+
+    def test_zero_rate_does_not_limit(self):
+        bucket = TokenBucket(rate=0)
+        for _ in range(100):
+            bucket.acquire()
+        self.assertEqual(self.sleeps, [])
+
+    def test_transient_errors_are_retried_with_backoff(self):
+        fn = mock.Mock(side_effect=[ProviderError(429), ConnectionError("reset"), ["vector"]])
+        executor = EmbeddingExecutor(max_workers=1, max_retries=3, backoff_base=1.0, backoff_max=30.0)
+        self.assertEqual(executor.call(fn, "text"), ["vector"])
+        self.assertEqual(fn.call_count, 3)
+        # Jittered between half and all of base * 2 ** attempt
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(0.5 <= self.sleeps[0] <= 1.0)
+        self.assertTrue(1.0 <= self.sleeps[1] <= 2.0)
+
+    def test_gives_up_after_max_retries(self):
+        fn = mock.Mock(side_effect=ProviderError(503))
+        executor = EmbeddingExecutor(max_workers=1, max_retries=2, backoff_base=10.0, backoff_max=15.0)
+        with self.assertRaises(EmbeddingError):
+            executor.call(fn)
+        self.assertEqual(fn.call_count, 3)
+        self.assertLessEqual(max(self.sleeps), 15.0)
+
+    def test_other_errors_fail_at_once(self):
+        fn = mock.Mock(side_effect=ProviderError(400))
+        executor = EmbeddingExecutor(max_workers=1, max_retries=5)
+        with self.assertRaises(EmbeddingError):
+            executor.call(fn)
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_every_attempt_takes_a_token(self):
+        limiter = mock.Mock()
+        fn = mock.Mock(side_effect=[ProviderError(500), "done"])
+        executor = EmbeddingExecutor(max_workers=2, rate_limiter=limiter, max_retries=1)
+        self.assertEqual(executor.submit(fn).result(), "done")
+        self.assertEqual(limiter.acquire.call_count, 2)
+
+class SkillQueryTests(SimpleTestCase):
+    """Boolean skill queries and the SkillIndex postings they evaluate."""
+
+    def test_parse(self):
+        cases = {
+            "python": ("skill", "python"),
+            "Python AND (django OR flask), NOT php": (
+                "and",
+                ("and", ("skill", "python"), ("or", ("skill", "django"), ("skill", "flask"))),
+                ("not", ("skill", "php")),
+            ),
+            '"machine learning" | golang': ("or", ("skill", "machine learning"), ("skill", "go")),
+            "machine learning & !java": ("and", ("skill", "machine learning"), ("not", ("skill", "java"))),
+            "React.js and node": ("and", ("skill", "react"), ("skill", "node.js")),
+            "a OR b AND c": ("or", ("skill", "a"), ("and", ("skill", "b"), ("skill", "c"))),
+        }
+        for query, tree in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(parse_skill_query(query), tree)
+
+    def test_parse_errors(self):
+        for query in ["", "   ", "python AND", "AND python", "(python", "python)", "NOT", '""', "python OR ()", 'python "c++']:
+            with self.subTest(query=query):
+                with self.assertRaises(ValueError):
+                    parse_skill_query(query)
+
+    def brute_force(self, tree, skills):
+        kind = tree[0]
+        if kind == "skill":
+            return tree[1] in skills
+        if kind == "not":
+            return not self.brute_force(tree[1], skills)
+        left, right = self.brute_force(tree[1], skills), self.brute_force(tree[2], skills)
+        return left and right if kind == "and" else left or right
+
+    def test_bitmaps_match_brute_force(self):
+        rng = np.random.default_rng(7)
+        common = ["python", "django", "java", "aws", "docker", "react", "typescript", "go"]
+        index = SkillIndex()
+        candidate_skills = {}
+        for candidate_id in rng.choice(np.arange(1, 3000), 500, replace=False).tolist():
+            skills = [skill for skill in common if rng.random() < 0.35]
+            if rng.random() < 0.02:
+                skills.append("cobol")  # Rare enough to stay an id array
+            index.upsert(candidate_id, ", ".join(skills))
+            candidate_skills[candidate_id] = split_skills(", ".join(skills))
+        for candidate_id in list(candidate_skills)[:40]:
+            index.remove(candidate_id)
+            del candidate_skills[candidate_id]
+        for candidate_id in list(candidate_skills)[40:80]:
+            index.upsert(candidate_id, "Golang, K8s")
+            candidate_skills[candidate_id] = {"go", "kubernetes"}
+
+        queries = [
+            "python", "cobol", "python AND django", "python OR go", "NOT python", "python AND NOT django",
+            "(python OR java) AND NOT (docker OR aws)", "NOT (react AND NOT typescript)", "kubernetes, go",
+            "cobol OR NOT (python AND java)", "unknown", "NOT unknown",
+        ]
+        path = os.path.join(tempfile.mkdtemp(), "skills.npz")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        index.save(path)
+        # Read back, frequent skills are stored as bitmaps and rare ones as id arrays
+        reloaded = SkillIndex().read(path)
+        self.assertGreater(reloaded.stats()["bitmaps"], 0)
+        self.assertGreater(reloaded.stats()["array_bytes"], 0)
+        for query in queries:
+            expected = sorted(
+                candidate_id for candidate_id, skills in candidate_skills.items()
+                if self.brute_force(parse_skill_query(query), skills)
+            )
+            for name, skill_index in [("updated", index), ("reloaded", reloaded)]:
+                with self.subTest(query=query, index=name):
+                    self.assertEqual(skill_index.filter_ids(query).tolist(), expected)
+
+class BM25Tests(SimpleTestCase):
+    """BM25Index scores against the textbook formula, before and after updates and merges."""
+
+    words = ["python", "django", "kafka", "aws", "react", "node.js", "c++", "c#", "spark", "terraform",
+             "backend", "frontend", "data", "platform", "payments", "search", "mobile", "docker"]
+    queries = ["python django", "kafka", "c++ c# backend", "node.js react frontend", "terraform aws docker spark",
+               "unknownterm", "python unknownterm"]
+
+    def documents(self, rng, ids):
+        return {
+            candidate_id: " ".join(rng.choice(self.words, int(rng.integers(3, 30))).tolist())
+            for candidate_id in ids
+        }
+
+    def reference(self, documents, query, k1=1.2, b=0.75):
+        """BM25 scores by the textbook formula, one document at a time."""
+        tokens = {candidate_id: tokenize(text) for candidate_id, text in documents.items()}
+        average_length = sum(len(terms) for terms in tokens.values()) / len(tokens)
+        scores = {}
+        for term in set(tokenize(query)):
+            document_frequency = sum(term in terms for terms in tokens.values())
+            if not document_frequency:
+                continue
+            idf = math.log(1 + (len(tokens) - document_frequency + 0.5) / (document_frequency + 0.5))
+            for candidate_id, terms in tokens.items():
+                frequency = terms.count(term)
+                if frequency:
+                    norm = k1 * (1 - b + b * len(terms) / average_length)
+                    scores[candidate_id] = scores.get(candidate_id, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+        return scores
+
+    def assertMatchesReference(self, index, documents, allowed_ids=None):
+        for query in self.queries:
+            with self.subTest(query=query):
+                expected = self.reference(documents, query)
+                if allowed_ids is not None:
+                    expected = {candidate_id: score for candidate_id, score in expected.items() if candidate_id in allowed_ids}
+                allowed = np.array(sorted(allowed_ids), dtype=np.int64) if allowed_ids is not None else None
+                ids, scores = index.search(query, len(documents), allowed)
+                self.assertEqual(sorted(ids.tolist()), sorted(expected))
+                for candidate_id, score in zip(ids.tolist(), scores.tolist()):
+                    self.assertAlmostEqual(score, expected[candidate_id], places=4)
+                self.assertTrue(np.all(np.diff(scores) <= 1e-6))
+                # The top k are the k best of the full ranking
+                top = sorted(expected.values(), reverse=True)[:5]
+                np.testing.assert_allclose(index.search(query, 5, allowed)[1], top, rtol=1e-5)
+
+    def test_scores_match_reference(self):
+        rng = np.random.default_rng(21)
+        documents = self.documents(rng, range(1, 301))
+        index = BM25Index(merge_threshold=10 ** 6).build(documents.items())
+        self.assertMatchesReference(index, documents)
+        self.assertMatchesReference(index, documents, allowed_ids=set(range(1, 301, 3)))
+
+    def test_scores_match_reference_after_updates(self):
+        rng = np.random.default_rng(22)
+        documents = self.documents(rng, range(1, 201))
+        for merge_threshold in [10 ** 6, 5]:
+            with self.subTest(merge_threshold=merge_threshold):
+                current = dict(documents)
+                index = BM25Index(merge_threshold=merge_threshold).build(current.items())
+                # Edits, new documents and deletions, in the delta segment or merged into the base
+                for candidate_id, text in self.documents(rng, list(range(1, 40, 2)) + list(range(500, 520))).items():
+                    index.upsert(candidate_id, text)
+                    current[candidate_id] = text
+                for candidate_id in range(100, 120):
+                    index.remove(candidate_id)
+                    del current[candidate_id]
+                self.assertMatchesReference(index, current)
+
+class ResumeJobTests(TestCase):
+    """Resume jobs end to end with the offline provider, uploads stored in a temporary MEDIA_ROOT."""
+
+    resume_text = "Asha Rao\nasha.rao@example.com\nSenior Python developer\nDjango, PostgreSQL, AWS"
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        overrides = self.settings(LLM_PROVIDER={"NAME": "offline"}, MEDIA_ROOT=directory)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for patcher in [
+            mock.patch.dict(llm_providers._instances, clear=True),
+            mock.patch.object(profile_embeddings, "enqueue_profile_refresh"),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user(username="asha", email="asha@example.com", password="secret")
+
+    def upload(self, name="resume.docx", text=None):
+        document = docx.Document()
+        for line in (text or self.resume_text).splitlines():
+            document.add_paragraph(line)
+        content = io.BytesIO()
+        document.save(content)
+        return SimpleUploadedFile(name, content.getvalue())
+
+    def test_idempotency_key_returns_the_same_job(self):
+        job, created = create_resume_job(self.user, self.upload(), "upload-1")
+        again, created_again = create_resume_job(self.user, self.upload(), "upload-1")
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.id, job.id)
+        other, created_other = create_resume_job(self.user, self.upload(), "upload-2")
+        self.assertTrue(created_other)
+        self.assertNotEqual(other.id, job.id)
+        # Uploads without a key are never deduplicated
+        self.assertTrue(create_resume_job(self.user, self.upload())[1])
+        self.assertTrue(create_resume_job(self.user, self.upload())[1])
+        self.assertEqual(ResumeJob.objects.count(), 4)
+
+    def test_claim_runs_each_job_once(self):
+        job, _ = create_resume_job(self.user, self.upload())
+        claimed = claim_next_job()
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual((claimed.status, claimed.attempts), ("running", 1))
+        self.assertIsNone(claim_next_job())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            run_resume_job(claimed)
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.stage), ("succeeded", "done"))
+        candidate = Candidate.objects.get(user=self.user)
+        self.assertEqual(candidate.id, claimed.candidate_id)
+        self.assertEqual(claimed.result["projects_created"], candidate.projects.count())
+        # Queued for embedding once the profile is committed
+        profile_embeddings.enqueue_profile_refresh.assert_called_with(candidate.id)
+        self.assertIsNone(claim_next_job())
+
+    def test_transient_failures_are_retried_then_fail(self):
+        job, _ = create_resume_job(self.user, self.upload())
+        with self.settings(RESUME_JOBS={'MAX_ATTEMPTS': 2, 'RETRY_BACKOFF': 60.0}), \
+                mock.patch("candidate.resume_jobs.extract_resume_details", return_value=None):
+            run_resume_job(claim_next_job())
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.stage, job.attempts), ("queued", "parsing", 1))
+            self.assertGreater(job.available_at, timezone.now() + timedelta(seconds=50))
+            # Not runnable again until the backoff has passed
+            self.assertIsNone(claim_next_job())
+            ResumeJob.objects.filter(id=job.id).update(available_at=timezone.now())
+            run_resume_job(claim_next_job())
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ("failed", 2))
+            self.assertEqual(job.error, "Failed to parse resume")
+        self.assertFalse(Candidate.objects.exists())
+
+    def test_invalid_resume_fails_at_once(self):
+        job, _ = create_resume_job(self.user, SimpleUploadedFile("resume.txt", b"Asha Rao, Python developer"))
+        run_resume_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.stage, job.attempts), ("failed", "extracting", 1))
+
+    def test_stale_jobs_are_requeued(self):
+        job, _ = create_resume_job(self.user, self.upload())
+        claim_next_job()
+        self.assertEqual(requeue_stale_jobs(), 0)
+        ResumeJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "queued")
+        self.assertEqual(claim_next_job().attempts, 2)
+
+class VectorIndexTests(SimpleTestCase):
+    """Index selection and the IVF/HNSW search parameters in candidate.vector_index."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.vectors = rng.standard_normal((400, 32)).astype(np.float32)
+        self.vectors /= np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.ids = np.arange(1000, 1400, dtype=np.int64)
+        self.queries = self.vectors[:10] + 0.1 * rng.standard_normal((10, 32)).astype(np.float32)
+        self.config = dict(vector_index.INDEX_DEFAULTS, HNSW_M=16, HNSW_EF_CONSTRUCTION=200)
+
+    def exact_search(self, k: int):
+        flat = vector_index.build_index("flat", 32, self.vectors, self.ids, self.config)
+        return flat.search(self.queries, k)
+
+    def test_auto_selects_flat_below_threshold_and_ann_above(self):
+        config = dict(self.config, ANN_THRESHOLD=100, ANN_TYPE="hnsw")
+        self.assertEqual(vector_index.select_index_type(99, config), "flat")
+        self.assertEqual(vector_index.select_index_type(100, config), "hnsw")
+        self.assertEqual(vector_index.select_index_type(100, dict(config, TYPE="ivf")), "ivf")
+        with self.assertRaises(ValueError):
+            vector_index.select_index_type(10, dict(config, TYPE="lsh"))
+
+    def test_ivf_nlist_keeps_enough_training_points(self):
+        backend = get_backend("faiss")
+        self.assertEqual(backend._ivf_nlist(400, self.config), 400 // 39)
+        self.assertEqual(backend._ivf_nlist(10, self.config), 1)
+        self.assertEqual(backend._ivf_nlist(100000, self.config), int(4 * np.sqrt(100000)))
+
+    def test_too_few_vectors_to_train_fall_back_to_flat_float32(self):
+        config = dict(self.config, TYPE="ivf", STORAGE="pq", COMPRESS_THRESHOLD=10, PQ_M=2)
+        self.assertEqual(vector_index.select_index_type(38, config), "flat")
+        self.assertEqual(vector_index.select_index_type(39, config), "ivf")
+        self.assertEqual(vector_index.select_storage(255, config), "float32")
+        self.assertEqual(vector_index.select_storage(256, config), "pq")
+        # The training sample caps the points available
+        self.assertEqual(vector_index.select_storage(400, dict(config, TRAIN_SAMPLE_SIZE=100)), "float32")
+
+        index = vector_index.build_index("ivf", 32, self.vectors[:20], self.ids[:20], config, "pq")
+        self.assertEqual((vector_index.detect_index_type(index), vector_index.detect_storage(index)), ("flat", "float32"))
+        index = vector_index.build_index("ivf", 32, self.vectors[:100], self.ids[:100], config, "pq")
+        self.assertEqual((vector_index.detect_index_type(index), vector_index.detect_storage(index)), ("ivf", "float32"))
+        self.assertEqual(index.ntotal, 100)
+
+    def test_storage_report_skips_storages_too_small_to_train(self):
+        report = vector_index.storage_report(self.vectors[:30], self.queries, k=5, index_type="ivf", config=self.config)
+        self.assertEqual([row["storage"] for row in report], ["float32", "fp16", "fp16+rerank", "sq8", "sq8+rerank"])
+        self.assertEqual(report[0]["recall_at_k"], 1.0)
+
+    def test_ivf_probing_every_list_matches_flat(self):
+        index = vector_index.build_index("ivf", 32, self.vectors, self.ids, self.config)
+        self.assertEqual(vector_index.detect_index_type(index), "ivf")
+        nlist = faiss.extract_index_ivf(index).nlist
+        params = vector_index.search_params(index, nprobe=nlist, config=self.config)
+        self.assertEqual(params.nprobe, nlist)
+        distances, ids = index.search(self.queries, 5, params=params)
+        exact_distances, exact_ids = self.exact_search(5)
+        np.testing.assert_array_equal(ids, exact_ids)
+        np.testing.assert_allclose(distances, exact_distances, rtol=1e-5)
+
+        # Without an override the configured nprobe is used
+        self.assertEqual(vector_index.search_params(index, config=dict(self.config, IVF_NPROBE=3)).nprobe, 3)
+
+    def test_ivf_removes_by_id(self):
+        index = vector_index.build_index("ivf", 32, self.vectors, self.ids, self.config)
+        self.assertTrue(vector_index.remove_ids(index, self.ids[:10]))
+        self.assertEqual(index.ntotal, 390)
+        nlist = faiss.extract_index_ivf(index).nlist
+        _, ids = index.search(self.queries, 5, params=vector_index.search_params(index, nprobe=nlist))
+        self.assertFalse(np.isin(ids, self.ids[:10]).any())
+
+    def test_hnsw_ef_search_is_passed_per_request(self):
+        index = vector_index.build_index("hnsw", 32, self.vectors, self.ids, self.config)
+        self.assertEqual(vector_index.detect_index_type(index), "hnsw")
+        self.assertEqual(vector_index.search_params(index, config=self.config).efSearch, self.config["HNSW_EF_SEARCH"])
+        params = vector_index.search_params(index, ef_search=400, config=self.config)
+        self.assertEqual(params.efSearch, 400)
+        _, ids = index.search(self.queries, 5, params=params)
+        _, exact_ids = self.exact_search(5)
+        np.testing.assert_array_equal(ids[:, 0], exact_ids[:, 0])
+
+        # HNSW cannot delete; the caller filters stale rows instead
+        self.assertFalse(vector_index.remove_ids(index, self.ids[:1]))
+        self.assertEqual(index.ntotal, 400)
+
+    def test_flat_index_has_no_search_params(self):
+        index = vector_index.build_index("flat", 32, self.vectors, self.ids, self.config)
+        self.assertIsNone(vector_index.search_params(index, nprobe=4, ef_search=16, config=self.config))
+
+    def test_storage_types_shrink_vectors(self):
+        config = dict(self.config, PQ_M=2)
+        code_sizes = {}
+        for storage in vector_index.STORAGE_TYPES:
+            index = vector_index.build_index("flat", 32, self.vectors, self.ids, config, storage)
+            self.assertEqual(vector_index.detect_storage(index), storage)
+            code_sizes[storage] = faiss.downcast_index(index.index).code_size
+        # Bytes per stored vector, before the codebooks
+        self.assertEqual(code_sizes, {"float32": 128, "fp16": 64, "sq8": 32, "pq": 2})
+        self.assertEqual(vector_index.detect_storage(vector_index.build_index("ivf", 32, self.vectors, self.ids, config, "sq8")), "sq8")
+        self.assertEqual(vector_index.detect_storage(vector_index.build_index("hnsw", 32, self.vectors, self.ids, config, "fp16")), "fp16")
+
+    def test_storage_selected_by_compress_threshold(self):
+        config = dict(self.config, STORAGE="sq8", COMPRESS_THRESHOLD=100)
+        self.assertEqual(vector_index.select_storage(99, config), "float32")
+        self.assertEqual(vector_index.select_storage(100, config), "sq8")
+        with self.assertRaises(ValueError):
+            vector_index.select_storage(100, dict(config, STORAGE="int4"))
+
+    def test_storage_report_reranking_recovers_recall(self):
+        report = {row["storage"]: row for row in vector_index.storage_report(
+            self.vectors, self.queries, k=5, config=dict(self.config, PQ_M=2)
+        )}
+        self.assertEqual(set(report), {"float32", "fp16", "fp16+rerank", "sq8", "sq8+rerank", "pq", "pq+rerank"})
+        self.assertEqual(report["float32"]["recall_at_k"], 1.0)
+        for storage in ["fp16", "sq8", "pq"]:
+            self.assertGreaterEqual(report[f"{storage}+rerank"]["recall_at_k"], report[storage]["recall_at_k"])
+        self.assertEqual(report["fp16+rerank"]["recall_at_k"], 1.0)
+
+    def test_mapped_indexes_search_like_in_memory_ones(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for index_type, storage in [("flat", "float32"), ("flat", "sq8"), ("ivf", "float32"), ("hnsw", "fp16")]:
+            index = vector_index.build_index(index_type, 32, self.vectors, self.ids, self.config, storage)
+            path = os.path.join(directory, f"{index_type}_{storage}.index")
+            vector_index.write_index(index, path)
+            mapped = vector_index.read_index(path)
+            self.assertEqual(vector_index.detect_index_type(mapped), index_type)
+            self.assertEqual(vector_index.detect_storage(mapped), storage)
+            params = vector_index.search_params(index, nprobe=64, config=self.config)
+            expected = index.search(self.queries, 5, params=params)
+            found = mapped.search(self.queries, 5, params=vector_index.search_params(mapped, nprobe=64, config=self.config))
+            np.testing.assert_array_equal(found[1], expected[1])
+            np.testing.assert_allclose(found[0], expected[0], rtol=1e-6)
+        self.assertEqual(sorted(name for name in os.listdir(directory) if ".tmp" in name), [])
+
+class FakeIndex:
+    def __init__(self, number: int):
+        self.number = number
+        self.stale = False
+
+    def is_stale(self) -> bool:
+        return self.stale
+
+class IndexRegistryTests(SimpleTestCase):
+    """IndexRegistry with a fake index object and a controlled clock."""
+
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch("candidate.index_registry.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        numbers = itertools.count(1)
+        self.registry = IndexRegistry(lambda: FakeIndex(next(numbers)), check_interval=2.0)
+
+    def test_created_once_on_first_use(self):
+        first = self.registry.get()
+        self.assertEqual(first.number, 1)
+        self.now += 5
+        self.assertIs(self.registry.get(), first)
+
+    def test_stale_instance_is_replaced_after_check_interval(self):
+        first = self.registry.get()
+        first.stale = True
+        self.now += 1
+        self.assertIs(self.registry.get(), first)
+        self.now += 1
+        second = self.registry.get()
+        self.assertEqual(second.number, 2)
+        self.assertIs(self.registry.get(), second)
+
+    def test_reset_loads_again(self):
+        self.registry.get()
+        self.registry.reset()
+        self.assertEqual(self.registry.get().number, 2)
+
+class ReembedQueueTests(SimpleTestCase):
+    """ReembedQueue batching with short debounce delays."""
+
+    def setUp(self):
+        self.batches = []
+        self.done = threading.Event()
+
+    def process(self, batch):
+        self.batches.append(batch)
+        self.done.set()
+
+    def test_changes_within_the_delay_become_one_batch(self):
+        queue = ReembedQueue(self.process, delay=0.05, max_delay=5.0)
+        for candidate_id in [3, 1, 3, 2]:
+            queue.enqueue(candidate_id)
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.batches, [[1, 2, 3]])
+        self.assertEqual(queue.pending, 0)
+
+    def test_failed_ids_are_retried_alone_with_backoff_then_dropped(self):
+        calls = []
+
+        def process(batch):
+            calls.append(batch)
+            if 1 in batch:
+                raise RuntimeError("profile 1 cannot be embedded")
+
+        queue = ReembedQueue(process, delay=60.0, max_delay=60.0, max_attempts=3)
+        queue.enqueue(1)
+        queue.enqueue(2)
+        queue.flush()
+        self.assertEqual(queue.pending, 2)
+        # First retry after delay * 2
+        self.assertGreater(min(queue._retry_at.values()), time.monotonic() + 100)
+
+        # Retries go one id at a time, so 2 no longer fails along with 1
+        queue.enqueue(3)
+        queue.flush()
+        self.assertEqual(calls, [[1, 2], [3], [1], [2]])
+        self.assertEqual(queue.pending, 1)
+        self.assertGreater(queue._retry_at[1], time.monotonic() + 220)
+
+        # The third failure drops it, and a new save starts over
+        queue.flush()
+        self.assertEqual(calls[-1], [1])
+        self.assertEqual(queue.pending, 0)
+        queue.enqueue(1)
+        self.assertEqual(queue.pending, 1)
+
+class SnapshotWriterTests(SimpleTestCase):
+    """SnapshotWriter debouncing with a recording flush callback."""
+
+    def setUp(self):
+        self.flushed = threading.Event()
+        self.flushes = 0
+
+    def record_flush(self):
+        self.flushes += 1
+        self.flushed.set()
+
+    def test_flushes_once_max_pending_changes_accumulate(self):
+        writer = index_snapshots.SnapshotWriter(self.record_flush, flush_interval=60, max_pending=3)
+        writer.mark_dirty()
+        writer.mark_dirty()
+        self.assertFalse(self.flushed.wait(0.1))
+        writer.mark_dirty()
+        self.assertTrue(self.flushed.wait(5))
+        self.assertEqual(self.flushes, 1)
+        self.assertEqual(writer.pending, 0)
+
+    def test_flushes_after_interval_from_first_change(self):
+        writer = index_snapshots.SnapshotWriter(self.record_flush, flush_interval=0.1, max_pending=100)
+        writer.mark_dirty()
+        writer.mark_dirty()
+        self.assertTrue(self.flushed.wait(5))
+        self.assertEqual(self.flushes, 1)
+        writer.flush()
+        self.assertEqual(self.flushes, 1)
+
+    def test_failed_flush_keeps_changes_pending(self):
+        flush = mock.Mock(side_effect=[OSError("disk full"), None])
+        writer = index_snapshots.SnapshotWriter(flush, flush_interval=60, max_pending=100)
+        writer.mark_dirty(2)
+        writer.flush()
+        self.assertEqual(writer.pending, 2)
+        writer.flush()
+        self.assertEqual(writer.pending, 0)
+        self.assertEqual(flush.call_count, 2)
+
+class NumpyIndexTests(SimpleTestCase):
+    """The numpy memmap backend against exact faiss search."""
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.vectors = rng.standard_normal((300, 16)).astype(np.float32)
+        self.vectors /= np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.ids = rng.permutation(np.arange(5000, 5300, dtype=np.int64))
+        self.queries = rng.standard_normal((8, 16)).astype(np.float32)
+        self.backend = get_backend("numpy")
+
+    def numpy_index(self, storage: str = "float32") -> NumpyIndex:
+        index = self.backend.create_index("flat", 16, 0, vector_index.INDEX_DEFAULTS, storage)
+        # One row at a time, like profile upserts
+        for vector, candidate_id in zip(self.vectors, self.ids):
+            index.add_with_ids(vector[None, :], np.array([candidate_id]))
+        return index
+
+    def test_search_matches_exact_faiss_across_blocks(self):
+        flat = faiss.IndexIDMap2(faiss.IndexFlatIP(16))
+        flat.add_with_ids(self.vectors, self.ids)
+        expected_distances, expected_ids = flat.search(self.queries, 10)
+        index = self.numpy_index()
+        with mock.patch("candidate.vector_backends.NUMPY_BLOCK_ROWS", 64):
+            distances, ids = index.search(self.queries, 10)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-5)
+
+        # fp16 storage halves the matrix and keeps the ranking within rounding
+        half = self.numpy_index("fp16")
+        self.assertEqual(half.vectors.nbytes * 2, index.vectors.nbytes)
+        np.testing.assert_allclose(half.search(self.queries, 10)[0], expected_distances, atol=1e-2)
+
+    def test_reconstruct_and_remove_by_id(self):
+        index = self.numpy_index()
+        np.testing.assert_array_equal(index.reconstruct_batch(self.ids[[5, 0]]), self.vectors[[5, 0]])
+        self.assertEqual(index.remove_ids(self.ids[:10]), 10)
+        self.assertEqual(index.ntotal, 290)
+        self.assertFalse(np.isin(index.search(self.queries, 20)[1], self.ids[:10]).any())
+        with self.assertRaises(RuntimeError):
+            index.reconstruct_batch(self.ids[:1])
+
+    def test_saved_matrix_is_memory_mapped_and_copied_on_write(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "skills.npy")
+        index = self.numpy_index()
+        self.backend.write_index(index, path)
+        self.assertIs(backend_of_file(path), self.backend)
+
+        mapped = self.backend.read_index(path, mmap=True)
+        self.assertTrue(mapped.mapped)
+        np.testing.assert_array_equal(mapped.search(self.queries, 5)[1], index.search(self.queries, 5)[1])
+        mapped.add_with_ids(self.vectors[:1], np.array([1], dtype=np.int64))
+        self.assertFalse(mapped.mapped)
+        self.assertEqual(self.backend.read_index(path, mmap=False).ntotal, 300)
+
+class AttributeStoreTests(TestCase):
+    """Filter compilation over the columnar candidate attributes."""
+
+    def setUp(self):
+        rows = [
+            ("Asha", {"experience": 6, "status": "shortlisted", "preferred_locations": "Pune, Remote"}),
+            ("Ben", {"experience": 2, "is_actively_looking": False, "preferred_locations": "Mumbai"}),
+            ("Chen", {"experience": None, "employment_type_preferences": "contract", "willingness_to_relocate": True}),
+        ]
+        self.ids = {
+            name: Candidate.objects.create(name=name, email=f"{name.lower()}@example.com", **fields).id
+            for name, fields in rows
+        }
+        self.store = AttributeStore().load()
+
+    def matching(self, filters) -> list:
+        names = {candidate_id: name for name, candidate_id in self.ids.items()}
+        return sorted(names[candidate_id] for candidate_id in self.store.filter_ids(filters).tolist())
+
+    def test_lookups(self):
+        self.assertEqual(self.matching({"experience__gte": 2}), ["Asha", "Ben"])
+        self.assertEqual(self.matching({"experience__lt": 6}), ["Ben"])
+        self.assertEqual(self.matching({"experience__in": [2, 6]}), ["Asha", "Ben"])
+        self.assertEqual(self.matching({"is_actively_looking": True}), ["Asha", "Chen"])
+        self.assertEqual(self.matching({"willingness_to_relocate": True}), ["Chen"])
+        self.assertEqual(self.matching({"status__in": ["new", "hired"]}), ["Ben", "Chen"])
+        self.assertEqual(self.matching({"employment_type_preferences": "contract"}), ["Chen"])
+        self.assertEqual(self.matching({"preferred_locations__in": [" REMOTE", "mumbai"]}), ["Asha", "Ben"])
+        self.assertEqual(self.matching({"experience__gte": 2, "status": "new"}), ["Ben"])
+
+    def test_upsert_and_remove(self):
+        candidate = Candidate.objects.get(id=self.ids["Ben"])
+        candidate.preferred_locations = "Remote"
+        candidate.experience = 9
+        self.store.upsert(candidate)
+        self.assertEqual(self.matching({"preferred_locations": "remote"}), ["Asha", "Ben"])
+        self.assertEqual(self.matching({"preferred_locations": "mumbai"}), [])
+        self.assertEqual(self.matching({"experience__gt": 6}), ["Ben"])
+        self.store.remove(self.ids["Asha"])
+        self.assertEqual(self.matching({"preferred_locations": "remote"}), ["Ben"])
+
+    def test_invalid_filters(self):
+        for filters in [{"name": "Asha"}, {"experience__range": [1, 2]}, {"is_actively_looking": "yes"},
+                        {"status": "archived"}, {"preferred_locations__in": "Pune"}]:
+            with self.assertRaises(ValueError):
+                self.store.filter_ids(filters)
+
+class IngestResumesTests(TestCase):
+    """
+    ingest_resumes on DOCX files in a temporary directory, parsed by the offline
+    provider and embedded by the lexical one into a fresh index there.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        overrides = self.settings(
+            LLM_PROVIDER={"NAME": "offline", "EMBEDDING_NAME": "lexical", "LEXICAL_IDF_PATH": None},
+            EMBEDDING_INDEX={"REEMBED_ON_SAVE": False}, EMBEDDING_CACHE={"PATH": None},
+            MEDIA_ROOT=os.path.join(self.directory, "media")
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.directory)
+        for name in ["_keyword_index", "_skill_index", "_skill_writer"]:
+            patcher = mock.patch.object(profile_embeddings, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(llm_providers._instances, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        profile_embeddings.index_registry.reset()
+        profile_embeddings.result_cache.clear()
+        self.addCleanup(profile_embeddings.index_registry.reset)
+        # Write what is still pending before leaving the directory
+        self.addCleanup(profile_embeddings.flush_profile_refreshes)
+
+    def write_resumes(self, count):
+        directory = os.path.join(self.directory, "resumes")
+        os.makedirs(directory)
+        for number in range(count):
+            document = docx.Document()
+            document.add_paragraph(f"Candidate {number}")
+            document.add_paragraph(f"Python developer number {number}")
+            document.save(os.path.join(directory, f"resume_{number}.docx"))
+        with open(os.path.join(directory, "broken.docx"), "wb") as resume_file:
+            resume_file.write(b"not a docx file")
+        return directory
+
+    def ingest(self, directory, *args):
+        call_command("ingest_resumes", directory, "--extract-workers", "1", "--parse-workers", "2",
+                     "--batch-size", "2", *args, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def read_checkpoint(self, directory):
+        with open(os.path.join(directory, ".ingest_checkpoint.jsonl")) as checkpoint:
+            return [json.loads(line) for line in checkpoint]
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        directory = self.write_resumes(4)
+        self.ingest(directory, "--limit", "3")
+        entries = self.read_checkpoint(directory)
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(Candidate.objects.count(), 2)
+        self.assertEqual({entry["status"] for entry in entries}, {"saved", "failed"})
+        self.assertEqual(CandidateEmbeddingState.objects.count(), 2)
+
+        # A saved candidate whose embedding was lost is embedded again by the next run
+        unembedded = next(entry["candidate_id"] for entry in entries if entry["status"] == "saved")
+        CandidateEmbeddingState.objects.filter(candidate_id=unembedded).delete()
+        self.ingest(directory)
+        entries = self.read_checkpoint(directory)
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(len({entry["file"] for entry in entries}), 5)
+        self.assertEqual(Candidate.objects.count(), 4)
+        self.assertEqual(CandidateEmbeddingState.objects.count(), 4)
+        self.assertEqual(get_embedding_manager().ntotal, 4)
+
+        # Nothing is left to process, and --restart starts over
+        self.ingest(directory)
+        self.assertEqual(len(self.read_checkpoint(directory)), 5)
+        self.ingest(directory, "--restart")
+        self.assertEqual(len(self.read_checkpoint(directory)), 5)
+        self.assertEqual(Candidate.objects.count(), 4)
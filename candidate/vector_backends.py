@@ -0,0 +1,418 @@
+import math
+import os
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # The numpy backend works without faiss
+    faiss = None
+
+from .index_snapshots import fsync_path
+
+# Rows scanned per matrix multiply by the numpy backend; bounds the float32
+# working set of fp16 matrices to about 100 MB at 1536 dimensions
+NUMPY_BLOCK_ROWS = 16384
+
+# Magic prefix of .npy files, used to tell numpy snapshots from faiss ones
+_NPY_MAGIC = b"\x93NUMPY"
+
+class VectorBackend:
+    """
+    Interface of a vector index backend.
+
+    An index holds normalized vectors addressed by int64 candidate id and
+    ranks them by inner product. Index objects expose the subset of the faiss
+    Index API the embedding manager relies on: ntotal, is_trained, train(),
+    add_with_ids(), remove_ids(), reconstruct_batch() and search().
+    """
+
+    name = None
+    index_types = ()
+    storage_types = ()
+
+    def owns(self, index: Any) -> bool:
+        """Whether an index object was created by this backend."""
+        raise NotImplementedError
+
+    def create_index(self, index_type: str, dimension: int, ntotal: int,
+                     config: Dict[str, Any], storage: str) -> Any:
+        """Create an empty index of the given type and storage."""
+        raise NotImplementedError
+
+    def min_training_points(self, index_type: str, storage: str, ntotal: int,
+                            config: Dict[str, Any]) -> int:
+        """Training vectors an index of the given type and storage over ntotal vectors needs."""
+        return 0
+
+    def read_index(self, path: str, mmap: bool) -> Any:
+        """Read an index from disk, memory-mapped and read-only if mmap is set."""
+        raise NotImplementedError
+
+    def write_index(self, index: Any, path: str) -> None:
+        """Write an index durably: temp file, fsync, rename into place."""
+        raise NotImplementedError
+
+    def clone_index(self, index: Any) -> Any:
+        """Private in-memory copy of an index that is not memory-mapped."""
+        raise NotImplementedError
+
+    def detect_index_type(self, index: Any) -> str:
+        raise NotImplementedError
+
+    def detect_storage(self, index: Any) -> str:
+        raise NotImplementedError
+
+    def remove_ids(self, index: Any, ids: np.ndarray) -> bool:
+        """Remove ids from an index; returns False when the index type cannot delete."""
+        index.remove_ids(ids)
+        return True
+
+    def supports_selector(self, index: Any) -> bool:
+        """Whether searches of an index can be restricted to a set of ids."""
+        return False
+
+    def search_params(self, index: Any, nprobe: Optional[int], ef_search: Optional[int],
+                      config: Dict[str, Any], allowed_ids: Optional[np.ndarray] = None) -> Any:
+        """
+        Per-request search parameters, or None when the index has none.
+        allowed_ids (sorted) restricts the search when supports_selector() is true.
+        """
+        return None
+
+    def index_bytes(self, index: Any) -> int:
+        """Memory held by an index."""
+        raise NotImplementedError
+
+class FaissBackend(VectorBackend):
+    """Flat, IVF and HNSW indexes from faiss, with float32, fp16, SQ8 or PQ storage."""
+
+    name = "faiss"
+    index_types = ("flat", "ivf", "hnsw")
+    storage_types = ("float32", "fp16", "sq8", "pq")
+
+    # index_factory code suffix for each storage type
+    _STORAGE_CODES = {"float32": "Flat", "fp16": "SQfp16", "sq8": "SQ8"}
+    # k-means needs a training point per centroid: 256 per 8-bit PQ sub-quantizer,
+    # and faiss asks for 39 per IVF list before it warns about poor clustering
+    _PQ_CENTROIDS = 256
+    _MIN_POINTS_PER_LIST = 39
+
+    def __init__(self):
+        if faiss is None:
+            raise ImportError("The faiss backend needs the faiss-cpu package")
+
+    def owns(self, index: Any) -> bool:
+        return isinstance(index, faiss.Index)
+
+    def _ivf_nlist(self, ntotal: int, config: Dict[str, Any]) -> int:
+        """Number of IVF lists, keeping enough training points per list."""
+        if config["IVF_NLIST"]:
+            nlist = int(config["IVF_NLIST"])
+        else:
+            nlist = int(4 * math.sqrt(ntotal))
+        return max(1, min(nlist, ntotal // self._MIN_POINTS_PER_LIST or 1))
+
+    def _storage_code(self, storage: str, config: Dict[str, Any]) -> str:
+        """index_factory code for a storage type."""
+        if storage == "pq":
+            return f"PQ{int(config['PQ_M'])}"
+        return self._STORAGE_CODES[storage]
+
+    def min_training_points(self, index_type: str, storage: str, ntotal: int,
+                            config: Dict[str, Any]) -> int:
+        points = self._PQ_CENTROIDS if storage == "pq" else 0
+        if index_type == "ivf":
+            points = max(points, self._MIN_POINTS_PER_LIST * self._ivf_nlist(ntotal, config))
+        return points
+
+    def create_index(self, index_type: str, dimension: int, ntotal: int,
+                     config: Dict[str, Any], storage: str) -> Any:
+        code = self._storage_code(storage, config)
+        if index_type == "flat":
+            return faiss.IndexIDMap2(faiss.index_factory(dimension, code, faiss.METRIC_INNER_PRODUCT))
+        if index_type == "ivf":
+            index = faiss.index_factory(
+                dimension, f"IVF{self._ivf_nlist(ntotal, config)},{code}", faiss.METRIC_INNER_PRODUCT
+            )
+            # IVF stores ids natively; a hashtable direct map allows reconstruct and remove by id
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return index
+        if index_type == "hnsw":
+            # HNSW+PQ only supports L2, which ranks unit vectors the same way as inner product
+            hnsw = faiss.index_factory(
+                dimension, f"HNSW{int(config['HNSW_M'])}_{code}".replace("_Flat", ""), faiss.METRIC_INNER_PRODUCT
+            )
+            hnsw.hnsw.efConstruction = int(config["HNSW_EF_CONSTRUCTION"])
+            hnsw.hnsw.efSearch = int(config["HNSW_EF_SEARCH"])
+            return faiss.IndexIDMap2(hnsw)
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    def read_index(self, path: str, mmap: bool) -> Any:
+        if not mmap:
+            return faiss.read_index(path)
+        try:
+            # Flat, scalar-quantized and HNSW storage
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # IVF inverted lists can only be mapped on their own
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+    def write_index(self, index: Any, path: str) -> None:
+        temp_path = f"{path}.tmp{os.getpid()}"
+        faiss.write_index(index, temp_path)
+        fsync_path(temp_path)
+        os.replace(temp_path, path)
+
+    def clone_index(self, index: Any) -> Any:
+        return faiss.clone_index(index)
+
+    def detect_index_type(self, index: Any) -> str:
+        if isinstance(index, faiss.IndexIDMap2):
+            index = faiss.downcast_index(index.index)
+        if isinstance(index, faiss.IndexIVF):
+            return "ivf"
+        if isinstance(index, faiss.IndexHNSW):
+            return "hnsw"
+        return "flat"
+
+    def detect_storage(self, index: Any) -> str:
+        # Keep `index` bound: the wrapped sub-indexes are freed together with it
+        base = index
+        if isinstance(base, faiss.IndexIDMap2):
+            base = faiss.downcast_index(base.index)
+        if isinstance(base, faiss.IndexHNSW):
+            base = faiss.downcast_index(base.storage)
+        if isinstance(base, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+            return "pq"
+        if isinstance(base, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+            return "fp16" if base.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+        return "float32"
+
+    def remove_ids(self, index: Any, ids: np.ndarray) -> bool:
+        if self.detect_index_type(index) == "hnsw":
+            return False
+        index.remove_ids(ids)
+        return True
+
+    def supports_selector(self, index: Any) -> bool:
+        # Flat PQ is the one layout whose search rejects an id selector
+        return self.detect_index_type(index) != "flat" or self.detect_storage(index) != "pq"
+
+    def _bitmap_selector(self, allowed_ids: np.ndarray) -> Any:
+        """Selector over a bitmap with one bit per candidate id (the selector keeps the bitmap alive)."""
+        bitmap = np.zeros((int(allowed_ids[-1]) >> 3) + 1 if len(allowed_ids) else 1, dtype=np.uint8)
+        np.bitwise_or.at(bitmap, allowed_ids >> 3, (1 << (allowed_ids & 7)).astype(np.uint8))
+        return faiss.IDSelectorBitmap(bitmap)
+
+    def search_params(self, index: Any, nprobe: Optional[int], ef_search: Optional[int],
+                      config: Dict[str, Any], allowed_ids: Optional[np.ndarray] = None) -> Any:
+        selector = None
+        if allowed_ids is not None and self.supports_selector(index):
+            selector = self._bitmap_selector(allowed_ids)
+        options = {"sel": selector} if selector is not None else {}
+        index_type = self.detect_index_type(index)
+        if index_type == "ivf":
+            params = faiss.SearchParametersIVF(nprobe=int(nprobe or config["IVF_NPROBE"]), **options)
+        elif index_type == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=int(ef_search or config["HNSW_EF_SEARCH"]), **options)
+        elif selector is not None:
+            params = faiss.SearchParameters(sel=selector)
+        else:
+            return None
+        if selector is not None:
+            # The parameters only hold a raw pointer to the selector
+            params.referenced_selector = selector
+        return params
+
+    def index_bytes(self, index: Any) -> int:
+        return len(faiss.serialize_index(index))
+
+class NumpyIndex:
+    """
+    Exact inner-product index over a contiguous float32 or float16 matrix.
+
+    Rows are appended to a buffer that grows geometrically, so one-at-a-time
+    adds stay cheap. A matrix loaded with mmap is a read-only np.memmap and is
+    copied into memory on the first change.
+    """
+
+    is_trained = True
+
+    def __init__(self, dimension: int, storage: str = "float32",
+                 vectors: Optional[np.ndarray] = None, ids: Optional[np.ndarray] = None):
+        self.d = dimension
+        self.storage = storage
+        self.dtype = np.float16 if storage == "fp16" else np.float32
+        self._vectors = vectors if vectors is not None else np.empty((0, dimension), dtype=self.dtype)
+        self._ids = ids if ids is not None else np.empty(0, dtype=np.int64)
+        self._size = len(self._ids)
+        self._order = None  # argsort of the ids, built on demand for lookups by id
+
+    @property
+    def ntotal(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def mapped(self) -> bool:
+        return isinstance(self._vectors, np.memmap)
+
+    def train(self, vectors: np.ndarray) -> None:
+        pass
+
+    def _reserve(self, count: int) -> None:
+        """Make room for count more rows, copying a mapped matrix into memory."""
+        needed = self._size + count
+        if needed <= len(self._ids) and not self.mapped:
+            return
+        capacity = max(needed, 2 * len(self._ids), 16)
+        vectors = np.empty((capacity, self.d), dtype=self.dtype)
+        vectors[:self._size] = self.vectors
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self._size] = self.ids
+        self._vectors, self._ids = vectors, ids
+
+    def add_with_ids(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        self._reserve(len(ids))
+        self._vectors[self._size:self._size + len(ids)] = vectors
+        self._ids[self._size:self._size + len(ids)] = ids
+        self._size += len(ids)
+        self._order = None
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        keep = ~np.isin(self.ids, ids)
+        removed = self._size - int(keep.sum())
+        if removed:
+            self._vectors = np.ascontiguousarray(self.vectors[keep])
+            self._ids = self.ids[keep]
+            self._size = len(self._ids)
+            self._order = None
+        return removed
+
+    def _rows(self, ids: np.ndarray) -> np.ndarray:
+        """Row numbers of ids; raises if any id is missing, like faiss reconstruct."""
+        if self._order is None:
+            self._order = np.argsort(self.ids, kind="stable")
+        sorted_ids = self.ids[self._order]
+        positions = np.minimum(np.searchsorted(sorted_ids, ids), max(self._size - 1, 0))
+        if not self._size or not np.array_equal(sorted_ids[positions], ids):
+            raise RuntimeError("Some ids are not in the index")
+        return self._order[positions]
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        return self.vectors[self._rows(np.asarray(ids, dtype=np.int64))].astype(np.float32)
+
+    def search(self, queries: np.ndarray, k: int, params: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top k rows per query by blocked matrix multiply, keeping a running top k with argpartition.
+        params.allowed_ids, when given, restricts the search to those (sorted) ids.
+        """
+        allowed_ids = getattr(params, "allowed_ids", None)
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        distances = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        for start in range(0, self._size, NUMPY_BLOCK_ROWS):
+            block = self._vectors[start:min(start + NUMPY_BLOCK_ROWS, self._size)]
+            scores = queries @ block.astype(np.float32, copy=False).T
+            if allowed_ids is not None:
+                scores[:, ~np.isin(self._ids[start:start + len(block)], allowed_ids)] = -np.inf
+            scores = np.concatenate([distances, scores], axis=1)
+            block_labels = np.concatenate(
+                [labels, np.broadcast_to(self._ids[start:start + len(block)], (len(queries), len(block)))], axis=1
+            )
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            distances = np.take_along_axis(scores, top, axis=1)
+            labels = np.take_along_axis(block_labels, top, axis=1)
+        labels[np.isneginf(distances)] = -1
+        order = np.argsort(-distances, axis=1, kind="stable")
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(labels, order, axis=1)
+
+class NumpySearchParams:
+    """Search parameters of a NumpyIndex."""
+
+    def __init__(self, allowed_ids: Optional[np.ndarray] = None):
+        self.allowed_ids = allowed_ids
+
+class NumpyBackend(VectorBackend):
+    """
+    Exact search over plain .npy matrices, one per aspect, with ids in a side file.
+    Needs nothing beyond numpy, and saved matrices are opened with np.memmap.
+    """
+
+    name = "numpy"
+    index_types = ("flat",)
+    storage_types = ("float32", "fp16")
+
+    def owns(self, index: Any) -> bool:
+        return isinstance(index, NumpyIndex)
+
+    def create_index(self, index_type: str, dimension: int, ntotal: int,
+                     config: Dict[str, Any], storage: str) -> Any:
+        if index_type not in self.index_types or storage not in self.storage_types:
+            raise ValueError(f"The numpy backend does not support {index_type}/{storage} indexes")
+        return NumpyIndex(dimension, storage)
+
+    def read_index(self, path: str, mmap: bool) -> Any:
+        vectors = np.load(path, mmap_mode="r" if mmap else None)
+        ids = np.load(f"{path}.ids.npy")
+        return NumpyIndex(vectors.shape[1], "fp16" if vectors.dtype == np.float16 else "float32", vectors, ids)
+
+    def write_index(self, index: Any, path: str) -> None:
+        # The ids go first: a matrix is only ever renamed into place next to its ids
+        for target, array in ((f"{path}.ids.npy", index.ids), (path, index.vectors)):
+            temp_path = f"{target}.tmp{os.getpid()}"
+            with open(temp_path, "wb") as array_file:
+                np.save(array_file, np.ascontiguousarray(array))
+                array_file.flush()
+                os.fsync(array_file.fileno())
+            os.replace(temp_path, target)
+
+    def clone_index(self, index: Any) -> Any:
+        return NumpyIndex(index.d, index.storage, np.array(index.vectors), np.array(index.ids))
+
+    def detect_index_type(self, index: Any) -> str:
+        return "flat"
+
+    def supports_selector(self, index: Any) -> bool:
+        return True
+
+    def search_params(self, index: Any, nprobe: Optional[int], ef_search: Optional[int],
+                      config: Dict[str, Any], allowed_ids: Optional[np.ndarray] = None) -> Any:
+        return NumpySearchParams(allowed_ids) if allowed_ids is not None else None
+
+    def detect_storage(self, index: Any) -> str:
+        return index.storage
+
+    def index_bytes(self, index: Any) -> int:
+        return index.vectors.nbytes + index.ids.nbytes
+
+_BACKENDS = {"faiss": FaissBackend, "numpy": NumpyBackend}
+_instances = {}
+
+def get_backend(name: str) -> VectorBackend:
+    """Return the backend registered under name."""
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown vector backend: {name}")
+    if name not in _instances:
+        _instances[name] = _BACKENDS[name]()
+    return _instances[name]
+
+def backend_of(index: Any) -> VectorBackend:
+    """Return the backend that created an index object."""
+    if isinstance(index, NumpyIndex):
+        return get_backend("numpy")
+    return get_backend("faiss")
+
+def backend_of_file(path: str) -> VectorBackend:
+    """Return the backend that wrote an index file."""
+    with open(path, "rb") as index_file:
+        magic = index_file.read(len(_NPY_MAGIC))
+    return get_backend("numpy" if magic == _NPY_MAGIC else "faiss")
@@ -0,0 +1,236 @@
+import time
+from typing import List, Dict, Any, Optional
+import numpy as np
+from django.conf import settings
+from .vector_backends import FaissBackend, get_backend, backend_of, backend_of_file
+
+# Defaults for settings.EMBEDDING_INDEX
+INDEX_DEFAULTS = {
+    "BACKEND": "faiss",          # "faiss", or "numpy" for exact search over memory-mapped .npy matrices
+    "TYPE": "auto",              # "flat", "ivf", "hnsw" or "auto"
+    "ANN_TYPE": "ivf",           # ANN backend used by "auto" above the threshold
+    "ANN_THRESHOLD": 50000,      # Vector count at which "auto" leaves the flat index
+    "IVF_NLIST": None,           # None picks about 4 * sqrt(N) lists
+    "IVF_NPROBE": 16,
+    "HNSW_M": 32,
+    "HNSW_EF_CONSTRUCTION": 80,
+    "HNSW_EF_SEARCH": 64,
+    "TRAIN_SAMPLE_SIZE": 100000,
+    "STORAGE": "float32",        # "float32", "fp16", "sq8" or "pq"
+    "COMPRESS_THRESHOLD": 10000, # Vector count at which STORAGE replaces float32
+    "PQ_M": 96,                  # PQ sub-quantizers (bytes per vector), must divide the dimension
+    "RERANK": False,             # Keep full float32 vectors and rescore the shortlist exactly
+    "RERANK_K_FACTOR": 4,        # Shortlist size multiplier when re-ranking
+    "MMAP": True,                # Open saved indexes memory-mapped and read-only
+    "FILTER_SCAN_THRESHOLD": 20000, # Filtered searches with fewer eligible candidates score them all exactly
+    "ATTRIBUTE_REFRESH_INTERVAL": 60.0, # Seconds before filter attributes are reloaded from the database
+    "SKILL_INDEX_PATH": "candidate_skills.npz",  # Saved skill postings, synced with the database on load
+    "RANKING_DEPTH": 200,        # Candidates ranked and cached per search for paging with cursors
+    "RANKING_TTL": 600,          # Seconds a cached ranking and its cursors stay valid
+    "RANKING_CACHE": "shared",  # Django cache alias of the rankings; must be shared across workers
+    "RESULT_CACHE_SIZE": 256,    # Search rankings kept in each process's LRU cache, 0 to disable
+    "RESULT_CACHE_TTL": 300,     # Seconds a cached search ranking is served
+    "RESULT_CACHE_ALIAS": None,  # Django cache alias shared by workers as a second tier, None for local only
+    "HYBRID_SEARCH": True,       # Fuse BM25 keyword rankings into dense ones with reciprocal-rank fusion
+    "RRF_K": 60,                 # Rank offset of reciprocal-rank fusion; larger flattens the top ranks
+    "KEYWORD_REFRESH_INTERVAL": 300.0,  # Seconds before the BM25 index is rebuilt from the database
+    "BM25_K1": 1.2,
+    "BM25_B": 0.75,
+    "REEMBED_ON_SAVE": True,     # Re-embed the changed aspects of saved profiles in the background
+    "REEMBED_DELAY": 2.0,        # Seconds without further saves before queued profiles are re-embedded
+    "REEMBED_MAX_DELAY": 10.0,   # Seconds a queued profile waits at most under a steady stream of saves
+    "REEMBED_MAX_ATTEMPTS": 5,   # Failed refreshes of a profile before it waits for its next save or a rebuild
+    "RELOAD_INTERVAL": 2.0,      # Seconds between checks for a newer published generation
+    "FLUSH_INTERVAL": 5.0,       # Seconds after the first change before the delta is compacted into a snapshot
+    "FLUSH_MAX_PENDING": 100,    # Delta segment changes that trigger a compaction right away
+    "KEEP_GENERATIONS": 2,       # Snapshot generations kept on disk
+}
+
+INDEX_TYPES = FaissBackend.index_types
+STORAGE_TYPES = FaissBackend.storage_types
+
+def get_index_config() -> Dict[str, Any]:
+    """Return the vector index settings merged over the defaults."""
+    config = dict(INDEX_DEFAULTS)
+    config.update(getattr(settings, "EMBEDDING_INDEX", {}))
+    return config
+
+def can_train(index_type: str, storage: str, ntotal: int,
+              config: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether a training sample of ntotal vectors is large enough for the index type and storage."""
+    config = config or get_index_config()
+    needed = get_backend(config["BACKEND"]).min_training_points(index_type, storage, ntotal, config)
+    return min(ntotal, int(config["TRAIN_SAMPLE_SIZE"])) >= needed
+
+def select_index_type(ntotal: int, config: Dict[str, Any]) -> str:
+    """Pick the index type for a corpus of ntotal vectors, flat while IVF cannot be trained."""
+    backend = get_backend(config["BACKEND"])
+    index_type = config["TYPE"]
+    if index_type == "auto":
+        # Backends without ANN indexes keep scanning exactly at any size
+        use_ann = ntotal >= config["ANN_THRESHOLD"] and config["ANN_TYPE"] in backend.index_types
+        index_type = config["ANN_TYPE"] if use_ann else "flat"
+    if index_type not in backend.index_types:
+        raise ValueError(f"Index type {index_type} is not supported by the {backend.name} backend")
+    if not can_train(index_type, "float32", ntotal, config):
+        return "flat"
+    return index_type
+
+def select_storage(ntotal: int, config: Dict[str, Any]) -> str:
+    """Pick the vector storage for a corpus of ntotal vectors, float32 while PQ cannot be trained."""
+    backend = get_backend(config["BACKEND"])
+    storage = config["STORAGE"] if ntotal >= config["COMPRESS_THRESHOLD"] else "float32"
+    if storage not in backend.storage_types:
+        raise ValueError(f"Storage {storage} is not supported by the {backend.name} backend")
+    if not can_train("flat", storage, ntotal, config):
+        return "float32"
+    return storage
+
+def detect_index_type(index: Any) -> str:
+    """Tell which of the supported index types a loaded index is."""
+    return backend_of(index).detect_index_type(index)
+
+def detect_storage(index: Any) -> str:
+    """Tell how a loaded index stores its vectors."""
+    return backend_of(index).detect_storage(index)
+
+def create_index(index_type: str, dimension: int, ntotal: int = 0,
+                 config: Optional[Dict[str, Any]] = None, storage: str = "float32") -> Any:
+    """Create an empty inner-product index addressed by candidate id, with the configured backend."""
+    config = config or get_index_config()
+    return get_backend(config["BACKEND"]).create_index(index_type, dimension, ntotal, config, storage)
+
+def build_index(index_type: str, dimension: int, vectors: np.ndarray, ids: np.ndarray,
+                config: Optional[Dict[str, Any]] = None, storage: str = "float32") -> Any:
+    """
+    Build an index of the given type and storage, training it on a sample of the vectors.
+    Falls back to a flat index or float32 storage when there are too few vectors to train them.
+    """
+    config = config or get_index_config()
+    if not can_train(index_type, storage, len(ids), config):
+        requested = f"{index_type}/{storage}"
+        if not can_train(index_type, "float32", len(ids), config):
+            index_type = "flat"
+        if not can_train("flat", storage, len(ids), config):
+            storage = "float32"
+        print(f"Too few vectors ({len(ids)}) to train {requested}, building {index_type}/{storage}")
+    index = create_index(index_type, dimension, len(ids), config, storage)
+    if not index.is_trained:
+        sample_size = min(len(vectors), int(config["TRAIN_SAMPLE_SIZE"]))
+        sample = vectors[np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    if len(ids):
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids)
+    return index
+
+def is_configured_backend(index: Any, config: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether an index was created by the backend currently configured."""
+    config = config or get_index_config()
+    return backend_of(index).name == config["BACKEND"]
+
+def clone_index(index: Any) -> Any:
+    """Private in-memory copy of an index that is not memory-mapped."""
+    return backend_of(index).clone_index(index)
+
+def remove_ids(index: Any, ids: np.ndarray) -> bool:
+    """Remove ids from an index; returns False when the index type cannot delete (HNSW)."""
+    return backend_of(index).remove_ids(index, ids)
+
+def supports_selector(index: Any) -> bool:
+    """Whether searches of an index can be restricted to a set of ids."""
+    return backend_of(index).supports_selector(index)
+
+def search_params(index: Any, nprobe: Optional[int] = None,
+                  ef_search: Optional[int] = None,
+                  config: Optional[Dict[str, Any]] = None,
+                  allowed_ids: Optional[np.ndarray] = None) -> Any:
+    """
+    Per-request search parameters for the index type, or None for an unfiltered flat index.
+    allowed_ids (sorted) restricts the search to those candidates where the index supports it.
+    """
+    config = config or get_index_config()
+    return backend_of(index).search_params(index, nprobe, ef_search, config, allowed_ids)
+
+def read_index(path: str, mmap: bool = True) -> Any:
+    """
+    Read an index from disk with the backend that wrote it. With mmap the vector data
+    stays in the page cache, shared by every process that maps the same file, and the
+    index is read-only.
+    """
+    return backend_of_file(path).read_index(path, mmap)
+
+def write_index(index: Any, path: str) -> None:
+    """
+    Write an index next to its target, flush it to disk and rename it into place,
+    so the target is never partially written and mapped readers keep their file.
+    """
+    backend_of(index).write_index(index, path)
+
+def index_bytes_per_vector(index: Any) -> float:
+    """Size of an index divided by its vector count."""
+    if index.ntotal == 0:
+        return 0.0
+    return backend_of(index).index_bytes(index) / index.ntotal
+
+def storage_report(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                   index_type: str = "flat",
+                   config: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Compare every storage type on the given vectors against exact inner-product search.
+    
+    Args:
+        vectors (np.ndarray): Normalized float32 corpus vectors
+        queries (np.ndarray): Normalized float32 query vectors
+        k (int): Cut-off for recall@k
+        index_type (str): Index type to build for every storage
+    
+    Returns:
+        List[Dict[str, Any]]: One row per storage (and per re-ranked storage) with memory and recall;
+        storages with too few vectors to train are left out, and index_type falls back to flat
+    """
+    config = config or get_index_config()
+    if not can_train(index_type, "float32", len(vectors), config):
+        print(f"Too few vectors ({len(vectors)}) to train {index_type}, comparing flat indexes")
+        index_type = "flat"
+    rows = np.arange(len(vectors), dtype=np.int64)
+    k = min(k, len(rows))
+    k_factor = int(config["RERANK_K_FACTOR"])
+    # Ground truth from an exact scan
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+
+    def recall(found: np.ndarray) -> float:
+        return float(np.mean([len(np.intersect1d(t, f[f >= 0])) / k for t, f in zip(truth, found)]))
+
+    report = []
+    for storage in get_backend(config["BACKEND"]).storage_types:
+        if not can_train(index_type, storage, len(vectors), config):
+            print(f"Skipping {storage}: too few vectors ({len(vectors)}) to train it")
+            continue
+        index = build_index(index_type, vectors.shape[1], vectors, rows, config, storage)
+        params = search_params(index, config=config)
+        started = time.perf_counter()
+        _, found = index.search(queries, k, params=params)
+        elapsed = time.perf_counter() - started
+        report.append({
+            "storage": storage,
+            "bytes_per_vector": index_bytes_per_vector(index),
+            "recall_at_k": recall(found),
+            "search_ms_per_query": 1000 * elapsed / len(queries),
+        })
+        if storage == "float32":
+            continue
+        # Re-rank a larger compressed shortlist against the full vectors
+        started = time.perf_counter()
+        _, shortlist = index.search(queries, min(k * k_factor, len(rows)), params=params)
+        reranked = []
+        for query, candidates in zip(queries, shortlist):
+            candidates = candidates[candidates >= 0]
+            reranked.append(candidates[np.argsort(-(vectors[candidates] @ query))[:k]])
+        elapsed = time.perf_counter() - started
+        report.append({
+            "storage": f"{storage}+rerank",
+            "bytes_per_vector": index_bytes_per_vector(index),
+            "recall_at_k": recall(reranked),
+            "search_ms_per_query": 1000 * elapsed / len(queries),
+        })
+    return report
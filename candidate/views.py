@@ -5,7 +5,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
-from .models import Candidate, Education, WorkExperience, Project, Certification
+from .models import Candidate, Education, WorkExperience, Project, Certification, ResumeJob
 from .serializers import (
     UserSerializer, CandidateSerializer, EducationSerializer, WorkExperienceSerializer,
     ProjectSerializer, CertificationSerializer
@@ -17,49 +17,9 @@ from .permissions import (
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from .resume_parser import extract_text_from_file, extract_resume_details
-from datetime import datetime
+from .resume_jobs import create_resume_job, resume_job_status
 import re
 
-def parse_date(date_str):
-    """
-    Parse date string in various formats to datetime.date object
-    Handles formats like:
-    - YYYY-MM-DD
-    - MMM YYYY (e.g., Jan 2023)
-    - MM/YYYY
-    - YYYY
-    """
-    if not date_str:
-        return None
-        
-    # Try YYYY-MM-DD format
-    try:
-        return datetime.strptime(date_str, '%Y-%m-%d').date()
-    except ValueError:
-        pass
-        
-    # Try MMM YYYY format (e.g., Jan 2023)
-    try:
-        return datetime.strptime(date_str, '%b %Y').date()
-    except ValueError:
-        pass
-        
-    # Try MM/YYYY format
-    try:
-        return datetime.strptime(date_str, '%m/%Y').date()
-    except ValueError:
-        pass
-        
-    # Try YYYY format
-    try:
-        return datetime.strptime(date_str, '%Y').date()
-    except ValueError:
-        pass
-        
-    # If all parsing attempts fail, return None
-    return None
-
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_user(request):
@@ -260,27 +220,12 @@ class CandidateViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def upload_resume(self, request):
         """
-        Upload and process resume, then create or update candidate profile.
-        If no profile exists, it will create a new one with the extracted information.
+        Upload a resume to create or replace the candidate profile.
+        The file is stored and queued for a process_resume_jobs worker, which extracts
+        the profile in the background; the response (202) carries the job to poll at
+        resume_jobs/<job_id>/. An Idempotency-Key header makes retried uploads
+        return the original job instead of queueing the resume again.
         """
-        try:
-            # Try to get existing profile, but don't require it
-            try:
-                old_candidate = Candidate.objects.get(user=request.user)
-                # Store the user reference
-                user = old_candidate.user
-                # Delete the old profile and all its related data if it exists
-                old_candidate.delete()
-            except Candidate.DoesNotExist:
-                # If no profile exists, use the current user
-                user = request.user
-
-        except Exception as e:
-            return Response(
-                {'error': f'Error handling existing profile: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
         if 'resume' not in request.FILES:
             return Response(
                 {'error': 'No resume file provided'},
@@ -288,142 +233,46 @@ class CandidateViewSet(viewsets.ModelViewSet):
             )
 
         resume_file = request.FILES['resume']
-        
-        try:
-            # Extract text from the resume file
-            resume_text = extract_text_from_file(resume_file)
-            
-            # Parse the resume using Gemini
-            resume_data = extract_resume_details(resume_text)
-            
-            if not resume_data:
-                return Response(
-                    {'error': 'Failed to parse resume'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Create a new candidate profile
-            candidate = Candidate.objects.create(
-                user=user,
-                name=resume_data.personal_info.name if resume_data.personal_info else '',
-                email=resume_data.personal_info.email if resume_data.personal_info else '',
-                phone=resume_data.personal_info.phone if resume_data.personal_info else '',
-                gender=None,  # Will be updated if found in resume
-                date_of_birth=None,  # Will be updated if found in resume
-                linkedin_profile=resume_data.personal_info.linkedin_url if resume_data.personal_info else '',
-                github_profile='',  # Will be updated if found in resume
-                portfolio_link='',  # Will be updated if found in resume
-                current_job_title=resume_data.personal_info.title if resume_data.personal_info else '',
-                current_company='',  # Will be updated if found in resume
-                skills='',  # Will be updated below
-                experience=0,  # Will be calculated below
-                resume=resume_file
-            )
-
-            # Calculate total experience from work experiences
-            total_experience = 0
-            if resume_data.professional_experience:
-                for exp in resume_data.professional_experience:
-                    if exp.start_date and exp.end_date:
-                        start_date = parse_date(exp.start_date)
-                        end_date = parse_date(exp.end_date)
-                        if start_date and end_date:
-                            # Calculate years of experience
-                            years = (end_date - start_date).days / 365.25
-                            total_experience += years
-                        elif start_date and not end_date:
-                            # If end_date is not provided, assume current date
-                            from datetime import date
-                            years = (date.today() - start_date).days / 365.25
-                            total_experience += years
-
-            # Update experience
-            candidate.experience = round(total_experience, 1)  # Round to 1 decimal place
-
-            # Update skills
-            if resume_data.technical_skills:
-                skills = []
-                if resume_data.technical_skills.technical_skills:
-                    skills.extend(resume_data.technical_skills.technical_skills)
-                if resume_data.technical_skills.frameworks_libraries:
-                    skills.extend(resume_data.technical_skills.frameworks_libraries)
-                if resume_data.technical_skills.tools:
-                    skills.extend(resume_data.technical_skills.tools)
-                candidate.skills = ', '.join(skills) if skills else ''
-                candidate.save()
-
-            # Create work experiences
-            if resume_data.professional_experience:
-                for exp in resume_data.professional_experience:
-                    if exp.company and exp.role:
-                        # Set default dates if not provided
-                        start_date = parse_date(exp.start_date) if exp.start_date else datetime.now().date()
-                        end_date = parse_date(exp.end_date) if exp.end_date else None
-                        
-                        WorkExperience.objects.create(
-                            candidate=candidate,
-                            company_name=exp.company,
-                            role_designation=exp.role,
-                            start_date=start_date,
-                            end_date=end_date,
-                            responsibilities='\n'.join(exp.responsibilities) if exp.responsibilities else '',
-                            technologies_used=''
-                        )
-
-            # Create education entries
-            if resume_data.education:
-                for edu in resume_data.education:
-                    if edu.institution and edu.degree:
-                        Education.objects.create(
-                            candidate=candidate,
-                            institution=edu.institution,
-                            degree=edu.degree,
-                            field_of_study='',
-                            start_date=parse_date(edu.start_date),
-                            end_date=parse_date(edu.end_date)
-                        )
-
-            # Create projects
-            if resume_data.projects:
-                print(f"Found {len(resume_data.projects)} projects in resume")
-                for proj in resume_data.projects:
-                    try:
-                        if proj.project_name:
-                            print(f"Processing project: {proj.project_name}")
-                            project = Project.objects.create(
-                                candidate=candidate,
-                                title=proj.project_name,
-                                description=proj.description or '',
-                                tech_stack=', '.join(proj.tech_stack) if proj.tech_stack else 'Not specified',
-                                role_in_project='Not specified'
-                            )
-                            print(f"Successfully created project: {project.title}")
-                        else:
-                            print("Skipping project with no name")
-                    except Exception as e:
-                        print(f"Error creating project: {str(e)}")
-                        continue
-            else:
-                print("No projects found in resume data")
-
-            return Response({
-                'message': 'Resume uploaded and processed successfully. Profile has been created.',
-                'resume_url': candidate.resume.url,
-                'profile_updated': True,
-                'projects_created': len(resume_data.projects) if resume_data.projects else 0
-            })
-
-        except ValueError as e:
+        if not resume_file.name.endswith(('.pdf', '.docx')):
             return Response(
-                {'error': str(e)},
+                {'error': 'Unsupported file format. Please upload a PDF or DOCX file.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        try:
+            job, created = create_resume_job(
+                request.user, resume_file, request.headers.get('Idempotency-Key')
+            )
         except Exception as e:
             return Response(
-                {'error': f'Error processing resume: {str(e)}'},
+                {'error': f'Error queueing resume: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        return Response(
+            {
+                'message': 'Resume queued for processing.' if created else 'Resume already uploaded with this idempotency key.',
+                **resume_job_status(job)
+            },
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=['get'], url_path=r'resume_jobs/(?P<job_id>\d+)')
+    def resume_job(self, request, job_id=None):
+        """
+        Get the status of one of the user's resume jobs: its status (queued, running,
+        succeeded or failed), the stage reached, the error of a failed run and, once
+        it succeeded, the created candidate.
+        """
+        try:
+            job = ResumeJob.objects.get(id=job_id, user=request.user)
+        except ResumeJob.DoesNotExist:
+            return Response(
+                {'error': 'Resume job not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(resume_job_status(job))
+
     @action(detail=False, methods=['get'])
     def portfolio_data(self, request):
         """
@@ -143,3 +143,85 @@ CORS_ALLOW_CREDENTIALS = True
 
 # Gemini API Key
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'your-gemini-api-key-here')
+
+# Model provider for embeddings, job description parsing and resume extraction:
+# gemini, or offline for deterministic local stand-ins (benchmarks and tests without network)
+LLM_PROVIDER = {
+    'NAME': os.getenv('LLM_PROVIDER', 'gemini'),
+    'OFFLINE_LATENCY': float(os.getenv('LLM_OFFLINE_LATENCY', 0)),  # seconds added to every offline call
+    'OFFLINE_LATENCY_PER_ITEM': 0.0,  # seconds added per embedded text
+    # Provider of profile and query embeddings when it differs from NAME, e.g. 'lexical'
+    # (local hashed TF-IDF) while Gemini is down; switching it requires an index rebuild
+    'EMBEDDING_NAME': os.getenv('LLM_EMBEDDING_PROVIDER') or None,
+    'LEXICAL_IDF_PATH': os.getenv('LEXICAL_IDF_PATH', BASE_DIR / 'candidate_embeddings_lexical_idf.npy'),
+}
+
+# Uploaded resumes are processed by `python manage.py process_resume_jobs` workers
+RESUME_JOBS = {
+    'POLL_INTERVAL': 1.0,  # seconds an idle worker waits before looking for new jobs
+    'MAX_ATTEMPTS': 3,  # runs of a job failing with transient (LLM, network) errors
+    'RETRY_BACKOFF': 30.0,  # seconds before a failed job runs again, doubled on every retry
+    'STALE_AFTER': 900.0,  # seconds a running job may go without progress before its worker is presumed dead
+}
+
+# Parsed job descriptions kept in memory in front of the ParsedJobDescription table
+JD_PARSE_CACHE_SIZE = 512
+
+# Texts sent per embedding request (the API accepts up to 100)
+EMBEDDING_BATCH_SIZE = 100
+
+# Embedding requests run concurrently, sharing one rate limit per process
+EMBEDDING_REQUESTS = {
+    'MAX_WORKERS': 4,  # requests in flight at once
+    'REQUESTS_PER_SECOND': float(os.getenv('EMBEDDING_REQUESTS_PER_SECOND', 5)),  # 0 disables the limit
+    'BURST': 5,
+    'MAX_RETRIES': 5,  # retries of throttled (429) and transient (5xx, network) failures
+    'BACKOFF_BASE': 1.0,  # seconds, doubled on every retry
+    'BACKOFF_MAX': 30.0,
+}
+
+# Persistent embedding cache keyed by sha256(model, dimension, text); PATH None disables it
+EMBEDDING_CACHE = {
+    'PATH': os.getenv('EMBEDDING_CACHE_PATH', BASE_DIR / 'embedding_cache.sqlite3'),
+    'MAX_BYTES': 512 * 1024 * 1024,  # least recently used vectors are evicted past this size
+}
+
+# Caches. "shared" is seen by every worker process: search cursors issued by one worker are
+# read back by another. The file cache needs no extra service but is per host; point it at
+# Redis or Memcached when workers run on several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': os.getenv('SHARED_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('SHARED_CACHE_LOCATION', str(BASE_DIR / 'shared_cache')),
+    },
+}
+
+# Candidate vector index (see candidate/vector_index.py for all keys)
+EMBEDDING_INDEX = {
+    'BACKEND': os.getenv('EMBEDDING_INDEX_BACKEND', 'faiss'),  # faiss, or numpy for plain memory-mapped matrices
+    'TYPE': os.getenv('EMBEDDING_INDEX_TYPE', 'auto'),  # flat, ivf, hnsw or auto
+    'ANN_TYPE': 'ivf',
+    'ANN_THRESHOLD': 50000,
+    'IVF_NPROBE': 16,
+    'HNSW_EF_SEARCH': 64,
+    'STORAGE': os.getenv('EMBEDDING_INDEX_STORAGE', 'float32'),  # float32, fp16, sq8 or pq
+    'COMPRESS_THRESHOLD': 10000,
+    'RERANK': False,
+    'MMAP': True,  # share saved indexes read-only across workers through the page cache
+    'FILTER_SCAN_THRESHOLD': 20000,  # filtered searches below this many matches score them all exactly
+    'ATTRIBUTE_REFRESH_INTERVAL': 60.0,  # seconds before filter attributes are reloaded from the database
+    'RANKING_DEPTH': 200,  # candidates ranked per search and paged through with cursors
+    'RANKING_TTL': 600,  # seconds a cursor stays valid
+    'RANKING_CACHE': 'shared',  # cache alias holding rankings; must be shared by all workers
+    'RESULT_CACHE_SIZE': 256,  # repeated searches served from memory, 0 to disable
+    'RESULT_CACHE_TTL': 300,
+    'RESULT_CACHE_ALIAS': os.getenv('EMBEDDING_RESULT_CACHE_ALIAS') or None,  # shared cache tier across workers
+    'HYBRID_SEARCH': True,  # fuse BM25 keyword matches into dense rankings (reciprocal-rank fusion)
+    'RELOAD_INTERVAL': 2.0,  # seconds before a worker notices another worker's publish
+    'FLUSH_INTERVAL': 5.0,  # seconds edits stay in the delta segment before compaction
+    'FLUSH_MAX_PENDING': 100,  # delta segment size that forces a compaction before the interval is up
+    'KEEP_GENERATIONS': 2,
+}